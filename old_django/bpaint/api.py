@@ -0,0 +1,118 @@
+"""
+Helpers shared by the JSON read endpoints: keyset pagination on the primary key and conditional GET.
+
+A list page is `?after=<last id of the previous page>&limit=<n>`. Every page is a `pk > after ORDER BY pk LIMIT n`
+index range scan, so page 10000 costs the same as page 1. The ETag and Last-Modified of a page are computed from the
+(id, updated_at) pairs of its rows alone, which lets unchanged pages be answered with 304 before any row is loaded
+or serialized. Only the ETag notices rows deleted from a page, so clients should poll with If-None-Match.
+"""
+
+import hashlib
+
+from django.core.exceptions import BadRequest
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def integer_parameter(request, name, default, minimum=0, maximum=None):
+    """
+        the integer query parameter name clamped to minimum..maximum, default when absent; BadRequest when it is not an
+        integer
+    """
+
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+
+    value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+
+    return value
+
+
+def _versions_etag(versions, salt=''):
+    digest = hashlib.sha1(salt.encode())
+    for pk, updated_at in versions:
+        digest.update(f'{pk}:{updated_at.isoformat()};'.encode())
+
+    return quote_etag(digest.hexdigest())
+
+
+def conditional_json(request, versions, build, salt=''):
+    """
+        versions: [(pk, updated_at)] describing everything the response depends on, plus salt for anything else
+        build: callable returning the JSON-serializable payload, only called when the client's copy is stale
+    """
+
+    etag = _versions_etag(versions, salt)
+    last_modified = max((updated_at for _, updated_at in versions), default=None)
+    last_modified = int(last_modified.timestamp()) if last_modified is not None else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build())
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+
+    return response
+
+
+def keyset_list(request, queryset, serialize):
+    """
+        JSON page of queryset in primary key order
+
+        serialize: callable taking the list of model instances on the page and returning a list of dicts
+    """
+
+    after = integer_parameter(request, 'after', 0)
+    limit = integer_parameter(request, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+
+    page = queryset.filter(pk__gt=after).order_by('pk')
+    versions = list(page.values_list('pk', 'updated_at')[:limit + 1])
+
+    has_more = len(versions) > limit
+    versions = versions[:limit]
+
+    def build():
+        objects = list(page.filter(pk__in=[pk for pk, _ in versions]))
+        next_url = None
+        if has_more:
+            query = request.GET.copy()
+            query['after'] = versions[-1][0]
+            query['limit'] = limit
+            next_url = f'{request.path}?{query.urlencode()}'
+
+        return {
+            'results': serialize(objects),
+            'next': next_url,
+        }
+
+    return conditional_json(request, versions, build, salt=f'{limit}:{has_more}')
+
+
+def keyset_detail(request, queryset, pk, serialize, dependencies=None):
+    """
+        JSON of one row of queryset
+
+        dependencies: optional callable taking pk and returning (versions, salt) for other rows the payload is built from
+    """
+
+    versions = list(queryset.filter(pk=pk).values_list('pk', 'updated_at'))
+    if not versions:
+        raise Http404
+
+    salt = ''
+    if dependencies is not None:
+        extra, salt = dependencies(pk)
+        versions += extra
+
+    return conditional_json(request, versions, lambda: serialize(queryset.get(pk=pk)), salt=salt)
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+
+
+class BpaintConfig(AppConfig):
+    name = 'bpaint'
+
+    def ready(self):
+        from .db import close_unusable_connections, install_use_recorder
+        from .metrics import install_query_recorder
+
+        request_started.connect(close_unusable_connections, dispatch_uid='bpaint.db.close_unusable_connections')
+        connection_created.connect(install_use_recorder, dispatch_uid='bpaint.db.install_use_recorder')
+        connection_created.connect(install_query_recorder, dispatch_uid='bpaint.metrics.install_query_recorder')
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bpaint.settings')
 
 application = get_asgi_application()
+
+# build the in-memory autocomplete index before the first request needs it
+from colors import search  # noqa: E402
+
+search.warm()
@@ -0,0 +1,90 @@
+"""
+Database routing and connection upkeep for the configured databases.
+
+Each app listed in settings.DATABASE_APPS lives on its own alias; every other app lives on `default`. Reads can be
+spread over the aliases in settings.DATABASE_REPLICAS[<alias>], which should be declared with
+`'TEST': {'MIRROR': <alias>}` so tests read what they wrote.
+
+Connections are kept open between requests for CONN_MAX_AGE seconds. A kept connection may have been dropped by the
+server or a proxy in the meantime, so at the start of a request an open connection that has not run a query for
+DATABASE_HEALTH_CHECK_IDLE_SECONDS (default 30) is pinged and closed if it no longer answers; Django then reconnects on
+first use instead of failing the request. Connections in steady use are never pinged, so a busy alias costs no extra
+round trip, and an idle one at most one per interval. Connections that saw an error are already checked by Django
+itself.
+"""
+
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def app_database(app_label):
+    return getattr(settings, 'DATABASE_APPS', {}).get(app_label, DEFAULT_DB_ALIAS)
+
+
+def replicas(alias):
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(alias, [])
+
+
+class DatabaseRouter:
+    def db_for_read(self, model, **hints):
+        alias = app_database(model._meta.app_label)
+        candidates = replicas(alias)
+
+        return random.choice(candidates) if candidates else alias
+
+    def db_for_write(self, model, **hints):
+        return app_database(model._meta.app_label)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # relations across databases are declared with db_constraint=False and checked in application code
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if any(db in aliases for aliases in getattr(settings, 'DATABASE_REPLICAS', {}).values()):
+            return False
+
+        return db == app_database(app_label)
+
+
+def health_check_idle_seconds():
+    return getattr(settings, 'DATABASE_HEALTH_CHECK_IDLE_SECONDS', 30)
+
+
+def record_use(execute, sql, params, many, context):
+    context['connection'].last_used_at = time.monotonic()
+
+    return execute(sql, params, many, context)
+
+
+def install_use_recorder(sender, connection, **kwargs):
+    """
+        connection_created receiver; a fresh connection counts as used, and the wrapper is only added once since the
+        wrapper list outlives reconnects
+    """
+
+    connection.last_used_at = time.monotonic()
+    if record_use not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_use)
+
+
+def close_unusable_connections(**kwargs):
+    """
+        request_started receiver: close kept connections that have been idle for a while and no longer answer
+    """
+
+    now = time.monotonic()
+
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+
+        if now - getattr(connection, 'last_used_at', 0) < health_check_idle_seconds():
+            continue
+
+        if connection.is_usable():
+            connection.last_used_at = now
+        else:
+            connection.close()
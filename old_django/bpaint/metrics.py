@@ -0,0 +1,209 @@
+"""
+Per-request latency and database query metrics, served in the Prometheus text format.
+
+MetricsMiddleware records every request against the name of the view that handled it and, for each database alias,
+how many queries ran and how long they took. metrics_view renders the totals for a local scraper.
+
+Connections are thread-local, and under ASGI sync views run on a worker thread shared by concurrent requests, so the
+middleware cannot wrap the connections it sees itself. Instead every connection gets one permanent execute wrapper
+(record_queries, installed on connection_created) that hands queries to the recorder of the current request, found
+through a context variable; sync_to_async carries the context over to the thread that runs the view.
+
+Settings:
+    METRICS_SLOW_REQUEST_SECONDS: log the SQL of requests slower than this (default None, off)
+    METRICS_LOG_DUPLICATE_QUERIES: log SQL that ran more than once in a single request (default False)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.latency_sum = defaultdict(float)
+        self.query_count = defaultdict(int)
+        self.query_seconds = defaultdict(float)
+
+    def observe(self, view, seconds, queries):
+        """
+            queries: {database alias: [(sql, seconds)]}
+        """
+
+        with self._lock:
+            buckets = self.latency_buckets[view]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self.latency_sum[view] += seconds
+
+            for alias, executed in queries.items():
+                self.query_count[(view, alias)] += len(executed)
+                self.query_seconds[(view, alias)] += sum(duration for _, duration in executed)
+
+    def render(self):
+        lines = [
+            '# HELP bpaint_request_duration_seconds Request latency by view.',
+            '# TYPE bpaint_request_duration_seconds histogram',
+        ]
+
+        with self._lock:
+            for view, buckets in sorted(self.latency_buckets.items()):
+                label = _escape(view)
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'bpaint_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {count}')
+                lines.append(f'bpaint_request_duration_seconds_bucket{{view="{label}",le="+Inf"}} {buckets[-1]}')
+                lines.append(f'bpaint_request_duration_seconds_sum{{view="{label}"}} {self.latency_sum[view]}')
+                lines.append(f'bpaint_request_duration_seconds_count{{view="{label}"}} {buckets[-1]}')
+
+            lines.append('# HELP bpaint_db_queries_total Database queries by view and database alias.')
+            lines.append('# TYPE bpaint_db_queries_total counter')
+            for (view, alias), count in sorted(self.query_count.items()):
+                lines.append(f'bpaint_db_queries_total{{view="{_escape(view)}",database="{alias}"}} {count}')
+
+            lines.append('# HELP bpaint_db_query_duration_seconds_total Time spent in database queries by view and database alias.')
+            lines.append('# TYPE bpaint_db_query_duration_seconds_total counter')
+            for (view, alias), seconds in sorted(self.query_seconds.items()):
+                lines.append(f'bpaint_db_query_duration_seconds_total{{view="{_escape(view)}",database="{alias}"}} {seconds}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = defaultdict(list)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries[context['connection'].alias].append((sql, time.perf_counter() - started))
+
+
+_current_recorder = ContextVar('metrics_query_recorder', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+        connection_created receiver; the wrapper list outlives reconnects, so it is only added once per connection
+    """
+
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+
+    return match.view_name or match.route or '<unnamed>'
+
+
+class MetricsMiddleware:
+    """
+        works both ways round, so under ASGI async views are not pushed onto a thread because of it
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+        self.log_duplicate_queries = getattr(settings, 'METRICS_LOG_DUPLICATE_QUERIES', False)
+
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # what MiddlewareMixin does to make instances look like coroutine functions to the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+
+        token = _current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+
+        self.record(request, time.perf_counter() - started, recorder.queries)
+
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+
+        # sync_to_async runs sync views in a copy of this context, so their queries reach this recorder too
+        token = _current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+
+        self.record(request, time.perf_counter() - started, recorder.queries)
+
+        return response
+
+    def record(self, request, seconds, queries):
+        view = view_name(request)
+        registry.observe(view, seconds, queries)
+
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            logger.warning(
+                'Slow request %s %s (%s) took %.3fs:\n%s',
+                request.method, request.path, view, seconds,
+                '\n'.join(f'[{alias} {duration:.4f}s] {sql}' for alias, executed in queries.items() for sql, duration in executed),
+            )
+
+        if self.log_duplicate_queries:
+            for alias, executed in queries.items():
+                for sql, count in Counter(sql for sql, _ in executed).items():
+                    if count > 1:
+                        logger.warning('Query ran %d times on %s in %s %s (%s): %s', count, alias, request.method, request.path, view, sql)
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in (*LOCAL_ADDRESSES, *getattr(settings, 'INTERNAL_IPS', [])):
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
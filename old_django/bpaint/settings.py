@@ -31,6 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'bpaint.apps.BpaintConfig',
     'colors.apps.ColorsConfig',
     'inventory.apps.InventoryConfig',
     'django.contrib.admin',
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bpaint.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,16 +81,31 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'colors',
+        'CONN_MAX_AGE': 60,
     },
     'inventory': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'inventory',
+        'CONN_MAX_AGE': 60,
         'TEST': {
             'DEPENDENCIES': ['default']
         },
     }
 }
 
+DATABASE_ROUTERS = ['bpaint.db.DatabaseRouter']
+
+# app label: database alias, for apps that do not live on default
+DATABASE_APPS = {
+    'inventory': 'inventory',
+}
+
+# database alias: [read replica aliases], e.g. {'default': ['colors_replica']}
+DATABASE_REPLICAS = {}
+
+# kept connections idle for longer than this are pinged at the start of a request, see bpaint.db
+DATABASE_HEALTH_CHECK_IDLE_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -128,6 +145,19 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Request metrics, served at /metrics/ to local addresses and INTERNAL_IPS
+
+METRICS_SLOW_REQUEST_SECONDS = None
+
+METRICS_LOG_DUPLICATE_QUERIES = False
+
+# CMYK lookup tables built by `manage.py build_cmyk_profile`; None converts with the uncalibrated formula
+
+CMYK_PROFILE_DIR = BASE_DIR / 'profiles'
+
+CMYK_PROFILE = None
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,24 @@
+"""
+Settings for running the tests without PostgreSQL: both databases become SQLite files, which the test runner
+replaces with in-memory databases.
+
+    python manage.py test --settings=bpaint.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'colors.sqlite3',
+    },
+    'inventory': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'inventory.sqlite3',
+        'TEST': {
+            'DEPENDENCIES': ['default']
+        },
+    },
+}
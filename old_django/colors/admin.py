@@ -1,12 +1,18 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import router
+from django.db.models import ProtectedError
+from django.utils import timezone
 
-from .models import AnalogColor, AnalogRecipe, DigitalColor
+from . import duplicates
+from .models import AnalogColor, AnalogRecipe, DigitalColor, DuplicateCluster, DuplicateClusterMember
+from .signals import protected_analog_colors
 
 
 class AnalogColorAdmin(admin.ModelAdmin):
     fields = [
        'name',
        'image_url',
+       'digital_color',
        'medium',
        'body',
        'brandname',
@@ -22,9 +28,77 @@ class AnalogColorAdmin(admin.ModelAdmin):
        '_recipe_oil',
        '_recipe_thinner',
        '_recipe_water',
+       'predicted_color',
     ]
+    readonly_fields = ['predicted_color']
+    raw_id_fields = ['digital_color']
+
+    def get_deleted_objects(self, objs, request):
+        deleted_objects, model_count, perms_needed, protected = super().get_deleted_objects(objs, request)
+
+        # guards in other apps (inventory stock) live on other databases, out of the collector's sight
+        responses = protected_analog_colors.send(
+            sender=AnalogColor, color_ids=[obj.pk for obj in objs], using=router.db_for_write(AnalogColor),
+        )
+        for _, found in responses:
+            protected.extend(found)
+
+        return deleted_objects, model_count, perms_needed, protected
+
+
+class AnalogRecipeAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'origin_color', 'ingredient', 'quantity']
+    list_select_related = ['origin_color', 'ingredient']
+    raw_id_fields = ['origin_color', 'ingredient']
+
+
+class DuplicateClusterMemberInline(admin.TabularInline):
+    # members can be taken out of a cluster before it is merged, but not added
+    model = DuplicateClusterMember
+    fields = ['digital_color', 'analog_color', 'delta_e']
+    readonly_fields = fields
+    ordering = ['digital_color_id', 'analog_color_id']
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('digital_color', 'analog_color')
+
+
+class DuplicateClusterAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'kind', 'status', 'size', 'max_delta_e', 'created_at']
+    list_filter = ['kind', 'status']
+    ordering = ['-size', 'id']
+    readonly_fields = ['kind', 'status', 'threshold', 'size', 'max_delta_e', 'created_at', 'resolved_at']
+    inlines = [DuplicateClusterMemberInline]
+    actions = ['merge_clusters', 'dismiss_clusters']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Merge selected clusters into their oldest color')
+    def merge_clusters(self, request, queryset):
+        merged = 0
+        for cluster in queryset.filter(status='open'):
+            try:
+                duplicates.merge(cluster, using=queryset.db)
+            except (ProtectedError, ValueError) as e:
+                self.message_user(request, f'Could not merge {cluster}: {e}', messages.ERROR)
+            else:
+                merged += 1
+
+        self.message_user(request, f'Merged {merged} clusters', messages.SUCCESS)
+
+    @admin.action(description='Dismiss selected clusters')
+    def dismiss_clusters(self, request, queryset):
+        dismissed = queryset.filter(status='open').update(status='dismissed', resolved_at=timezone.now())
+
+        self.message_user(request, f'Dismissed {dismissed} clusters', messages.SUCCESS)
 
 
 admin.site.register(AnalogColor, AnalogColorAdmin)
-admin.site.register(AnalogRecipe)
+admin.site.register(AnalogRecipe, AnalogRecipeAdmin)
 admin.site.register(DigitalColor)
+admin.site.register(DuplicateCluster, DuplicateClusterAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ColorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'colors'
+
+    def ready(self):
+        from . import signals  # noqa: F401
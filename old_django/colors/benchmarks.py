@@ -0,0 +1,251 @@
+"""
+Synthetic catalog generator and timing cases behind the `benchmark` management command.
+"""
+
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+
+from . import closure, conversions, duplicates, predictions, profiles, recipes
+from .models import AnalogColor, AnalogRecipe, DigitalColor
+
+
+def generate(analog_colors=1000, recipe_depth=3, digital_colors=10000, inventory_rows=1000, seed=0, batch_size=1000):
+    """
+        fill the database with a reproducible synthetic catalog:
+            digital_colors DigitalColors with distinct random values
+            analog_colors AnalogColors, a quarter of them base pigments linked to a DigitalColor and the rest mixes
+            spread over recipe_depth levels, each mix using two or three colors from lower levels
+            inventory_rows Inventory rows over random (color, size) pairs
+
+        base pigments beyond the digital_colors-th get no DigitalColor
+
+        returns {name: seconds} for each bulk load; raises ValueError on a negative count or a recipe_depth below 1
+    """
+
+    if min(analog_colors, digital_colors, inventory_rows) < 0:
+        raise ValueError('color and inventory counts cannot be negative')
+    if recipe_depth < 1:
+        raise ValueError('recipe_depth must be at least 1')
+
+    Inventory = apps.get_model('inventory', 'Inventory')
+    rng = np.random.default_rng(seed)
+    timings = {}
+
+    # one value per analog color as well, so base pigments can index values whatever digital_colors is
+    needed = max(digital_colors, analog_colors)
+    values = np.unique(rng.integers(0, 2 ** 32, int(needed * 1.1) + 16))
+    values = rng.permutation(values)[:needed]
+
+    started = time.perf_counter()
+    DigitalColor.objects.bulk_create(
+        [DigitalColor(name=f'Synthetic {i}', _integer_value=int(value)) for i, value in enumerate(values[:digital_colors])],
+        batch_size=batch_size,
+    )
+    timings['bulk_create_digital_colors'] = time.perf_counter() - started
+
+    swatch_ids = dict(DigitalColor.objects.values_list('_integer_value', 'id'))
+    media = [medium for medium, _ in AnalogColor.medium_choices]
+    base_count = min(max(analog_colors // 4, 2), analog_colors)
+
+    colors = []
+    for i in range(analog_colors):
+        colors.append(AnalogColor(
+            brandname=f'Brand {i % 17}',
+            image_url=f'https://example.com/swatches/{i}.png',
+            medium=media[i % len(media)],
+            name=f'Synthetic Color {i}',
+            series=str(i % 5 + 1),
+            digital_color_id=swatch_ids.get(int(values[i])) if i < base_count else None,
+        ))
+
+    started = time.perf_counter()
+    AnalogColor.objects.bulk_create(colors, batch_size=batch_size)
+    timings['bulk_create_analog_colors'] = time.perf_counter() - started
+
+    ids = list(AnalogColor.objects.order_by('id').values_list('id', flat=True))
+    levels = [ids[:base_count]]
+    mixes = ids[base_count:]
+    per_level = max(-(-len(mixes) // recipe_depth), 1)
+    for start in range(0, len(mixes), per_level):
+        levels.append(mixes[start:start + per_level])
+
+    rows = []
+    for depth in range(1, len(levels)):
+        lower = [color_id for level in levels[:depth] for color_id in level]
+        for origin_id in levels[depth]:
+            # at least one ingredient from the level right below keeps the graph recipe_depth deep
+            ingredients = {int(rng.choice(levels[depth - 1]))}
+            count = min(int(rng.integers(2, 4)), len(lower))
+            while len(ingredients) < count:
+                ingredients.add(int(rng.choice(lower)))
+            for ingredient_id in ingredients:
+                rows.append(AnalogRecipe(origin_color_id=origin_id, ingredient_id=ingredient_id, quantity=int(rng.integers(1, 6))))
+
+    started = time.perf_counter()
+    AnalogRecipe.objects.bulk_create(rows, batch_size=batch_size)
+    timings['bulk_create_analog_recipes'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    closure.rebuild(batch_size=batch_size)
+    timings['rebuild_recipe_closure'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions.rebuild(batch_size=batch_size)
+    timings['rebuild_color_predictions'] = time.perf_counter() - started
+
+    sizes = [size for size, _ in Inventory.size_choices]
+    pairs = rng.choice(len(ids) * len(sizes), size=min(inventory_rows, len(ids) * len(sizes)), replace=False)
+    stock = [
+        Inventory(
+            color_id=ids[pair // len(sizes)],
+            size=sizes[pair % len(sizes)],
+            quantity_full=int(rng.integers(0, 4)),
+            quantity_three_fourths=int(rng.integers(0, 3)),
+            quantity_half=int(rng.integers(0, 3)),
+            quantity_one_fourth=int(rng.integers(0, 3)),
+        )
+        for pair in pairs.tolist()
+    ]
+
+    started = time.perf_counter()
+    Inventory.objects.bulk_create(stock, batch_size=batch_size)
+    timings['bulk_create_inventory'] = time.perf_counter() - started
+
+    from inventory import references, rollups
+
+    started = time.perf_counter()
+    references.reconcile(batch_size=batch_size)
+    timings['reconcile_color_references'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rollups.rebuild(batch_size=batch_size)
+    timings['rebuild_inventory_rollups'] = time.perf_counter() - started
+
+    return timings
+
+
+def measure(function, repeat=5):
+    """
+        run function repeat times after one warm-up call; {median, min} in seconds
+    """
+
+    function()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+
+    return {'median': statistics.median(samples), 'min': min(samples)}
+
+
+def cases(sample_size=1000):
+    """
+        {name: (callable, operations per call)} over the data written by generate()
+    """
+
+    digital_colors = list(DigitalColor.objects.order_by('id')[:sample_size])
+    values = np.array(DigitalColor.objects.values_list('_integer_value', flat=True))
+    profile = profiles.CmykProfile('uncalibrated', **profiles.uncalibrated())
+    mix_ids = list(AnalogRecipe.objects.order_by('-origin_color_id').values_list('origin_color_id', flat=True).distinct()[:sample_size])
+    mixes = list(AnalogColor.objects.filter(id__in=mix_ids))
+
+    client = Client()
+    client.force_login(User.objects.get_or_create(username='benchmark', defaults={'is_staff': True, 'is_superuser': True})[0])
+
+    def scalar_conversions():
+        for color in digital_colors:
+            color.rgba, color.hsla, color.cmyk, color.hex
+
+    def recipe_property():
+        for color in mixes:
+            color.recipe
+
+    def recipe_property_prefetched():
+        for color in AnalogColor.objects.filter(id__in=mix_ids).with_recipes():
+            color.recipe
+
+    def flatten_cold():
+        recipes.reset()
+        recipes.flatten_many(mix_ids)
+
+    def changelist(name):
+        url = reverse(f'admin:{name}_changelist')
+        return lambda: client.get(url)
+
+    return {
+        'digital_color_scalar_conversions': (scalar_conversions, len(digital_colors)),
+        'batch_to_rgba': (lambda: conversions.to_rgba(values), len(values)),
+        'batch_to_hsla': (lambda: conversions.to_hsla(values), len(values)),
+        'batch_to_cmyk': (lambda: conversions.to_cmyk(values), len(values)),
+        'batch_to_cmyk_profiled': (lambda: profile.to_cmyk(values), len(values)),
+        'batch_to_hex': (lambda: conversions.to_hex(values), len(values)),
+        'batch_to_lab': (lambda: conversions.to_lab(values), len(values)),
+        'find_duplicate_digital_colors': (lambda: duplicates.find('digital'), len(values)),
+        'analog_color_recipe': (recipe_property, len(mixes)),
+        'analog_color_recipe_prefetched': (recipe_property_prefetched, len(mix_ids)),
+        'flatten_recipes_cold': (flatten_cold, len(mix_ids)),
+        'predict_mixes': (lambda: predictions.predict(mix_ids), len(mix_ids)),
+        'admin_analogcolor_changelist': (changelist('colors_analogcolor'), 1),
+        'admin_analogrecipe_changelist': (changelist('colors_analogrecipe'), 1),
+        'admin_digitalcolor_changelist': (changelist('colors_digitalcolor'), 1),
+        'admin_inventory_changelist': (changelist('inventory_inventory'), 1),
+    }
+
+
+def run(repeat=5, sample_size=1000, only=None):
+    results = {}
+
+    for name, (function, operations) in cases(sample_size).items():
+        if only and name not in only:
+            continue
+
+        timing = measure(function, repeat)
+        timing['operations'] = operations
+        timing['per_operation'] = timing['median'] / max(operations, 1)
+        results[name] = timing
+
+    return results
+
+
+def environment():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+        [(name, baseline seconds, current seconds, ratio)] for cases whose median got slower by more than tolerance
+    """
+
+    regressions = []
+    for name, timing in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+
+        ratio = timing['median'] / before['median'] if before['median'] else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append((name, before['median'], timing['median'], ratio))
+
+    return regressions
@@ -0,0 +1,183 @@
+"""
+Streaming import of manufacturer catalogs into AnalogColor.
+
+Rows are read one at a time from CSV (header row of field names) or NDJSON (one object per line), validated against
+the model's choices and validators, and written with bulk_create in chunks, so memory use does not grow with the file.
+A row that matches an existing color on every field of the `unique_color` constraint is a conflict: it is either
+skipped or, with on_conflict='update', used to update the existing color's remaining fields.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import predictions, search
+from .models import AnalogColor
+
+
+UNIQUE_FIELDS = next(constraint.fields for constraint in AnalogColor._meta.constraints if constraint.name == 'unique_color')
+IMPORT_FIELDS = [
+    field.attname for field in AnalogColor._meta.concrete_fields if not field.primary_key and field.name not in ('digital_color', 'predicted_value', 'updated_at')
+]
+UPDATE_FIELDS = [field for field in IMPORT_FIELDS if field not in UNIQUE_FIELDS] + ['updated_at']
+CONFLICT_ACTIONS = ('skip', 'update')
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'{self.created} created, {self.updated} updated, {self.skipped} skipped, {self.failed} failed'
+
+
+def read_rows(stream, format='csv'):
+    """
+        yield (line number, {column: value}) from a text stream
+    """
+
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, e
+                continue
+
+            yield line, row if isinstance(row, dict) else ValueError('each line must be a JSON object')
+    else:
+        raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+
+
+def build_color(row):
+    """
+        unsaved, validated AnalogColor from one input row; raises ValidationError
+    """
+
+    if isinstance(row, Exception):
+        raise ValidationError(str(row))
+
+    # csv.DictReader keeps the cells beyond the header under its restkey, None
+    if None in row:
+        raise ValidationError(f'row has {len(row[None])} extra cells')
+
+    unknown = sorted(set(row) - set(IMPORT_FIELDS))
+    if unknown:
+        raise ValidationError(f'unknown columns: {", ".join(unknown)}')
+
+    # empty cells fall back to the field default
+    color = AnalogColor(**{field: value for field, value in row.items() if value not in ('', None)})
+    color.full_clean(validate_unique=False)
+
+    return color
+
+
+def _describe(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+
+    return ' '.join(error.messages)
+
+
+def _key(color):
+    return tuple(getattr(color, field) for field in UNIQUE_FIELDS)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def import_catalog(stream, format='csv', on_conflict='skip', chunk_size=1000, using='default', max_errors=1000):
+    """
+        import AnalogColors from a text stream; returns an ImportReport with counts and (line, message) errors
+    """
+
+    if on_conflict not in CONFLICT_ACTIONS:
+        raise ValueError(f'on_conflict must be one of {", ".join(CONFLICT_ACTIONS)}')
+
+    report = ImportReport(max_errors=max_errors)
+    updated_ids = []
+
+    for chunk in _chunks(read_rows(stream, format), chunk_size):
+        colors = {}
+        for line, row in chunk:
+            try:
+                color = build_color(row)
+            except ValidationError as e:
+                report.error(line, _describe(e))
+                continue
+
+            key = _key(color)
+            if key in colors:
+                # a repeat within the file conflicts with its first occurrence
+                if on_conflict == 'update':
+                    colors[key] = color
+                else:
+                    report.skipped += 1
+                continue
+
+            colors[key] = color
+
+        if not colors:
+            continue
+
+        # narrow by two indexed-friendly columns, then match the full key in Python
+        existing = {
+            tuple(values[1:]): values[0]
+            for values in AnalogColor.objects.using(using).filter(
+                name__in={key[UNIQUE_FIELDS.index('name')] for key in colors},
+                brandname__in={key[UNIQUE_FIELDS.index('brandname')] for key in colors},
+            ).values_list('id', *UNIQUE_FIELDS).iterator()
+        }
+
+        new_colors = [color for key, color in colors.items() if key not in existing]
+        conflicts = [color for key, color in colors.items() if key in existing]
+
+        with transaction.atomic(using=using):
+            AnalogColor.objects.using(using).bulk_create(new_colors, batch_size=chunk_size, ignore_conflicts=True)
+            report.created += len(new_colors)
+
+            if on_conflict == 'update' and conflicts:
+                now = timezone.now()
+                for color in conflicts:
+                    color.pk = existing[_key(color)]
+                    color.updated_at = now
+                AnalogColor.objects.using(using).bulk_update(conflicts, UPDATE_FIELDS, batch_size=chunk_size)
+                report.updated += len(conflicts)
+                updated_ids.extend(color.pk for color in conflicts)
+            else:
+                report.skipped += len(conflicts)
+
+    # bulk writes send no signals; the autocomplete index is rebuilt on its next use
+    if report.created or report.updated:
+        search.reset_color_search_index(using)
+
+    # new colors have neither a digital color nor a recipe, so only updated ones (tinting, opaqueness, additives) can
+    # change a prediction, theirs or a mix's
+    predictions.refresh(updated_ids, using)
+
+    return report
@@ -0,0 +1,129 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import deferred
+from .recipes import RecipeCycleError, load_recipe_edges
+
+
+logger = logging.getLogger(__name__)
+
+
+def _check_acyclic(color_id, edges, checked, path):
+    if color_id in checked:
+        return
+
+    if color_id in path:
+        cycle = ' -> '.join(str(step) for step in [*path[path.index(color_id):], color_id])
+        raise RecipeCycleError(f'recipe cycle between AnalogColors {cycle}')
+
+    path.append(color_id)
+    for ingredient_id, _ in edges.get(color_id, ()):
+        _check_acyclic(ingredient_id, edges, checked, path)
+    path.pop()
+
+    checked.add(color_id)
+
+
+def _paths(color_id, edges, checked=None):
+    """
+        {(descendant_id, depth): multiplier} for every ingredient reachable from color_id
+
+        goes one depth at a time, summing the multipliers of every path that reaches a color at that depth, so shared
+        ingredients cost one visit per depth rather than one per path. raises RecipeCycleError when a recipe reachable
+        from color_id (indirectly) contains itself; checked holds colors already known to be acyclic, to share between
+        calls over the same edges
+    """
+
+    _check_acyclic(color_id, edges, set() if checked is None else checked, [])
+
+    paths = {}
+    frontier = {color_id: 1}
+    depth = 0
+
+    while frontier:
+        depth += 1
+        following = defaultdict(int)
+        for origin_id, multiplier in frontier.items():
+            for ingredient_id, quantity in edges.get(origin_id, ()):
+                following[ingredient_id] += multiplier * quantity
+
+        for descendant_id, multiplier in following.items():
+            paths[(descendant_id, depth)] = multiplier
+        frontier = following
+
+    return paths
+
+
+def _closure_rows(ancestor_ids, edges):
+    from .models import RecipeClosure
+
+    checked = set()
+    for ancestor_id in ancestor_ids:
+        for (descendant_id, depth), multiplier in _paths(ancestor_id, edges, checked).items():
+            yield RecipeClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth, multiplier=multiplier)
+
+
+def refresh(color_ids, using='default', batch_size=1000):
+    """
+        recompute the closure rows of color_ids and of every mix that uses any of them; raises RecipeCycleError,
+        leaving the rows as they were, when one of those recipes (indirectly) contains itself
+    """
+
+    from .models import AnalogColor, RecipeClosure
+
+    color_ids = set(color_ids)
+    affected = color_ids | set(
+        RecipeClosure.objects.using(using).filter(descendant_id__in=color_ids).values_list('ancestor_id', flat=True)
+    )
+    # colors deleted in the meantime take their closure rows with them
+    affected = set(AnalogColor.objects.using(using).filter(id__in=affected).values_list('id', flat=True))
+
+    edges = load_recipe_edges(affected, using)
+
+    with transaction.atomic(using=using):
+        RecipeClosure.objects.using(using).filter(ancestor_id__in=color_ids | affected).delete()
+        RecipeClosure.objects.using(using).bulk_create(_closure_rows(affected, edges), batch_size=batch_size)
+
+
+def rebuild(using='default', batch_size=1000):
+    """
+        recompute the whole closure table from AnalogRecipe
+
+        returns the number of closure rows written; raises RecipeCycleError when a recipe (indirectly) contains itself
+    """
+
+    from .models import AnalogRecipe, RecipeClosure
+
+    edges = defaultdict(list)
+    for origin_id, ingredient_id, quantity in AnalogRecipe.objects.using(using).values_list('origin_color_id', 'ingredient_id', 'quantity').order_by('origin_color_id', 'ingredient_id').iterator():
+        edges[origin_id].append((ingredient_id, quantity))
+
+    rows = list(_closure_rows(list(edges), edges))
+
+    with transaction.atomic(using=using):
+        RecipeClosure.objects.using(using).all().delete()
+        RecipeClosure.objects.using(using).bulk_create(rows, batch_size=batch_size)
+
+    return len(rows)
+
+
+def _refresh_pending(using, color_ids):
+    try:
+        refresh(color_ids, using)
+    except RecipeCycleError:
+        # runs after the recipe change has committed; the closure keeps its previous rows until the cycle is broken
+        logger.warning('recipe closure not refreshed for AnalogColors %s', sorted(color_ids), exc_info=True)
+
+
+_refreshes = deferred.Deferred(_refresh_pending)
+
+
+def schedule_refresh(color_id, using='default'):
+    """
+        refresh color_id once the current transaction commits (immediately in autocommit mode), so a burst of recipe
+        changes in one transaction costs a single refresh; a recipe cycle is logged rather than raised
+    """
+
+    _refreshes.schedule(using, color_ids=[color_id])
@@ -0,0 +1,399 @@
+import numbers
+
+import numpy as np
+
+
+# packed values are 0xRRGGBBAA
+_SHIFTS = np.array([24, 16, 8, 0], dtype=np.int64)
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype='S1')
+_HEX_NIBBLES = np.full(256, -1, dtype=np.int64)
+_HEX_NIBBLES[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_HEX_NIBBLES[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_NIBBLES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+
+def as_values(values):
+    """
+        coerce an int, a sequence of ints or an array of packed RGBA integers to a 1-d int64 array
+    """
+
+    return np.atleast_1d(np.asarray(values, dtype=np.int64))
+
+
+def to_channels(values):
+    """
+        packed RGBA integers -> uint8 array of shape (n, 4)
+    """
+
+    return ((as_values(values)[:, None] >> _SHIFTS) & 0xff).astype(np.uint8)
+
+
+def from_channels(channels):
+    """
+        integer array of shape (n, 4) with values 0..255 -> packed RGBA integers
+    """
+
+    channels = np.clip(np.rint(np.asarray(channels, dtype=np.float64)), 0, 255).astype(np.int64)
+
+    return (channels.reshape(-1, 4) << _SHIFTS).sum(axis=1)
+
+
+def to_rgba(values):
+    """
+        packed RGBA integers -> float array of shape (n, 4): red, green, blue (0..255), alpha (0..1.0, two decimals)
+    """
+
+    rgba = to_channels(values).astype(np.float64)
+    rgba[:, 3] = np.round(rgba[:, 3] / 255, 2)
+
+    return rgba
+
+
+def from_rgba(rgba):
+    """
+        array of shape (n, 4): red, green, blue (0..255), alpha (0..1.0) -> packed RGBA integers
+    """
+
+    channels = np.array(rgba, dtype=np.float64).reshape(-1, 4)
+    channels[:, 3] *= 255
+
+    return from_channels(channels)
+
+
+def to_hsla(values):
+    """
+        packed RGBA integers -> float array of shape (n, 4): hue (degrees 0..360), saturation, lightness, alpha (all 0..1.0)
+    """
+
+    rgba = to_rgba(values)
+    rgb = rgba[:, :3] / 255
+
+    max_value = rgb.max(axis=1)
+    min_value = rgb.min(axis=1)
+    delta = max_value - min_value
+    L = (max_value + min_value) / 2
+
+    chromatic = delta > 0
+    safe_delta = np.where(chromatic, delta, 1.0)
+
+    s = np.where(chromatic, delta / np.where(L <= 0.5, max_value + min_value, 2.0 - max_value - min_value).clip(min=1e-12), 0.0)
+
+    r, g, b = rgb.T
+    h = np.where(
+        r == max_value,
+        (g - b) / safe_delta,
+        np.where(g == max_value, 2.0 + (b - r) / safe_delta, 4.0 + (r - g) / safe_delta),
+    )
+    h = np.where(chromatic, (h * 60) % 360, 0.0)
+
+    return np.column_stack([h, s, L, rgba[:, 3]])
+
+
+def from_hsla(hsla):
+    """
+        array of shape (n, 4): hue (degrees), saturation, lightness, alpha (all 0..1.0) -> packed RGBA integers
+    """
+
+    h, s, L, a = np.asarray(hsla, dtype=np.float64).reshape(-1, 4).T
+
+    chroma = s * np.minimum(L, 1 - L)
+    k = (np.array([0, 8, 4])[:, None] + (h % 360) / 30) % 12
+    rgb = L - chroma * np.clip(np.minimum(k - 3, 9 - k), -1, 1)
+
+    return from_rgba(np.column_stack([rgb.T * 255, a]))
+
+
+def to_cmyk(values):
+    """
+        packed RGBA integers -> float array of shape (n, 4): cyan, magenta, yellow, black (all 0..1.0)
+    """
+
+    rgb = to_channels(values)[:, :3] / 255
+
+    k = 1 - rgb.max(axis=1)
+    white = np.where(k < 1, 1 - k, 1.0)
+    cmy = np.where((k < 1)[:, None], (1 - rgb - k[:, None]) / white[:, None], 0.0)
+
+    return np.column_stack([cmy, k])
+
+
+def from_cmyk(cmyk, alpha=1.0):
+    """
+        array of shape (n, 4): cyan, magenta, yellow, black (all 0..1.0) -> packed RGBA integers
+    """
+
+    cmyk = np.asarray(cmyk, dtype=np.float64).reshape(-1, 4)
+    rgb = 255 * (1 - cmyk[:, :3]) * (1 - cmyk[:, 3:])
+    a = np.broadcast_to(np.asarray(alpha, dtype=np.float64), (len(cmyk),))
+
+    return from_rgba(np.column_stack([rgb, a]))
+
+
+def to_hex(values):
+    """
+        packed RGBA integers -> str array of '0xrrggbbaa' values
+    """
+
+    values = as_values(values)
+    nibbles = (values[:, None] >> np.arange(28, -1, -4)) & 0xf
+    digits = np.ascontiguousarray(_HEX_DIGITS[nibbles]).view('S8').ravel()
+
+    return np.char.add('0x', digits.astype('U8'))
+
+
+def _normalize_hex(hex_value):
+    if hex_value.startswith('#'):
+        hex_value = hex_value[1:]
+
+    if hex_value.startswith('0x'):
+        hex_value = hex_value[2:]
+
+    hex_length = len(hex_value)
+
+    if hex_length == 3 or hex_length == 4:
+        hex_value = ''.join(digit * 2 for digit in hex_value)
+        hex_length *= 2
+
+    if hex_length == 6:
+        return f'{hex_value}ff'
+    elif hex_length == 8:
+        return hex_value
+    else:
+        raise TypeError('hex value must be three, four, six or eight digits')
+
+
+def from_hex(hex_values):
+    """
+        str or sequence of str ('#rgb', '#rgba', '#rrggbb', '#rrggbbaa', with or without '#' or '0x') -> packed RGBA integers
+    """
+
+    if isinstance(hex_values, str):
+        hex_values = [hex_values]
+
+    if not all(isinstance(hex_value, str) for hex_value in hex_values):
+        raise TypeError('hex values must be strings')
+
+    normalized = np.array([_normalize_hex(hex_value) for hex_value in hex_values], dtype='S8')
+    nibbles = _HEX_NIBBLES[normalized.view(np.uint8).reshape(-1, 8)]
+
+    if (nibbles < 0).any():
+        raise TypeError('hex value must only contain hexadecimal digits')
+
+    return (nibbles << np.arange(28, -1, -4)).sum(axis=1)
+
+
+# scalar helpers shared by DigitalColor and anything else holding a single packed value
+
+def rgba_tuple(value):
+    r, g, b, a = to_rgba(value)[0]
+
+    return (int(r), int(g), int(b), float(a))
+
+
+def hsla_tuple(value):
+    h, s, L, a = to_hsla(value)[0]
+
+    return (int(round(h)) % 360, f'{int(round(s * 100))}%', f'{int(round(L * 100))}%', float(a))
+
+
+def cmyk_tuple(value):
+    return tuple(f'{int(round(channel * 100))}%' for channel in to_cmyk(value)[0])
+
+
+def hex_string(value):
+    return str(to_hex(value)[0])
+
+
+def as_packed(color):
+    """
+        DigitalColor, packed RGBA integer, hex str or (red, green, blue[, alpha]) tuple -> packed RGBA integer
+    """
+
+    if hasattr(color, '_integer_value'):
+        return int(color._integer_value)
+
+    if isinstance(color, str):
+        return int(from_hex(color)[0])
+
+    if isinstance(color, (tuple, list)):
+        if len(color) == 3:
+            color = (*color, 1.0)
+
+        return int(from_rgba(color)[0])
+
+    return int(color)
+
+
+def fraction(value):
+    """
+        str(with or without '%') or int(0..100) or float(0..1.0) -> float(0..1.0)
+    """
+
+    if type(value) is str:
+        return float(value.split('%')[0]) / 100
+    if isinstance(value, numbers.Integral):
+        return value / 100
+
+    value = float(value)
+    if value > 1.0:
+        value /= 100
+
+    return value
+
+
+# CIELAB (D65 white point, sRGB primaries)
+
+_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def srgb_to_linear(rgb):
+    """
+        float array of sRGB components (0..1.0) -> linear light components (0..1.0)
+    """
+
+    rgb = np.asarray(rgb, dtype=np.float64)
+
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(linear):
+    """
+        float array of linear light components (0..1.0) -> sRGB components (0..1.0)
+    """
+
+    linear = np.clip(np.asarray(linear, dtype=np.float64), 0, 1)
+
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def linear_to_lab(linear):
+    """
+        float array of shape (n, 3): linear light red, green, blue (0..1.0) -> float array of shape (n, 3): L*, a*, b*
+    """
+
+    xyz = np.asarray(linear, dtype=np.float64).reshape(-1, 3) @ _SRGB_TO_XYZ.T / _D65_WHITE
+
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    fx, fy, fz = f.T
+
+    return np.column_stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)])
+
+
+def rgb_to_lab(rgb):
+    """
+        float array of shape (n, 3): red, green, blue (0..255) -> float array of shape (n, 3): L*, a*, b*
+    """
+
+    return linear_to_lab(srgb_to_linear(np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255))
+
+
+def lab_to_rgb(lab):
+    """
+        float array of shape (n, 3): L*, a*, b* -> float array of shape (n, 3): red, green, blue (0..255, clipped to gamut)
+    """
+
+    L, a, b = np.asarray(lab, dtype=np.float64).reshape(-1, 3).T
+    fy = (L + 16) / 116
+    f = np.column_stack([fy + a / 500, fy, fy - b / 200])
+
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _D65_WHITE
+    linear = xyz @ np.linalg.inv(_SRGB_TO_XYZ).T
+
+    return linear_to_srgb(linear) * 255
+
+
+def to_lab(values):
+    """
+        packed RGBA integers -> float array of shape (n, 3): L*, a*, b* (alpha is ignored)
+    """
+
+    return rgb_to_lab(to_channels(values)[:, :3])
+
+
+# JSON-friendly batch encodings, e.g. for the conversion endpoint
+
+ENCODINGS = ('value', 'hex', 'rgba', 'hsla', 'cmyk', 'lab')
+
+
+def _rows(data, widths):
+    try:
+        rows = np.asarray(data, dtype=np.float64)
+    except ValueError:
+        raise TypeError('every color must be a list of numbers of the same length')
+
+    if rows.ndim != 2 or rows.shape[1] not in widths:
+        raise TypeError(f'every color must be a list of {" or ".join(str(width) for width in widths)} numbers')
+
+    return rows
+
+
+def _with_alpha(rows):
+    return rows if rows.shape[1] == 4 else np.column_stack([rows, np.ones(len(rows))])
+
+
+def decode(data, encoding):
+    """
+        list of colors in encoding -> packed RGBA integers; raises TypeError for malformed input
+
+            value: packed integers
+            hex: strings, as accepted by from_hex
+            rgba: [red, green, blue(, alpha)], hsla: [hue, saturation, lightness(, alpha)] as produced by to_rgba/to_hsla
+            cmyk: [cyan, magenta, yellow, black] (0..1.0), lab: [L*, a*, b*]
+    """
+
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if encoding == 'value':
+        values = as_values(data)
+        if ((values < 0) | (values > 0xffffffff)).any():
+            raise TypeError('values must be 32-bit packed RGBA integers')
+        return values
+    if encoding == 'hex':
+        return from_hex(data)
+    if encoding == 'rgba':
+        return from_rgba(_with_alpha(_rows(data, (3, 4))))
+    if encoding == 'hsla':
+        return from_hsla(_with_alpha(_rows(data, (3, 4))))
+    if encoding == 'cmyk':
+        return from_cmyk(_rows(data, (4,)))
+    if encoding == 'lab':
+        return from_rgba(_with_alpha(lab_to_rgb(_rows(data, (3,)))))
+
+    raise ValueError(f'encoding must be one of {", ".join(ENCODINGS)}')
+
+
+def encode(values, encoding):
+    """
+        packed RGBA integers -> list of colors in encoding (see decode)
+    """
+
+    if encoding == 'value':
+        return as_values(values).tolist()
+    if encoding == 'hex':
+        return to_hex(values).tolist()
+    if encoding == 'rgba':
+        return to_rgba(values).tolist()
+    if encoding == 'hsla':
+        return to_hsla(values).round(4).tolist()
+    if encoding == 'cmyk':
+        return to_cmyk(values).round(4).tolist()
+    if encoding == 'lab':
+        return to_lab(values).round(4).tolist()
+
+    raise ValueError(f'encoding must be one of {", ".join(ENCODINGS)}')
+
+
+def convert(data, source, targets):
+    """
+        {target: list of colors} for data (list of colors in the source encoding)
+    """
+
+    values = decode(data, source)
+
+    return {target: encode(values, target) for target in targets}
@@ -0,0 +1,52 @@
+"""
+Maintenance work deferred to the end of the current transaction.
+
+Receivers that keep derived tables up to date (the recipe closure, predicted colors) would otherwise redo the same work
+for every row a transaction writes. Deferred.schedule collects ids per database alias and thread and runs the work
+once when the transaction commits, or straight away in autocommit mode.
+
+Every schedule call inside a transaction registers an on_commit callback; the first one to run takes everything
+collected and the others find nothing left. Ids collected in a transaction that was rolled back are picked up by the
+next run, which costs a redundant refresh but never a missed one.
+"""
+
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.db import connections, transaction
+
+
+class Deferred:
+    def __init__(self, run):
+        """
+            run: callable(using, **{name: set of ids}) doing the work
+        """
+
+        self.run = run
+        self._local = threading.local()
+
+    def _pending(self, using):
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = defaultdict(lambda: defaultdict(set))
+
+        return self._local.pending[using]
+
+    def schedule(self, using='default', **ids):
+        pending = self._pending(using)
+        for name, values in ids.items():
+            pending[name].update(values)
+
+        if connections[using].in_atomic_block:
+            transaction.on_commit(partial(self.flush, using), using=using)
+        else:
+            self.flush(using)
+
+    def flush(self, using='default'):
+        pending = self._pending(using)
+        if not any(pending.values()):
+            return
+
+        ids = dict(pending)
+        pending.clear()
+        self.run(using, **ids)
@@ -0,0 +1,462 @@
+"""
+Near-duplicate detection over the DigitalColor and AnalogColor catalogs.
+
+Two colors are near duplicates when their CIEDE2000 difference is within a threshold; clusters are the connected
+groups of such pairs (single linkage), so a cluster can span more than the threshold end to end.
+
+Comparing every pair is out of the question at catalog size, and CIEDE2000 is not a distance a spatial index can use
+directly. Colors are instead placed in a compressed CIELAB space (lightness rescaled by S_L, chroma compressed
+logarithmically by S_C, in the manner of DIN99) where Euclidean distance tracks CIEDE2000 closely. Each color gets a
+reach in that space that bounds its local stretch against CIEDE2000, including the blue-region rotation term, and
+only pairs that fall into neighbouring grid cells within that reach are compared exactly. Half a million colors
+take a few seconds; beyond that the time grows with the number of pairs found.
+
+find() returns the clusters; record() stores them as DuplicateClusters for review in the admin, where merge() folds
+every member of a cluster into its oldest color.
+"""
+
+from collections import namedtuple
+from itertools import product
+
+import numpy as np
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import closure, predictions, recipes
+
+
+KINDS = ('digital', 'analog')
+
+Cluster = namedtuple('Cluster', ['ids', 'delta_e'])
+
+_25_POW_7 = 25.0 ** 7
+
+
+def _reach_margin(threshold):
+    """
+        head room over the local bound of each color's reach, for the weights CIEDE2000 takes from the mean of a
+        pair; measured worst cases on sRGB pairs stay within it up to a threshold of 15
+    """
+
+    return 1.15 + 0.025 * threshold
+
+
+def ciede2000(lab1, lab2):
+    """
+        CIEDE2000 color difference between matching rows of two float arrays of shape (n, 3): L*, a*, b*
+    """
+
+    L1, a1, b1 = np.asarray(lab1, dtype=np.float64).reshape(-1, 3).T
+    L2, a2, b2 = np.asarray(lab2, dtype=np.float64).reshape(-1, 3).T
+
+    mean_c7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(mean_c7 / (mean_c7 + _25_POW_7)))
+    a1, a2 = a1 * (1 + g), a2 * (1 + g)
+
+    c1, c2 = np.hypot(a1, b1), np.hypot(a2, b2)
+    h1 = np.degrees(np.arctan2(b1, a1)) % 360
+    h2 = np.degrees(np.arctan2(b2, a2)) % 360
+    chromatic = c1 * c2 != 0
+
+    dh = h2 - h1
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chromatic, dh, 0.0)
+    dH = 2 * np.sqrt(c1 * c2) * np.sin(np.radians(dh) / 2)
+
+    mean_L = (L1 + L2) / 2
+    mean_c = (c1 + c2) / 2
+    hue_sum = h1 + h2
+    mean_h = np.where(
+        ~chromatic,
+        hue_sum,
+        np.where(np.abs(h1 - h2) <= 180, hue_sum / 2, np.where(hue_sum < 360, hue_sum + 360, hue_sum - 360) / 2),
+    )
+
+    t = (
+        1
+        - 0.17 * np.cos(np.radians(mean_h - 30))
+        + 0.24 * np.cos(np.radians(2 * mean_h))
+        + 0.32 * np.cos(np.radians(3 * mean_h + 6))
+        - 0.20 * np.cos(np.radians(4 * mean_h - 63))
+    )
+    mean_c7 = mean_c ** 7
+    rotation = -np.sin(np.radians(60 * np.exp(-(((mean_h - 275) / 25) ** 2)))) * 2 * np.sqrt(mean_c7 / (mean_c7 + _25_POW_7))
+
+    s_L = 1 + 0.015 * (mean_L - 50) ** 2 / np.sqrt(20 + (mean_L - 50) ** 2)
+    s_C = 1 + 0.045 * mean_c
+    s_H = 1 + 0.015 * mean_c * t
+
+    dL, dC, dH = (L2 - L1) / s_L, (c2 - c1) / s_C, dH / s_H
+
+    return np.sqrt(np.maximum(dL ** 2 + dC ** 2 + dH ** 2 + rotation * dC * dH, 0))
+
+
+_L_AXIS = np.linspace(-10, 110, 12001)
+_L_S = 1 + 0.015 * (_L_AXIS - 50) ** 2 / np.sqrt(20 + (_L_AXIS - 50) ** 2)
+_L_COMPRESSED = np.concatenate([[0], np.cumsum((1 / _L_S[1:] + 1 / _L_S[:-1]) / 2 * np.diff(_L_AXIS))])
+
+
+def compressed(lab):
+    """
+        (points, stretch) for a float array of shape (n, 3): L*, a*, b*
+
+        points: float array of shape (n, 3) in which a CIEDE2000 difference of d is, close to each point, a euclidean
+        distance of at most d * stretch
+    """
+
+    L, a, b = np.asarray(lab, dtype=np.float64).reshape(-1, 3).T
+
+    c7 = np.hypot(a, b) ** 7
+    a = a * (1.5 - 0.5 * np.sqrt(c7 / (c7 + _25_POW_7)))
+    c = np.hypot(a, b)
+    h = np.arctan2(b, a)
+    c_compressed = np.log1p(0.045 * c) / 0.045
+
+    points = np.column_stack([np.interp(L, _L_AXIS, _L_COMPRESSED), c_compressed * np.cos(h), c_compressed * np.sin(h)])
+
+    # CIEDE2000 squared is z² + x² + y² + R_T·x·y in the scaled lightness (z), chroma (x) and hue (y) differences;
+    # the compressed space measures z² + x² + k²·y², so the worst stretch is the largest generalized eigenvalue
+    degrees = np.degrees(h) % 360
+    t = (
+        1
+        - 0.17 * np.cos(np.radians(degrees - 30))
+        + 0.24 * np.cos(np.radians(2 * degrees))
+        + 0.32 * np.cos(np.radians(3 * degrees + 6))
+        - 0.20 * np.cos(np.radians(4 * degrees - 63))
+    )
+    k = np.where(c > 1e-9, c_compressed * (1 + 0.015 * c * t) / np.maximum(c, 1e-9), 1.0)
+    c7 = c ** 7
+    rotation = np.sin(np.radians(60 * np.exp(-(((degrees - 275) / 25) ** 2)))) * 2 * np.sqrt(c7 / (c7 + _25_POW_7))
+
+    determinant = 1 - rotation ** 2 / 4
+    spread = (1 + k ** 2) ** 2 - 4 * k ** 2 * determinant
+    largest = ((1 + k ** 2) + np.sqrt(np.maximum(spread, 0))) / (2 * determinant)
+
+    return points, np.sqrt(np.maximum(largest, 1.0))
+
+
+def _expand(first_starts, first_counts, second_starts, second_counts, chunk_size=1 << 20):
+    """
+        (positions in the first run, positions in the second run) for every pairing of the runs, in chunks of about
+        chunk_size pairs
+    """
+
+    sizes = first_counts * second_counts
+    ends = np.cumsum(sizes)
+    bounds = np.searchsorted(ends, np.arange(chunk_size, ends[-1] if len(ends) else 0, chunk_size), 'right')
+
+    for chunk in np.split(np.arange(len(sizes)), bounds):
+        chunk_sizes = sizes[chunk]
+        runs = np.repeat(chunk, chunk_sizes)
+        within = np.arange(len(runs)) - np.repeat(np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes)
+
+        yield first_starts[runs] + within // second_counts[runs], second_starts[runs] + within % second_counts[runs]
+
+
+def _candidates(points, reach, cell_size, groups):
+    """
+        (i, j) with i < j for every pair closer than the reach of either point, among points in the same group
+    """
+
+    cells = np.floor(points / cell_size).astype(np.int64)
+    steps = np.maximum(np.ceil(reach / cell_size).astype(np.int64), 1)
+    padding = int(steps.max())
+    cells -= cells.min(axis=0) - padding
+    dimensions = cells.max(axis=0) + padding + 1
+
+    strides = np.array([dimensions[1] * dimensions[2], dimensions[2], 1], dtype=np.int64)
+    keys = cells @ strides + groups * int(np.prod(dimensions))
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    cell_keys, cell_starts, cell_counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    near, far = [], []
+
+    x, y, z = np.ascontiguousarray(points.T, dtype=np.float32)
+
+    def keep(found, i, j, limit):
+        close = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 + (z[i] - z[j]) ** 2 <= limit ** 2
+        found.append(np.minimum(i[close], j[close]) * len(points) + np.maximum(i[close], j[close]))
+
+    # pairs within a cell or between neighbouring cells, each pair of cells once
+    for offset in product((-1, 0, 1), repeat=3):
+        delta = int(np.dot(offset, strides))
+        if delta < 0:
+            continue
+
+        neighbors = np.minimum(np.searchsorted(cell_keys, cell_keys + delta), len(cell_keys) - 1)
+        hit = np.flatnonzero(cell_keys[neighbors] == cell_keys + delta)
+        for first, second in _expand(cell_starts[hit], cell_counts[hit], cell_starts[neighbors[hit]], cell_counts[neighbors[hit]]):
+            if delta == 0:
+                first, second = first[first < second], second[first < second]
+
+            i, j = order[first], order[second]
+            keep(near, i, j, np.maximum(reach[i], reach[j]))
+
+    # colors that reach past the neighbouring cells look further out on their own, in key order so that every lookup
+    # below is sorted, which searchsorted answers far faster
+    for step in range(2, padding + 1):
+        members = order[steps[order] >= step]
+        if not len(members):
+            continue
+
+        for offset in product(range(-step, step + 1), repeat=3):
+            if max(map(abs, offset)) != step:
+                continue
+            # cells whose nearest corner is out of reach of anything in the member's cell
+            if sum(max(abs(o) - 1, 0) ** 2 for o in offset) > step ** 2:
+                continue
+
+            neighbor_keys = keys[members] + int(np.dot(offset, strides))
+            start = np.searchsorted(sorted_keys, neighbor_keys, 'left')
+            counts = np.searchsorted(sorted_keys, neighbor_keys, 'right') - start
+
+            for member_positions, positions in _expand(np.arange(len(members)), np.ones(len(members), dtype=np.int64), start, counts):
+                i = members[member_positions]
+                keep(far, i, order[positions], reach[i])
+
+    # pairs of neighbouring cells come up once each, those further apart once from each end that reaches
+    codes = np.concatenate([np.empty(0, dtype=np.int64), *near, *([np.unique(np.concatenate(far))] if far else [])])
+
+    return codes // len(points), codes % len(points)
+
+
+def near_pairs(lab, threshold, groups=None, chunk_size=1 << 20):
+    """
+        (i, j, delta_e) for every pair of rows of lab, i < j, within CIEDE2000 threshold of each other; with groups
+        (integer array, one per row), only pairs within the same group
+    """
+
+    if not threshold > 0:
+        raise ValueError('threshold must be positive')
+
+    lab = np.asarray(lab, dtype=np.float64).reshape(-1, 3)
+    if len(lab) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    groups = np.zeros(len(lab), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+
+    points, stretch = compressed(lab)
+    # cells a little wider than the reach of most colors, so that nearly all pairs are between neighbouring cells
+    reach = threshold * _reach_margin(threshold) * stretch
+    i, j = _candidates(points, reach, threshold * _reach_margin(threshold) * 1.2, groups)
+
+    found = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))]
+    for start in range(0, len(i), chunk_size):
+        chunk_i, chunk_j = i[start:start + chunk_size], j[start:start + chunk_size]
+        delta_e = ciede2000(lab[chunk_i], lab[chunk_j])
+        close = delta_e <= threshold
+        found.append((chunk_i[close], chunk_j[close], delta_e[close]))
+
+    return tuple(np.concatenate(column) for column in zip(*found))
+
+
+def components(count, i, j):
+    """
+        connected component label of each of count rows given the pairs (i, j): the smallest row in its component
+    """
+
+    labels = np.arange(count)
+
+    while True:
+        low = np.minimum(labels[i], labels[j])
+        updated = labels.copy()
+        np.minimum.at(updated, i, low)
+        np.minimum.at(updated, j, low)
+        updated = updated[updated]
+
+        if np.array_equal(updated, labels):
+            return labels
+
+        labels = updated
+
+
+def cluster(ids, lab, threshold, groups=None):
+    """
+        [Cluster] of ids (ascending) linked by near-duplicate pairs, largest first; delta_e is each member's
+        CIEDE2000 difference from the first (oldest) member
+    """
+
+    ids = np.asarray(ids, dtype=np.int64)
+    lab = np.asarray(lab, dtype=np.float64).reshape(-1, 3)
+
+    order = np.argsort(ids, kind='stable')
+    ids, lab = ids[order], lab[order]
+    groups = None if groups is None else np.asarray(groups)[order]
+
+    i, j, _ = near_pairs(lab, threshold, groups)
+    labels = components(len(ids), i, j)
+
+    linked = np.unique(np.concatenate([i, j]))
+    members = linked[np.argsort(labels[linked], kind='stable')]
+    boundaries = np.flatnonzero(np.diff(labels[members])) + 1
+
+    # the label of a component is its smallest row, which is also its oldest id
+    delta_e = ciede2000(lab[labels[members]], lab[members]).round(4)
+
+    clusters = [
+        Cluster(cluster_ids.tolist(), cluster_delta_e.tolist())
+        for cluster_ids, cluster_delta_e in zip(np.split(ids[members], boundaries), np.split(delta_e, boundaries))
+    ] if len(members) else []
+
+    clusters.sort(key=lambda found: (-len(found.ids), found.ids[0]))
+
+    return clusters
+
+
+def _digital_colors(using):
+    from .models import DigitalColor
+
+    rows = DigitalColor.objects.using(using).values_list('id', 'lab_l', 'lab_a', 'lab_b').order_by('id')
+    rows = np.array(list(rows.iterator(chunk_size=10000)), dtype=np.float64).reshape(-1, 4)
+
+    return rows[:, 0].astype(np.int64), rows[:, 1:], None
+
+
+def _analog_colors(using):
+    from .models import AnalogColor
+
+    rows = list(
+        AnalogColor.objects.using(using)
+        .filter(digital_color__isnull=False)
+        .values_list('id', 'medium', 'digital_color__lab_l', 'digital_color__lab_a', 'digital_color__lab_b')
+        .order_by('id')
+        .iterator(chunk_size=10000)
+    )
+
+    media = {medium: number for number, medium in enumerate(sorted({row[1] for row in rows}))}
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lab = np.array([row[2:] for row in rows], dtype=np.float64).reshape(-1, 3)
+    groups = np.array([media[row[1]] for row in rows], dtype=np.int64)
+
+    return ids, lab, groups
+
+
+def find(kind, threshold=1.0, using='default'):
+    """
+        [Cluster] of near-duplicate DigitalColors (kind 'digital') or AnalogColors (kind 'analog': same medium, compared
+        by their digital colors) within CIEDE2000 threshold
+    """
+
+    if kind not in KINDS:
+        raise ValueError(f'kind must be one of {", ".join(KINDS)}')
+
+    ids, lab, groups = (_digital_colors if kind == 'digital' else _analog_colors)(using)
+
+    return cluster(ids, lab, threshold, groups)
+
+
+def record(kind, threshold=1.0, using='default', batch_size=1000):
+    """
+        replace the open DuplicateClusters of kind with freshly found ones; clusters contained in one dismissed
+        before are left out
+
+        returns the number of clusters written
+    """
+
+    from .models import DuplicateCluster, DuplicateClusterMember
+
+    found = find(kind, threshold, using)
+    field = f'{kind}_color_id'
+
+    dismissed = {}
+    for cluster_id, color_id in DuplicateClusterMember.objects.using(using).filter(
+        cluster__kind=kind, cluster__status='dismissed',
+    ).values_list('cluster_id', field).iterator():
+        dismissed.setdefault(cluster_id, set()).add(color_id)
+
+    dismissed_sets = list(dismissed.values())
+    found = [candidate for candidate in found if not any(set(candidate.ids) <= ids for ids in dismissed_sets)]
+
+    with transaction.atomic(using=using):
+        DuplicateCluster.objects.using(using).filter(kind=kind, status='open').delete()
+
+        clusters = [
+            DuplicateCluster(kind=kind, threshold=threshold, size=len(candidate.ids), max_delta_e=max(candidate.delta_e))
+            for candidate in found
+        ]
+        if connections[using].features.can_return_rows_from_bulk_insert:
+            DuplicateCluster.objects.using(using).bulk_create(clusters, batch_size=batch_size)
+        else:
+            # the members need the new ids, which a bulk insert only hands back where the backend supports RETURNING
+            for duplicate_cluster in clusters:
+                duplicate_cluster.save(using=using)
+
+        DuplicateClusterMember.objects.using(using).bulk_create(
+            (
+                DuplicateClusterMember(cluster=duplicate_cluster, delta_e=delta_e, **{field: color_id})
+                for duplicate_cluster, candidate in zip(clusters, found)
+                for color_id, delta_e in zip(candidate.ids, candidate.delta_e)
+            ),
+            batch_size=batch_size,
+        )
+
+    return len(clusters)
+
+
+def _merge_digital_colors(keep_id, merged_ids, using):
+    from .models import AnalogColor, DigitalColor
+
+    # update() leaves auto_now alone; bump updated_at so conditional GETs see the new digital_color_id
+    AnalogColor.objects.using(using).filter(digital_color_id__in=merged_ids).update(digital_color_id=keep_id, updated_at=timezone.now())
+    predictions.schedule_refresh(digital_color_ids=[keep_id], using=using)
+    DigitalColor.objects.using(using).filter(id__in=merged_ids).delete()
+
+
+def _merge_analog_colors(keep_id, merged_ids, using):
+    from .models import AnalogColor, AnalogRecipe
+    from .signals import analog_colors_merged
+
+    # mixes that used a merged color use the kept one instead, adding up where they already used both
+    for recipe in AnalogRecipe.objects.using(using).filter(ingredient_id__in=merged_ids).exclude(origin_color_id__in=merged_ids):
+        existing = AnalogRecipe.objects.using(using).filter(origin_color_id=recipe.origin_color_id, ingredient_id=keep_id)
+        if recipe.origin_color_id == keep_id:
+            recipe.delete()
+        elif existing.update(quantity=F('quantity') + recipe.quantity):
+            recipe.delete()
+        else:
+            recipe.ingredient_id = keep_id
+            recipe.save(update_fields=['ingredient'])
+
+    analog_colors_merged.send(sender=AnalogColor, keep_id=keep_id, merged_ids=merged_ids, using=using)
+
+    for color in AnalogColor.objects.using(using).filter(id__in=merged_ids):
+        color.delete()
+
+    recipes.invalidate(keep_id, using)
+    closure.schedule_refresh(keep_id, using)
+
+
+def merge(duplicate_cluster, keep=None, using='default'):
+    """
+        fold every member of duplicate_cluster into keep (a member id; defaults to the oldest member) and mark the
+        cluster merged
+
+            digital: AnalogColors of the merged DigitalColors point at the kept one
+            analog: mixes using a merged AnalogColor use the kept one; receivers of signals.analog_colors_merged move
+            anything else (inventory) over before the merged colors are deleted
+
+        returns the id kept
+    """
+
+    field = f'{duplicate_cluster.kind}_color_id'
+    member_ids = sorted(
+        color_id for color_id in duplicate_cluster.members.using(using).values_list(field, flat=True) if color_id is not None
+    )
+    if keep is None:
+        keep = member_ids[0] if member_ids else None
+    if keep not in member_ids:
+        raise ValueError(f'{keep} is not a member of the cluster')
+
+    merged_ids = [color_id for color_id in member_ids if color_id != keep]
+
+    with transaction.atomic(using=using):
+        if merged_ids:
+            (_merge_digital_colors if duplicate_cluster.kind == 'digital' else _merge_analog_colors)(keep, merged_ids, using)
+
+        duplicate_cluster.status = 'merged'
+        duplicate_cluster.resolved_at = timezone.now()
+        duplicate_cluster.save(using=using, update_fields=['status', 'resolved_at'])
+
+    return keep
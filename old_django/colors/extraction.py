@@ -0,0 +1,154 @@
+"""
+Dominant-color extraction from images, matched against the stored catalogs.
+
+Images are downscaled while decoding where the format allows it (JPEG draft mode decodes a 24 megapixel photo at
+1/8 scale); other formats are decoded at their own size and reduced by an integer factor right away, before any mode
+conversion. Either way they are then thumbnailed and randomly sampled, so time and the arrays handed on are bounded
+by max_side and sample_size rather than by the size of the original. Only decompression-bomb sizes (max_pixels) are
+refused, before anything is decoded. The sampled pixels are clustered with k-means in CIELAB, so clusters follow
+perceptual differences.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from . import conversions
+from .models import AnalogColor, DigitalColor
+
+
+# larger images are refused as decompression bombs; a 64 megapixel RGB image is about 190 MB decoded
+MAX_PIXELS = 64000000
+
+DominantColor = namedtuple('DominantColor', ['value', 'share', 'digital_color', 'digital_delta_e', 'analog_color', 'analog_delta_e'])
+
+
+def load_pixels(source, max_side=512, sample_size=100000, seed=0, max_pixels=MAX_PIXELS):
+    """
+        source: path or file object; returns a float array of shape (n, 3) of sampled red, green, blue (0..255) pixels,
+        fully transparent pixels excluded
+
+        raises ValueError for images of more than max_pixels pixels (after JPEG draft mode) and OSError for images that
+        cannot be decoded
+    """
+
+    with Image.open(source) as image:
+        # only the header has been read so far
+        image.draft('RGB', (max_side, max_side))
+        if image.width * image.height > max_pixels:
+            raise ValueError(f'images may have at most {max_pixels} pixels')
+
+        reduced = image
+        factor = min(image.width, image.height) // max_side
+        if factor > 1 and image.mode not in ('P', '1'):
+            # averages factor x factor blocks in the image's own mode, so nothing at full size is converted to RGBA;
+            # palette and bilevel images cannot be averaged and go to thumbnail() as they are
+            reduced = image.reduce(factor)
+
+        reduced.thumbnail((max_side, max_side), Image.BILINEAR)
+        pixels = np.asarray(reduced.convert('RGBA')).reshape(-1, 4)
+
+    pixels = pixels[pixels[:, 3] > 0, :3].astype(np.float64)
+
+    if len(pixels) > sample_size:
+        pixels = pixels[np.random.default_rng(seed).choice(len(pixels), sample_size, replace=False)]
+
+    return pixels
+
+
+def kmeans(points, k, iterations=20, tolerance=1e-3, seed=0):
+    """
+        vectorized k-means with k-means++ seeding; returns (centers (k, d), member counts (k,)) sorted by count, largest
+        first. empty clusters are dropped, so fewer than k centers may come back
+    """
+
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+
+    centers = [points[rng.integers(len(points))]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        if closest.sum() == 0:
+            break
+        centers.append(points[rng.choice(len(points), p=closest / closest.sum())])
+        closest = np.minimum(closest, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, without materializing (n, k, d)
+        distances = (points ** 2).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        labels = distances.argmin(axis=1)
+
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+
+        occupied = counts > 0
+        moved = np.zeros_like(centers)
+        moved[occupied] = sums[occupied] / counts[occupied, None]
+        moved[~occupied] = centers[~occupied]
+
+        shift = np.abs(moved - centers).max()
+        centers = moved
+        if shift < tolerance:
+            break
+
+    distances = (points ** 2).sum(axis=1)[:, None] - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+    counts = np.bincount(distances.argmin(axis=1), minlength=len(centers))
+
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+
+    return centers[order], counts[order]
+
+
+def _nearest_analog_colors(lab, using):
+    rows = list(
+        AnalogColor.objects.using(using).filter(digital_color__isnull=False).values_list(
+            'id', 'digital_color__lab_l', 'digital_color__lab_a', 'digital_color__lab_b',
+        )
+    )
+    if not rows:
+        return [(None, None)] * len(lab)
+
+    ids = np.array([row[0] for row in rows])
+    catalog = np.array([row[1:] for row in rows], dtype=np.float64)
+
+    distances = np.sqrt(((lab[:, None, :] - catalog[None, :, :]) ** 2).sum(axis=2))
+    closest = distances.argmin(axis=1)
+    colors = AnalogColor.objects.using(using).in_bulk(ids[closest].tolist())
+
+    return [(colors[ids[i]], float(distances[row, i])) for row, i in enumerate(closest)]
+
+
+def dominant_colors(source, k=6, max_side=512, sample_size=100000, seed=0, using='default', max_pixels=MAX_PIXELS):
+    """
+        the k dominant colors of the image at source (path or file object), largest share first, each matched to the
+        nearest stored DigitalColor and to the nearest AnalogColor that has a digital_color (CIE76 delta E)
+    """
+
+    pixels = load_pixels(source, max_side=max_side, sample_size=sample_size, seed=seed, max_pixels=max_pixels)
+    if len(pixels) == 0:
+        return []
+
+    centers, counts = kmeans(conversions.rgb_to_lab(pixels), k, seed=seed)
+    values = conversions.from_rgba(np.column_stack([conversions.lab_to_rgb(centers), np.ones(len(centers))]))
+
+    analog_matches = _nearest_analog_colors(centers, using)
+
+    found = []
+    for value, count, (analog_color, analog_delta_e) in zip(values.tolist(), counts.tolist(), analog_matches):
+        digital_matches = DigitalColor.objects.db_manager(using).nearest(value, k=1)
+        digital_color = digital_matches[0] if digital_matches else None
+
+        found.append(DominantColor(
+            value=value,
+            share=count / counts.sum(),
+            digital_color=digital_color,
+            digital_delta_e=digital_color.delta_e if digital_color is not None else None,
+            analog_color=analog_color,
+            analog_delta_e=analog_delta_e,
+        ))
+
+    return found
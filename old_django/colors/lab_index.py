@@ -0,0 +1,216 @@
+import threading
+from collections import defaultdict
+from itertools import product
+
+import numpy as np
+
+from . import conversions
+
+
+_LAB_EXTENT = 256.0
+_shell_offsets = {}
+
+
+class LabIndex:
+    """
+        uniform grid over CIELAB coordinates answering k-nearest and radius queries (euclidean / CIE76 delta E)
+
+        entries are (key, packed RGBA integer) pairs and can be added, moved and removed one at a time
+    """
+
+    def __init__(self, cell_size=8.0):
+        self.cell_size = float(cell_size)
+        self._lock = threading.RLock()
+        self._keys = []
+        self._lab = np.empty((0, 3))
+        self._size = 0
+        self._slots = {}
+        self._free = []
+        self._cells = defaultdict(set)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def _cell(self, lab):
+        return tuple(np.floor(lab / self.cell_size).astype(int))
+
+    def _reserve(self, count):
+        if self._size + count > len(self._lab):
+            grown = np.empty((max(2 * len(self._lab), self._size + count, 64), 3))
+            grown[:self._size] = self._lab[:self._size]
+            self._lab = grown
+
+    def build(self, entries):
+        keys, values = [], []
+        for key, value in entries:
+            keys.append(key)
+            values.append(value)
+
+        with self._lock:
+            self.__init__(cell_size=self.cell_size)
+
+            if not keys:
+                return self
+
+            lab = conversions.to_lab(values)
+            self._reserve(len(keys))
+            self._lab[:len(keys)] = lab
+            self._size = len(keys)
+            self._keys = keys
+            self._slots = {key: slot for slot, key in enumerate(keys)}
+
+            cells = np.floor(lab / self.cell_size).astype(int)
+            for slot, cell in enumerate(map(tuple, cells)):
+                self._cells[cell].add(slot)
+
+        return self
+
+    def add(self, key, value):
+        """
+            insert key, or move it if it is already indexed
+        """
+
+        lab = conversions.to_lab(value)[0]
+
+        with self._lock:
+            if key in self._slots:
+                slot = self._slots[key]
+                self._cells[self._cell(self._lab[slot])].discard(slot)
+            elif self._free:
+                slot = self._free.pop()
+            else:
+                self._reserve(1)
+                slot = self._size
+                self._size += 1
+                self._keys.append(None)
+
+            self._keys[slot] = key
+            self._lab[slot] = lab
+            self._slots[key] = slot
+            self._cells[self._cell(lab)].add(slot)
+
+    def remove(self, key):
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                return
+
+            cell = self._cell(self._lab[slot])
+            self._cells[cell].discard(slot)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+            self._keys[slot] = None
+            self._free.append(slot)
+
+    def _shell(self, center, radius):
+        offsets = _shell_offsets.get(radius)
+        if offsets is None:
+            span = range(-radius, radius + 1)
+            offsets = _shell_offsets[radius] = [offset for offset in product(span, span, span) if max(map(abs, offset)) == radius]
+
+        x, y, z = center
+        for dx, dy, dz in offsets:
+            yield (x + dx, y + dy, z + dz)
+
+    def _gather(self, cells):
+        slots = []
+        for cell in cells:
+            members = self._cells.get(cell)
+            if members:
+                slots.extend(members)
+
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def _results(self, lab, slots):
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        distances = np.sqrt(((self._lab[slots] - lab) ** 2).sum(axis=1))
+        order = np.argsort(distances, kind='stable')
+
+        return slots[order], distances[order]
+
+    def nearest(self, value, k=1):
+        """
+            [(key, delta_e)] for the k indexed colors closest to the packed RGBA integer value, closest first
+        """
+
+        lab = conversions.to_lab(value)[0]
+
+        with self._lock:
+            if not self._slots:
+                return []
+
+            k = min(k, len(self._slots))
+            center = self._cell(lab)
+            # every sRGB color has L* in 0..100 and a*, b* within -128..128
+            max_radius = int(np.ceil(_LAB_EXTENT / self.cell_size)) + 1
+
+            candidates = []
+            for radius in range(max_radius + 1):
+                candidates.append(self._gather(self._shell(center, radius)))
+                found = sum(len(c) for c in candidates)
+
+                # anything outside this shell is at least radius * cell_size away
+                if found >= k:
+                    slots, distances = self._results(lab, np.concatenate(candidates))
+                    if distances[k - 1] <= radius * self.cell_size:
+                        break
+
+            slots, distances = self._results(lab, np.concatenate(candidates))
+
+            return [(self._keys[slot], float(distance)) for slot, distance in zip(slots[:k], distances[:k])]
+
+    def within(self, value, radius):
+        """
+            [(key, delta_e)] for every indexed color no further than radius from the packed RGBA integer value, closest first
+        """
+
+        lab = conversions.to_lab(value)[0]
+
+        with self._lock:
+            center = self._cell(lab)
+            reach = int(np.ceil(radius / self.cell_size))
+            cells = (cell for shell in range(reach + 1) for cell in self._shell(center, shell))
+
+            slots, distances = self._results(lab, self._gather(cells))
+            keep = distances <= radius
+
+            return [(self._keys[slot], float(distance)) for slot, distance in zip(slots[keep], distances[keep])]
+
+
+_digital_color_indexes = {}
+_digital_color_indexes_lock = threading.Lock()
+
+
+def digital_color_index(using='default'):
+    """
+        LabIndex over every DigitalColor in the database, built from the _integer_value column on first use
+        and kept current by the signal handlers in colors.signals
+    """
+
+    from .models import DigitalColor
+
+    with _digital_color_indexes_lock:
+        index = _digital_color_indexes.get(using)
+        if index is None:
+            index = LabIndex().build(DigitalColor.objects.using(using).values_list('id', '_integer_value').iterator())
+            _digital_color_indexes[using] = index
+
+    return index
+
+
+def indexed_digital_colors(using='default'):
+    return _digital_color_indexes.get(using)
+
+
+def reset_digital_color_index(using=None):
+    with _digital_color_indexes_lock:
+        if using is None:
+            _digital_color_indexes.clear()
+        else:
+            _digital_color_indexes.pop(using, None)
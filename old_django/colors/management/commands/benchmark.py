@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from colors import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Time color conversions, recipe resolution, admin changelists and bulk loads against a synthetic catalog '
+        'in throwaway test databases, and write the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analog-colors', type=int, default=2000)
+        parser.add_argument('--recipe-depth', type=int, default=4)
+        parser.add_argument('--digital-colors', type=int, default=20000)
+        parser.add_argument('--inventory-rows', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--sample-size', type=int, default=1000, help='Colors per case for the per-instance cases.')
+        parser.add_argument('--only', nargs='*', help='Only run these cases.')
+        parser.add_argument('--output', help='Write the JSON results here instead of stdout.')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against; exits with status 1 on regressions.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a case counts as a regression.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        databases = runner.setup_databases()
+
+        try:
+            try:
+                loads = benchmarks.generate(
+                    analog_colors=options['analog_colors'],
+                    recipe_depth=options['recipe_depth'],
+                    digital_colors=options['digital_colors'],
+                    inventory_rows=options['inventory_rows'],
+                    seed=options['seed'],
+                )
+            except ValueError as e:
+                raise CommandError(e)
+            results = benchmarks.run(repeat=options['repeat'], sample_size=options['sample_size'], only=options['only'])
+        finally:
+            runner.teardown_databases(databases)
+            teardown_test_environment()
+
+        report = {
+            'environment': benchmarks.environment(),
+            'parameters': {key: options[key] for key in ('analog_colors', 'recipe_depth', 'digital_colors', 'inventory_rows', 'seed', 'repeat', 'sample_size')},
+            'bulk_loads': loads,
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+            regressions = benchmarks.compare(results, baseline, options['tolerance'])
+            for name, before, after, ratio in regressions:
+                self.stderr.write(f'{name}: {before * 1000:.3f}ms -> {after * 1000:.3f}ms ({ratio:.2f}x)')
+
+            if regressions:
+                raise CommandError(f'{len(regressions)} case(s) regressed by more than {options["tolerance"]:.0%}')
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import ImageCms
+
+from colors import profiles
+
+
+class Command(BaseCommand):
+    help = 'Sample a CMYK ICC profile into the lookup tables used for RGB <-> CMYK conversion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CMYK ICC profile (.icc / .icm).')
+        parser.add_argument('--name', help='Profile name for settings.CMYK_PROFILE. Defaults to the file name.')
+        parser.add_argument('--grid', type=int, default=33, help='Grid points per RGB axis.')
+        parser.add_argument('--cmyk-grid', type=int, default=17, help='Grid points per ink.')
+        parser.add_argument('--intent', choices=profiles.INTENTS, default='perceptual')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        name = options['name'] or path.stem
+
+        if options['grid'] < 2 or options['cmyk_grid'] < 2:
+            raise CommandError('grids need at least 2 points per axis')
+
+        try:
+            tables = profiles.sample_icc(path, grid=options['grid'], cmyk_grid=options['cmyk_grid'], intent=options['intent'])
+            saved = profiles.save(name, tables)
+        except (OSError, ValueError, ImageCms.PyCMSError) as e:
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote CMYK profile {name} to {saved}'))
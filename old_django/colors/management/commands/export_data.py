@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from colors import export
+
+
+class Command(BaseCommand):
+    help = 'Stream a whole dataset (colors, recipes, palette or inventory) as NDJSON or CSV, optionally gzipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', help='Write here instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip.')
+        parser.add_argument('--database', help='Defaults to the database the router reads the dataset from.')
+
+    def handle(self, *args, **options):
+        pieces = export.stream(
+            options['dataset'],
+            format=options['format'],
+            compress=options['gzip'],
+            using=options['database'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for piece in pieces:
+                    f.write(piece)
+        else:
+            for piece in pieces:
+                sys.stdout.buffer.write(piece)
+            sys.stdout.buffer.flush()
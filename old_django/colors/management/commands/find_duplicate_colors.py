@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from colors import duplicates
+
+
+class Command(BaseCommand):
+    help = 'Find near-duplicate colors within a CIEDE2000 threshold and record them as clusters for review in the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=duplicates.KINDS, action='append', help='Defaults to both kinds.')
+        parser.add_argument('--threshold', type=float, default=1.0, help='CIEDE2000 difference. Defaults to 1.0.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or duplicates.KINDS:
+            recorded = duplicates.record(kind, options['threshold'], using=options['database'], batch_size=options['batch_size'])
+
+            self.stdout.write(self.style.SUCCESS(f'Recorded {recorded} {kind} duplicate clusters'))
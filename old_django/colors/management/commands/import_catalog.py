@@ -0,0 +1,54 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from colors import catalog
+
+
+class Command(BaseCommand):
+    help = 'Stream AnalogColors from a CSV or NDJSON catalog (optionally gzipped, "-" for stdin) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=catalog.FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--on-conflict', choices=catalog.CONFLICT_ACTIONS, default='skip')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=1000, help='Number of row errors to report.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            name = path[:-3] if path.endswith('.gz') else path
+            format = 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        if path == '-':
+            stream = sys.stdin
+        elif path.endswith('.gz'):
+            stream = gzip.open(path, 'rt', newline='', encoding='utf-8')
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(e)
+
+        try:
+            report = catalog.import_catalog(
+                stream,
+                format=format,
+                on_conflict=options['on_conflict'],
+                chunk_size=options['chunk_size'],
+                using=options['database'],
+                max_errors=options['max_errors'],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for line, message in report.errors:
+            self.stderr.write(f'line {line}: {message}')
+
+        self.stdout.write(self.style.SUCCESS(str(report)))
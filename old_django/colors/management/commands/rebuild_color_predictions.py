@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from colors import predictions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the predicted mix color of every AnalogColor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild. Defaults to the "default" database.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = predictions.rebuild(using=options['database'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} color predictions'))
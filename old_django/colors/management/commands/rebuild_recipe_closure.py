@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from colors import closure, recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the AnalogRecipe transitive closure table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild. Defaults to the "default" database.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            written = closure.rebuild(using=options['database'], batch_size=options['batch_size'])
+        except recipes.RecipeCycleError as e:
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} recipe closure rows'))
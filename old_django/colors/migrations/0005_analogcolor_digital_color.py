@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0004_digitalcolor_unique_digital_color'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analogcolor',
+            name='digital_color',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analog_colors', to='colors.digitalcolor'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0005_analogcolor_digital_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('multiplier', models.BigIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='colors.analogcolor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='colors.analogcolor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recipeclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant', 'depth'), name='unique_recipe_closure_path'),
+        ),
+    ]
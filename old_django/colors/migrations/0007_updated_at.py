@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0006_recipeclosure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analogcolor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
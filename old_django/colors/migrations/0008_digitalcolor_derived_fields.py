@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+from colors import conversions
+
+
+def backfill_derived_fields(apps, schema_editor):
+    DigitalColor = apps.get_model('colors', 'DigitalColor')
+    colors = DigitalColor.objects.using(schema_editor.connection.alias).order_by('pk')
+    batch_size = 2000
+
+    last_pk = 0
+    while batch := list(colors.filter(pk__gt=last_pk).only('pk', '_integer_value')[:batch_size]):
+        values = [color._integer_value for color in batch]
+        hsla = conversions.to_hsla(values)
+        lab = conversions.to_lab(values)
+
+        for color, (h, s, L, _), (lab_l, lab_a, lab_b) in zip(batch, hsla.tolist(), lab.tolist()):
+            color.hue, color.saturation, color.lightness = h, s, L
+            color.lab_l, color.lab_a, color.lab_b = lab_l, lab_a, lab_b
+
+        DigitalColor.objects.using(schema_editor.connection.alias).bulk_update(batch, ['hue', 'saturation', 'lightness', 'lab_l', 'lab_a', 'lab_b'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='hue',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='lab_a',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='lab_b',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='lab_l',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='lightness',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='digitalcolor',
+            name='saturation',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='digitalcolor',
+            index=models.Index(fields=['lab_l', 'lab_a', 'lab_b'], name='digital_color_lab'),
+        ),
+        migrations.RunPython(backfill_derived_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+SEARCH_FIELDS = ['name', 'brandname', 'series']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+        GIN trigram indexes behind colors.search on PostgreSQL; other databases search without them
+    """
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS colors_analogcolor_{field}_trgm ON colors_analogcolor USING gin ({field} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS colors_analogcolor_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0008_digitalcolor_derived_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
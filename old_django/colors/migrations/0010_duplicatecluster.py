@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0009_analogcolor_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('digital', 'DIGITAL'), ('analog', 'ANALOG')], max_length=50)),
+                ('status', models.CharField(choices=[('open', 'OPEN'), ('merged', 'MERGED'), ('dismissed', 'DISMISSED')], default='open', max_length=50)),
+                ('threshold', models.FloatField()),
+                ('size', models.PositiveIntegerField()),
+                ('max_delta_e', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateClusterMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta_e', models.FloatField()),
+                ('analog_color', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_memberships', to='colors.analogcolor')),
+                ('cluster', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='colors.duplicatecluster')),
+                ('digital_color', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_memberships', to='colors.digitalcolor')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='duplicatecluster',
+            index=models.Index(fields=['kind', 'status'], name='duplicate_cluster_status'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0010_duplicatecluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analogcolor',
+            name='predicted_value',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
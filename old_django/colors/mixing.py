@@ -0,0 +1,72 @@
+import numpy as np
+
+from . import conversions
+
+
+# keeps K/S finite for pure black
+_MIN_REFLECTANCE = 1e-3
+# opaqueness a fully transparent paint is mixed with
+_MIN_OPAQUENESS = 5
+
+
+def reflectance(values):
+    """
+        packed RGBA integers -> float array of shape (n, 3): linear light reflectance per channel (alpha is ignored)
+    """
+
+    return np.clip(conversions.srgb_to_linear(conversions.to_channels(values)[:, :3] / 255), _MIN_REFLECTANCE, 1.0)
+
+
+def absorption(reflectances):
+    """
+        Kubelka-Munk single-constant K/S for opaque layers of the given reflectances
+    """
+
+    R = np.asarray(reflectances, dtype=np.float64)
+
+    return (1 - R) ** 2 / (2 * R)
+
+
+def reflectance_from_absorption(ks):
+    """
+        inverse of absorption(): K/S -> reflectance of an infinitely thick layer
+    """
+
+    ks = np.asarray(ks, dtype=np.float64)
+
+    return 1 + ks - np.sqrt(ks ** 2 + 2 * ks)
+
+
+def strength(tinting, opaqueness):
+    """
+        weight of a paint in a mix per part: its tinting strength times its scattering, from the tinting and
+        opaqueness fields (0..100); a fully transparent paint still scatters a little
+    """
+
+    return np.asarray(tinting, dtype=np.float64) / 100 * np.maximum(np.asarray(opaqueness, dtype=np.float64), _MIN_OPAQUENESS) / 100
+
+
+def mix_absorption(ks, weights, extender=0.0, strengths=None):
+    """
+        K/S of a mix: ks has shape (..., m, 3) for m ingredients, weights has shape (..., m) in parts;
+        extender is the number of parts of transparent additive (water, medium, thinner ...) diluting the pigments;
+        strengths, shaped like weights, scale each ingredient's share (see strength(); all 1 by default)
+    """
+
+    weights = np.asarray(weights, dtype=np.float64)
+    parts = weights.sum(axis=-1)
+    effective = weights if strengths is None else weights * np.asarray(strengths, dtype=np.float64)
+
+    mixed = (effective[..., None] * ks).sum(axis=-2) / effective.sum(axis=-1)[..., None]
+
+    return mixed * (parts / (parts + extender))[..., None]
+
+
+def to_values(reflectances):
+    """
+        float array of shape (n, 3): linear light reflectance -> packed RGBA integers (opaque)
+    """
+
+    rgb = conversions.linear_to_srgb(np.asarray(reflectances, dtype=np.float64).reshape(-1, 3)) * 255
+
+    return conversions.from_rgba(np.column_stack([rgb, np.ones(len(rgb))]))
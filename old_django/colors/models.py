@@ -1,7 +1,39 @@
-import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
 
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import conversions, lab_index, predictions, profiles, recipes
+from .palette import Palette, PaletteColor
+
+
+class AnalogColorQuerySet(models.QuerySet):
+    def with_recipes(self):
+        """
+            load the recipe rows and their ingredients for the whole queryset up front (one extra query in total),
+            so reading recipe on the results runs no further queries
+        """
+
+        return self.prefetch_related(
+            models.Prefetch('analogrecipe_set', queryset=AnalogRecipe.objects.select_related('ingredient').order_by('id')),
+        )
+
+    def mixes_using(self, color):
+        """
+            every color whose recipe contains color, directly or through other mixes
+        """
+
+        return self.filter(descendant_links__descendant=color).distinct()
+
+    def ingredients_of(self, color):
+        """
+            every color the recipe of color is built from, directly or through other mixes
+        """
+
+        return self.filter(ancestor_links__ancestor=color).distinct()
 
 
 class AnalogColor(models.Model):
@@ -28,6 +60,14 @@ class AnalogColor(models.Model):
         ('charcoal', 'CHARCOAL'),
         ('liquid_graphite', 'LIQUID GRAPHITE'),
     ]
+    recipe_additives = [
+        'gloss',
+        'matte',
+        'medium',
+        'oil',
+        'thinner',
+        'water',
+    ]
 
     class Meta:
         constraints = [
@@ -50,6 +90,7 @@ class AnalogColor(models.Model):
 
     body = models.CharField(max_length=50, choices=body_choices, default='heavy')
     brandname = models.CharField(max_length=200)
+    digital_color = models.ForeignKey('DigitalColor', on_delete=models.SET_NULL, null=True, blank=True, related_name='analog_colors')
     glossiness = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(100)], default=100)
     image_url = models.URLField(max_length=1000)
     lightfastness = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(3)], choices=lightfastness_choices, default=1)
@@ -67,12 +108,19 @@ class AnalogColor(models.Model):
     _recipe_thinner = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     _recipe_water = models.IntegerField(validators=[MinValueValidator(0)], default=0)
 
+    # color the recipe is expected to mix to, maintained by colors.predictions
+    predicted_value = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     _recipe_colors = models.ManyToManyField(
         'self',
         through='AnalogRecipe',
         related_name='used_in',
     )
 
+    objects = AnalogColorQuerySet.as_manager()
+
     def __repr__(self):
         return f"<AnalogColor '{self.name}' ({self.medium})>"
 
@@ -111,8 +159,12 @@ class AnalogColor(models.Model):
             'colors': [],
         }
 
+        rows = self.analogrecipe_set.all()
+        if 'analogrecipe_set' not in getattr(self, '_prefetched_objects_cache', {}):
+            rows = rows.select_related('ingredient').order_by('id')
+
         color_ingredients = [
-            f'{color} x{quantity}' for color, quantity in zip(self._recipe_colors.all(), [ingredient.quantity for ingredient in AnalogRecipe.objects.filter(origin_color_id=self.id)])
+            f'{row.ingredient} x{row.quantity}' for row in rows
         ]
 
         if len(color_ingredients) == 0:
@@ -121,7 +173,7 @@ class AnalogColor(models.Model):
         full_recipe['colors'] += color_ingredients
 
         additional_ingredients = {
-            key_end.group(0): value for key, value in self.__dict__.items() if (key_end := re.search(r'(?<=_recipe_)(.*)', key)) is not None and key_end != 'colors' and value > 0
+            additive: getattr(self, f'_recipe_{additive}') for additive in self.recipe_additives if getattr(self, f'_recipe_{additive}') > 0
         }
 
         full_recipe |= additional_ingredients
@@ -153,6 +205,29 @@ class AnalogColor(models.Model):
 
         return self.recipe
 
+    @property
+    def predicted_color(self):
+        """
+            PaletteColor of the predicted mix (the digital color for colors without ingredients), or None
+        """
+
+        if self.predicted_value is None:
+            return None
+
+        return PaletteColor(self.id, self.name, self.predicted_value)
+
+    @property
+    def base_pigments(self):
+        """
+            [(AnalogColor, proportion)] this color ultimately consists of, mixes of mixes expanded, largest share first
+        """
+
+        using = self._state.db or 'default'
+        proportions = recipes.flatten(self.id, using)
+        colors = AnalogColor.objects.using(using).in_bulk(list(proportions))
+
+        return sorted(((colors[color_id], proportion) for color_id, proportion in proportions.items()), key=lambda item: -item[1])
+
 
 class AnalogRecipe(models.Model):
     class Meta:
@@ -171,15 +246,264 @@ class AnalogRecipe(models.Model):
     quantity = models.IntegerField(validators=[MinValueValidator(1)], default=1)
 
     def __repr__(self):
-        return f'{AnalogColor.objects.get(pk=self.origin_color_id).name} x {AnalogColor.objects.get(pk=self.ingredient_id).name}'
+        return f'{self.origin_color.name} x {self.ingredient.name}'
+
+    def __str__(self):
+        return f'{self.origin_color.name}: {self.ingredient.name} x{self.quantity}'
+
+
+class RecipeClosure(models.Model):
+    """
+        transitive closure of AnalogRecipe: one row per (mix, ingredient at any depth, depth), where multiplier is the
+        product of the quantities along the way, summed over every path of that depth. maintained by colors.closure
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'ancestor',
+                    'descendant',
+                    'depth',
+                ],
+                name='unique_recipe_closure_path',
+            )
+        ]
+
+    ancestor = models.ForeignKey(AnalogColor, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(AnalogColor, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+    multiplier = models.BigIntegerField()
+
+    def __repr__(self):
+        return f'<RecipeClosure {self.ancestor_id} -> {self.descendant_id} (depth {self.depth}, x{self.multiplier})>'
 
     def __str__(self):
-        return f'{AnalogColor.objects.get(pk=self.origin_color_id).name}: {AnalogColor.objects.get(pk=self.ingredient_id).name} x{self.quantity}'
+        return f'{self.ancestor_id} -> {self.descendant_id} (depth {self.depth}, x{self.multiplier})'
+
+
+_pending_digital_colors = ContextVar('pending_digital_colors', default=None)
+
+
+class DigitalColorQuerySet(models.QuerySet):
+    def palette(self, chunk_size=10000):
+        """
+            the colors as a read-only Palette, without building model instances
+        """
+
+        return Palette.from_queryset(self, chunk_size=chunk_size)
+
+    def _reset_nearest_index(self):
+        # bulk writes send no signals; the nearest-color index is rebuilt on its next use, and once more after the
+        # commit in case a reader rebuilt it from the rows as they were before
+        lab_index.reset_digital_color_index(self.db)
+        transaction.on_commit(partial(lab_index.reset_digital_color_index, self.db), using=self.db)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        set_derived_fields(objs)
+
+        created = super().bulk_create(objs, *args, **kwargs)
+        self._reset_nearest_index()
+
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+
+        if '_integer_value' in fields:
+            set_derived_fields(objs)
+            fields += [field for field in DigitalColor.derived_fields if field not in fields]
+
+        # bulk_update skips auto_now
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        if 'updated_at' not in fields:
+            fields.append('updated_at')
+
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if '_integer_value' in fields:
+            self._reset_nearest_index()
+
+        return updated
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if '_integer_value' in kwargs:
+            self._reset_nearest_index()
+
+        return updated
+
+    def hue_between(self, low, high):
+        """
+            hue in degrees; low > high wraps through 0 (hue_between(330, 30) is the reds), and a span of 360 or more
+            is any hue
+        """
+
+        if high - low >= 360:
+            return self.all()
+
+        low %= 360
+        high %= 360
+        if low <= high:
+            return self.filter(hue__gte=low, hue__lte=high)
+
+        return self.filter(models.Q(hue__gte=low) | models.Q(hue__lte=high))
+
+    def saturation_between(self, low, high):
+        """
+            low, high: str(with or without '%') or int(0..100) or float(0..1.0)
+        """
+
+        return self.filter(saturation__gte=conversions.fraction(low), saturation__lte=conversions.fraction(high))
+
+    def lightness_between(self, low, high):
+        """
+            low, high: str(with or without '%') or int(0..100) or float(0..1.0)
+        """
+
+        return self.filter(lightness__gte=conversions.fraction(low), lightness__lte=conversions.fraction(high))
+
+    def lab_within(self, color, radius):
+        """
+            colors within CIE76 delta E radius of color, narrowed by an indexed bounding box first
+        """
+
+        L, a, b = conversions.to_lab(conversions.as_packed(color))[0].tolist()
+        dL, da, db = models.F('lab_l') - L, models.F('lab_a') - a, models.F('lab_b') - b
+
+        return self.filter(
+            lab_l__range=(L - radius, L + radius),
+            lab_a__range=(a - radius, a + radius),
+            lab_b__range=(b - radius, b + radius),
+        ).alias(
+            delta_e_squared=dL * dL + da * da + db * db,
+        ).filter(delta_e_squared__lte=radius ** 2)
+
+
+class DigitalColorManager(models.Manager.from_queryset(DigitalColorQuerySet)):
+    @contextmanager
+    def bulk_assign(self, batch_size=1000):
+        """
+            inside the block the DigitalColor setters (rgba, rgb, hsla, hsl, cmyk, hex) only change values in memory;
+            on exit every changed color is written with bulk_create / bulk_update in chunks of batch_size inside one transaction
+
+            with DigitalColor.objects.bulk_assign():
+                for color in colors:
+                    color.hex = ...
+        """
+
+        if _pending_digital_colors.get() is not None:
+            yield
+            return
+
+        pending = {}
+        token = _pending_digital_colors.set(pending)
+        try:
+            yield
+        finally:
+            _pending_digital_colors.reset(token)
+
+        self.flush_assigned(pending.values(), batch_size=batch_size)
+
+    def flush_assigned(self, colors, batch_size=1000):
+        new_colors = []
+        changed_colors = []
+        for color in colors:
+            if color.pk is None:
+                new_colors.append(color)
+            else:
+                changed_colors.append(color)
+
+        with transaction.atomic(using=self.db):
+            if new_colors:
+                self.bulk_create(new_colors, batch_size=batch_size)
+            if changed_colors:
+                self.bulk_update(changed_colors, ['_integer_value'], batch_size=batch_size)
+
+        if changed_colors:
+            predictions.schedule_refresh(digital_color_ids=[color.pk for color in changed_colors], using=self.db)
+
+    def nearest(self, color, k=1):
+        """
+            the k stored DigitalColors perceptually closest to color (DigitalColor, packed integer, hex str or rgb(a) tuple),
+            closest first, each with a delta_e attribute
+        """
+
+        matches = lab_index.digital_color_index(self.db).nearest(conversions.as_packed(color), k)
+
+        return self._from_matches(matches)
+
+    def within(self, color, radius):
+        """
+            every stored DigitalColor within delta E radius of color, closest first, each with a delta_e attribute
+        """
+
+        matches = lab_index.digital_color_index(self.db).within(conversions.as_packed(color), radius)
+
+        return self._from_matches(matches)
+
+    def _from_matches(self, matches):
+        colors = self.in_bulk([key for key, _ in matches])
+
+        found = []
+        for key, delta_e in matches:
+            color = colors.get(key)
+            if color is not None:
+                color.delta_e = delta_e
+                found.append(color)
+
+        return found
+
+
+def set_derived_fields(colors):
+    """
+        recompute the stored hue / saturation / lightness / CIELAB columns of DigitalColors from their _integer_value
+    """
+
+    colors = [color for color in colors if color._integer_value is not None]
+    if not colors:
+        return
+
+    values = [color._integer_value for color in colors]
+    hsla = conversions.to_hsla(values)
+    lab = conversions.to_lab(values)
+
+    for color, (h, s, L, _), (lab_l, lab_a, lab_b) in zip(colors, hsla.tolist(), lab.tolist()):
+        color.hue = h
+        color.saturation = s
+        color.lightness = L
+        color.lab_l = lab_l
+        color.lab_a = lab_a
+        color.lab_b = lab_b
 
 
 class DigitalColor(models.Model):
+    derived_fields = [
+        'hue',
+        'saturation',
+        'lightness',
+        'lab_l',
+        'lab_a',
+        'lab_b',
+    ]
+
     name = models.CharField(max_length=200, blank=True)
     _integer_value = models.BigIntegerField(validators=[MinValueValidator(0), MaxValueValidator(int(0xffffffff))])
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # derived from _integer_value on every save so range filters can use indexes;
+    # hue in degrees, saturation and lightness 0..1.0, then CIELAB L*, a*, b*
+    hue = models.FloatField(default=0, editable=False, db_index=True)
+    saturation = models.FloatField(default=0, editable=False, db_index=True)
+    lightness = models.FloatField(default=0, editable=False, db_index=True)
+    lab_l = models.FloatField(default=0, editable=False)
+    lab_a = models.FloatField(default=0, editable=False)
+    lab_b = models.FloatField(default=0, editable=False)
+
+    objects = DigitalColorManager()
 
     class Meta:
         constraints = [
@@ -190,29 +514,36 @@ class DigitalColor(models.Model):
                 name='unique_digital_color',
             )
         ]
+        indexes = [
+            models.Index(fields=['lab_l', 'lab_a', 'lab_b'], name='digital_color_lab'),
+        ]
+
+    def save(self, *args, **kwargs):
+        set_derived_fields([self])
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and '_integer_value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *self.derived_fields}
+
+        super().save(*args, **kwargs)
 
     def __repr__(self):
         return f"<DigitalColor {self.name or 'NO NAME SET'} {self.hex}"
 
     def __str__(self):
         return f"{self.name or 'NO NAME SET'} {self.rgba}"
+
+    def _commit(self):
+        pending = _pending_digital_colors.get()
+
+        if pending is None:
+            self.save()
+        else:
+            pending[id(self)] = self
     
     @property
     def rgba(self):
-        i = self._integer_value
-
-        r = i // 256 ** 3
-        i %= 256 ** 3
-
-        g = i // 256 ** 2
-        i %= 256 ** 2
-
-        b = i // 256
-        i %= 256
-
-        a = round(i / 256, 2)
-
-        return (r, g, b, a)
+        return conversions.rgba_tuple(self._integer_value)
 
     @rgba.setter
     def rgba(self, args: tuple):
@@ -220,15 +551,8 @@ class DigitalColor(models.Model):
             args must be: (red: int, green: int, blue: int, alpha: float)
         """
 
-        red, green, blue, alpha = args
-
-        r = red * 256 ** 3
-        g = green * 256 ** 2
-        b = blue * 256
-        a = int(alpha * 256) - 1
-
-        self._integer_value = r + g + b + a
-        self.save()
+        self._integer_value = int(conversions.from_rgba(args)[0])
+        self._commit()
 
         return self.rgba
 
@@ -252,37 +576,7 @@ class DigitalColor(models.Model):
 
     @property
     def hsla(self):
-        r, g, b, a = self.rgba
-
-        r /= 255
-        g /= 255
-        b /= 255
-
-        min_value = min(r, g, b)
-        max_value = max(r, g, b)
-
-        L = (min_value + max_value) / 2
-
-        if min_value == max_value:
-            s = 0
-        else:
-            if L <= 0.5:
-                s = (max_value - min_value) / (max_value + min_value)
-            else:
-                s = (max_value - min_value) / (2.0 - max_value - min_value)
-
-        if r == max_value:
-            h = (g - b) / (max_value - min_value)
-        elif g == max_value:
-            h = 2.0 + (b - r) / (max_value - min_value)
-        else:
-            h = 4.0 + (r - g) / (max_value - min_value)
-
-        h *= 60
-        if h < 0:
-            h += 360
-
-        return (int(h), f'{int(round(s, 2) * 100)}%', f'{int(round(L, 2) * 100)}%', a)
+        return conversions.hsla_tuple(self._integer_value)
 
     @hsla.setter
     def hsla(self, args: tuple):
@@ -291,61 +585,9 @@ class DigitalColor(models.Model):
         """
 
         h, s, L, a = args
-        if type(s) is str:
-            s = float(s.split('%')[0]) / 100
-        else:
-            s = float(s)
-            if s > 1.0:
-                s /= 100
-
-        if type(L) is str:
-            L = float(L.split('%')[0]) / 100
-        else:
-            L = float(L)
-            if L > 1.0:
-                L /= 100
 
-        if s == 0:
-            r = g = b = int(L * 255)
-        else:
-            if L < 0.5:
-                L1 = L * (1.0 + s)
-            else:
-                L1 = L + s - L * s
-
-            L2 = 2 * L - L1
-            h /= 360
-            r1 = h + 1/3
-            if r1 > 1.0:
-                r1 -= 1.0
-            g1 = h
-            b1 = h - 1/3
-            if b1 < 0:
-                b1 += 1.0
-
-            #TODO check for accuracy when calculations are == to values
-            ldict = {}
-
-            for channel in ('r1', 'g1', 'b1'):
-                if 6 * locals()[channel] < 1.0:
-                    exec(f'{channel[0]} = {L2} + ({L1} - {L2}) * 6 * {locals()[channel]}', globals(), ldict)
-                elif 2 * locals()[channel] < 1.0:
-                    exec(f'{channel[0]} = {L1}', globals(), ldict)
-                elif 3 * locals()[channel] < 2.0:
-                    exec(f'{channel[0]} = {L2} + ({L1} - {L2}) * (2/3 - {locals()[channel]}) * 6', globals(), ldict)
-                else:
-                    exec(f'{channel[0]} = {L2}', globals(), ldict)
-
-                r = ldict.get('r')
-                g = ldict.get('g')
-                b = ldict.get('b')
-
-            r *= 255
-            g *= 255
-            b *= 255
-
-        self.rgba = (int(r), int(g), int(b), a)
-        self.save()
+        self._integer_value = int(conversions.from_hsla((float(h), conversions.fraction(s), conversions.fraction(L), float(a)))[0])
+        self._commit()
 
         return self.hsla
 
@@ -369,23 +611,11 @@ class DigitalColor(models.Model):
 
     @property
     def cmyk(self):
-        r, g, b = self.rgb
-
-        r /= 255
-        g /= 255
-        b /= 255
-
-        k = 1 - max(r, g, b)
-        c = (1 - r - k) / (1 - k)
-        m = (1 - g - k) / (1 - k)
-        y = (1 - b - k) / (1 - k)
-
-        k = int(k * 100)
-        c = int(c * 100)
-        m = int(m * 100)
-        y = int(y * 100)
+        """
+            through the active CMYK profile (settings.CMYK_PROFILE or profiles.use), if any
+        """
 
-        return (f'{c}%', f'{m}%', f'{y}%', f'{k}%')
+        return profiles.cmyk_tuple(self._integer_value)
 
     @cmyk.setter
     def cmyk(self, args: tuple):
@@ -393,66 +623,71 @@ class DigitalColor(models.Model):
             args must be (cyan, magenta, yellow, black) (all values: str(with or without '%') or int(0..100) or float(0..1.0)
         """
 
-        c, m, y, k = args
-        if type(c) is str:
-            c = float(c.split('%')[0])
-        else:
-            c = float(c)
-
-        if type(m) is str:
-            m = float(m.split('%')[0])
-        else:
-            m = float(m)
-
-        if type(y) is str:
-            y = float(y.split('%')[0])
-        else:
-            y = float(y)
-
-        if type(k) is str:
-            k = float(k.split('%')[0])
-        else:
-            k = float(k)
-
-        r = int(255 * (1 - c / 100) * (1 - k / 100))
-        g = int(255 * (1 - m / 100) * (1 - k / 100))
-        b = int(255 * (1 - y / 100) * (1 - k / 100))
-
-        self.rgb = (r, g, b)
-        self.save()
+        self._integer_value = int(profiles.from_cmyk([conversions.fraction(channel) for channel in args])[0])
+        self._commit()
 
         return self.cmyk
 
     @property
     def hex(self):
-        return hex(self._integer_value)
+        return conversions.hex_string(self._integer_value)
 
     @hex.setter
     def hex(self, hex_value: str):
-        if hex_value.startswith('#'):
-            hex_value = hex_value[1:]
+        self._integer_value = int(conversions.from_hex(hex_value)[0])
+        self._commit()
 
-        if hex_value.startswith('0x'):
-            hex_value = hex_value[2:]
+        return self.hex
 
-        hex_length = len(hex_value)
 
-        if hex_length == 3 or hex_length == 4:
-            hex_intermediary = []
-            for i in range(hex_length):
-                hex_intermediary.append(hex_value[i])
-                hex_intermediary.append(hex_value[i])
-            
-            hex_value = ''.join(hex_intermediary)
-            hex_length *= 2
+class DuplicateCluster(models.Model):
+    """
+        colors within a CIEDE2000 threshold of one another, found by colors.duplicates for review in the admin
+    """
 
-        if hex_length == 6:
-            self._integer_value = int(float.fromhex(f'{hex_value}ff'))
-        elif hex_length == 8:
-            self._integer_value = int(float.fromhex(hex_value))
-        else:
-            raise TypeError('hex value must be three, four, six or eight digits')
+    kind_choices = [
+        ('digital', 'DIGITAL'),
+        ('analog', 'ANALOG'),
+    ]
+    status_choices = [
+        ('open', 'OPEN'),
+        ('merged', 'MERGED'),
+        ('dismissed', 'DISMISSED'),
+    ]
 
-        self.save()
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'status'], name='duplicate_cluster_status'),
+        ]
+
+    kind = models.CharField(max_length=50, choices=kind_choices)
+    status = models.CharField(max_length=50, choices=status_choices, default='open')
+    threshold = models.FloatField()
+    size = models.PositiveIntegerField()
+    max_delta_e = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    def __repr__(self):
+        return f'<DuplicateCluster {self.kind} x{self.size} ({self.status})>'
+
+    def __str__(self):
+        return f'{self.size} {self.kind} colors within {self.threshold} ({self.status})'
+
+
+class DuplicateClusterMember(models.Model):
+    """
+        one color of a DuplicateCluster; delta_e is its CIEDE2000 difference from the oldest member
+    """
+
+    cluster = models.ForeignKey(DuplicateCluster, on_delete=models.CASCADE, related_name='members')
+    digital_color = models.ForeignKey(DigitalColor, on_delete=models.CASCADE, null=True, blank=True, related_name='duplicate_memberships')
+    analog_color = models.ForeignKey(AnalogColor, on_delete=models.CASCADE, null=True, blank=True, related_name='duplicate_memberships')
+    delta_e = models.FloatField()
+
+    def __repr__(self):
+        return f'<DuplicateClusterMember {self.digital_color_id or self.analog_color_id} of {self.cluster_id}>'
+
+    def __str__(self):
+        return f'{self.digital_color or self.analog_color} (delta E {self.delta_e})'
 
-        return self.hex
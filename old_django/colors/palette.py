@@ -0,0 +1,204 @@
+"""
+Read-only, array-backed collections of colors.
+
+A Palette holds packed RGBA values in an array('I'), ids in an array('q') and names as one UTF-8 buffer with an
+array of offsets, about 35 bytes per color against nearly 400 for a DigitalColor instance, and loads
+straight from values_list without building model instances. Single colors are handed out as PaletteColor views
+with the same read accessors as DigitalColor; whole-palette conversions run vectorized over the buffer, which NumPy
+reads in place.
+"""
+
+from array import array
+
+import numpy as np
+
+from . import conversions, profiles
+
+
+_VALUE_TYPE = 'I' if array('I').itemsize == 4 else 'L'
+_ID_TYPE = 'q'
+
+
+class PaletteColor:
+    __slots__ = ('id', 'name', '_integer_value')
+
+    def __init__(self, id, name, value):
+        self.id = id
+        self.name = name
+        self._integer_value = value
+
+    def __eq__(self, other):
+        return isinstance(other, PaletteColor) and (self.id, self.name, self._integer_value) == (other.id, other.name, other._integer_value)
+
+    def __hash__(self):
+        return hash((self.id, self._integer_value))
+
+    def __repr__(self):
+        return f"<PaletteColor {self.name or 'NO NAME SET'} {self.hex}>"
+
+    def __str__(self):
+        return f"{self.name or 'NO NAME SET'} {self.rgba}"
+
+    @property
+    def value(self):
+        return self._integer_value
+
+    @property
+    def rgba(self):
+        return conversions.rgba_tuple(self._integer_value)
+
+    @property
+    def rgb(self):
+        return self.rgba[:3]
+
+    @property
+    def hsla(self):
+        return conversions.hsla_tuple(self._integer_value)
+
+    @property
+    def hsl(self):
+        return self.hsla[:3]
+
+    @property
+    def cmyk(self):
+        return profiles.cmyk_tuple(self._integer_value)
+
+    @property
+    def hex(self):
+        return conversions.hex_string(self._integer_value)
+
+
+class Palette:
+    def __init__(self, values=(), names=None, ids=None):
+        """
+            values: packed RGBA integers; names and ids: sequences of the same length (names default to '', ids to
+            0)
+        """
+
+        self._values = array(_VALUE_TYPE, values)
+        count = len(self._values)
+
+        self._ids = array(_ID_TYPE, ids if ids is not None else bytes(8 * count))
+        self._names = bytearray()
+        self._offsets = array('Q', [0])
+
+        for name in (names if names is not None else [''] * count):
+            self._append_name(name)
+
+        if not len(self._ids) == len(self._offsets) - 1 == count:
+            raise ValueError('values, names and ids must have the same length')
+
+    @classmethod
+    def from_queryset(cls, queryset, chunk_size=10000):
+        """
+            Palette of every DigitalColor in queryset, in its order, read with values_list in chunks
+        """
+
+        palette = cls()
+        for id, value, name in queryset.values_list('id', '_integer_value', 'name').iterator(chunk_size=chunk_size):
+            palette._ids.append(id)
+            palette._values.append(value)
+            palette._append_name(name)
+
+        return palette
+
+    def _append_name(self, name):
+        self._names += (name or '').encode('utf-8')
+        self._offsets.append(len(self._names))
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._color(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(len(self)))
+            return Palette(
+                [self._values[i] for i in positions],
+                [self.name(i) for i in positions],
+                [self._ids[i] for i in positions],
+            )
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('palette index out of range')
+
+        return self._color(index)
+
+    def _color(self, i):
+        return PaletteColor(self._ids[i], self.name(i), self._values[i])
+
+    def __repr__(self):
+        return f'<Palette of {len(self)} colors>'
+
+    def __bytes__(self):
+        return self._values.tobytes()
+
+    def name(self, i):
+        return self._names[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def names(self):
+        return [self.name(i) for i in range(len(self))]
+
+    def buffer(self):
+        """
+            read-only memoryview of the packed values (native-endian uint32), without copying
+        """
+
+        return memoryview(self._values).toreadonly()
+
+    @property
+    def values(self):
+        """
+            read-only uint32 NumPy view of the packed values, without copying
+        """
+
+        values = np.frombuffer(self._values, dtype=np.uint32)
+        values.flags.writeable = False
+
+        return values
+
+    @property
+    def ids(self):
+        ids = np.frombuffer(self._ids, dtype=np.int64)
+        ids.flags.writeable = False
+
+        return ids
+
+    @property
+    def rgba(self):
+        return conversions.to_rgba(self.values)
+
+    @property
+    def hsla(self):
+        return conversions.to_hsla(self.values)
+
+    @property
+    def cmyk(self):
+        return profiles.to_cmyk(self.values)
+
+    def to_cmyk(self, profile):
+        """
+            float array of shape (n, 4) through profile (name, CmykProfile or None for the uncalibrated formula)
+        """
+
+        return profiles.to_cmyk(self.values, profile)
+
+    @property
+    def hex(self):
+        return conversions.to_hex(self.values)
+
+    @property
+    def lab(self):
+        return conversions.to_lab(self.values)
+
+    def nbytes(self):
+        """
+            bytes held by the buffers behind this palette
+        """
+
+        return sum(len(buffer) * buffer.itemsize for buffer in (self._values, self._ids, self._offsets)) + len(self._names)
@@ -0,0 +1,221 @@
+"""
+Predicted appearance of AnalogColors mixed from a recipe.
+
+A color without ingredients looks like its digital color. A mix is predicted with the Kubelka-Munk model of
+colors.mixing: the K/S of its ingredients averaged by quantity times strength (tinting and opaqueness, see
+mixing.strength), then diluted by the parts of additive in the recipe (_recipe_gloss, _recipe_water ...), which carry
+no pigment. An ingredient that is itself a mix takes part with its own predicted K/S and its own tinting and
+opaqueness, so mixes of mixes are evaluated bottom up, one level of nesting at a time, with every recipe of a level
+mixed in a single vectorized call.
+
+Predictions are stored in AnalogColor.predicted_value. colors.signals schedules a refresh of a color and of every mix
+it is used in (its RecipeClosure ancestors, i.e. along used_in) when a recipe row, its digital color or its tinting,
+opaqueness or additives change; bulk writes are followed by rebuild().
+
+A mix with an ingredient that has no digital color anywhere down its recipe, or with a cyclic recipe, has no
+prediction (None).
+"""
+
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from . import deferred, mixing
+from .recipes import load_recipe_edges
+
+
+def _additive_fields():
+    from .models import AnalogColor
+
+    return [f'_recipe_{additive}' for additive in AnalogColor.recipe_additives]
+
+
+def _load(queryset):
+    """
+        {color_id: (digital value, tinting, opaqueness, parts of additive, stored prediction)} for queryset
+    """
+
+    additives = _additive_fields()
+    rows = queryset.values_list('id', 'digital_color___integer_value', 'tinting', 'opaqueness', 'predicted_value', *additives)
+
+    return {
+        color_id: (value, tinting, opaqueness, sum(parts), predicted)
+        for color_id, value, tinting, opaqueness, predicted, *parts in rows.iterator()
+    }
+
+
+def _depths(edges):
+    """
+        {color_id: nesting depth} of every mix in edges (1 for a mix of base colors); None on and above cycles
+    """
+
+    depths = {}
+
+    def depth(color_id, path):
+        if color_id not in edges:
+            return 0
+        if color_id in depths:
+            return depths[color_id]
+        if color_id in path:
+            return None
+
+        below = [depth(ingredient_id, path | {color_id}) for ingredient_id, _ in edges[color_id]]
+        depths[color_id] = None if None in below else 1 + max(below)
+
+        return depths[color_id]
+
+    for color_id in edges:
+        depth(color_id, frozenset())
+
+    return depths
+
+
+def _predict(attributes, edges):
+    """
+        {color_id: packed RGBA integer or None} for every color in attributes, which must hold every color reachable
+        through edges
+    """
+
+    ids = list(attributes)
+    index = {color_id: i for i, color_id in enumerate(ids)}
+    columns = list(zip(*attributes.values())) or [()] * 5
+    values = np.array([np.nan if value is None else value for value in columns[0]], dtype=np.float64)
+    strengths = mixing.strength(np.array(columns[1], dtype=np.float64), np.array(columns[2], dtype=np.float64))
+    extenders = np.array(columns[3], dtype=np.float64)
+
+    # K/S per color; NaN where there is nothing to predict from
+    ks = np.full((len(ids), 3), np.nan)
+    known = ~np.isnan(values)
+    ks[known] = mixing.absorption(mixing.reflectance(values[known].astype(np.int64)))
+
+    levels = defaultdict(list)
+    for color_id, depth in _depths(edges).items():
+        if depth is not None and color_id in index:
+            levels[depth].append(color_id)
+        elif color_id in index:
+            ks[index[color_id]] = np.nan
+
+    for depth in sorted(levels):
+        mixes = levels[depth]
+        width = max(len(edges[color_id]) for color_id in mixes)
+
+        # ingredients padded to the widest recipe of the level with zero parts
+        ingredients = np.zeros((len(mixes), width), dtype=np.int64)
+        quantities = np.zeros((len(mixes), width))
+        for row, color_id in enumerate(mixes):
+            for column, (ingredient_id, quantity) in enumerate(edges[color_id]):
+                ingredients[row, column] = index[ingredient_id]
+                quantities[row, column] = quantity
+
+        used = quantities > 0
+        ingredient_ks = np.where(used[..., None], ks[ingredients], 0.0)
+        missing = (np.isnan(ks[ingredients]).any(axis=-1) & used).any(axis=1)
+
+        rows = np.array([index[color_id] for color_id in mixes])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mixed = mixing.mix_absorption(ingredient_ks, quantities, extenders[rows], strengths=strengths[ingredients])
+        mixed[missing] = np.nan
+        ks[rows] = mixed
+
+    predicted = dict(zip(ids, (None if np.isnan(value) else int(value) for value in values)))
+
+    mixed = np.array([index[color_id] for color_id in edges if color_id in index], dtype=np.int64)
+    valid = mixed[~np.isnan(ks[mixed]).any(axis=1)]
+    predicted.update((ids[i], None) for i in mixed.tolist())
+    predicted.update(zip((ids[i] for i in valid.tolist()), mixing.to_values(mixing.reflectance_from_absorption(ks[valid])).tolist()))
+
+    return predicted
+
+
+def predict(color_ids, using='default'):
+    """
+        {color_id: packed RGBA integer or None} predicted from the current recipes, without storing anything
+    """
+
+    from .models import AnalogColor
+
+    color_ids = set(color_ids)
+    edges = load_recipe_edges(color_ids, using)
+    involved = color_ids | {ingredient_id for rows in edges.values() for ingredient_id, _ in rows}
+    predicted = _predict(_load(AnalogColor.objects.using(using).filter(id__in=involved)), edges)
+
+    return {color_id: predicted[color_id] for color_id in color_ids if color_id in predicted}
+
+
+def _store(predicted, attributes, color_ids, using, batch_size):
+    from .models import AnalogColor
+
+    changed = [
+        AnalogColor(id=color_id, predicted_value=predicted[color_id])
+        for color_id in color_ids
+        if color_id in attributes and attributes[color_id][4] != predicted[color_id]
+    ]
+    AnalogColor.objects.using(using).bulk_update(changed, ['predicted_value'], batch_size=batch_size)
+
+    return len(changed)
+
+
+def refresh(color_ids, using='default', batch_size=1000):
+    """
+        recompute the stored prediction of color_ids and of every mix that uses any of them
+
+        returns the number of predictions that changed
+    """
+
+    from .models import AnalogColor, RecipeClosure
+
+    color_ids = set(color_ids)
+    if not color_ids:
+        return 0
+
+    affected = color_ids | set(
+        RecipeClosure.objects.using(using).filter(descendant_id__in=color_ids).values_list('ancestor_id', flat=True)
+    )
+
+    edges = load_recipe_edges(affected, using)
+    involved = affected | {ingredient_id for rows in edges.values() for ingredient_id, _ in rows}
+    attributes = _load(AnalogColor.objects.using(using).filter(id__in=involved))
+
+    return _store(_predict(attributes, edges), attributes, affected, using, batch_size)
+
+
+def rebuild(using='default', batch_size=1000):
+    """
+        recompute the prediction of every AnalogColor
+
+        returns the number of predictions that changed
+    """
+
+    from .models import AnalogColor, AnalogRecipe
+
+    edges = defaultdict(list)
+    for origin_id, ingredient_id, quantity in AnalogRecipe.objects.using(using).values_list('origin_color_id', 'ingredient_id', 'quantity').order_by('origin_color_id', 'ingredient_id').iterator():
+        edges[origin_id].append((ingredient_id, quantity))
+
+    attributes = _load(AnalogColor.objects.using(using).all())
+
+    with transaction.atomic(using=using):
+        return _store(_predict(attributes, edges), attributes, attributes, using, batch_size)
+
+
+def _refresh_pending(using, color_ids=(), digital_color_ids=()):
+    from .models import AnalogColor
+
+    color_ids = set(color_ids)
+    if digital_color_ids:
+        color_ids.update(AnalogColor.objects.using(using).filter(digital_color_id__in=digital_color_ids).values_list('id', flat=True))
+
+    refresh(color_ids, using)
+
+
+_refreshes = deferred.Deferred(_refresh_pending)
+
+
+def schedule_refresh(color_ids=(), digital_color_ids=(), using='default'):
+    """
+        refresh color_ids and the AnalogColors of digital_color_ids once the current transaction commits (immediately
+        in autocommit mode), so a burst of changes in one transaction costs a single refresh
+    """
+
+    _refreshes.schedule(using, color_ids=color_ids, digital_color_ids=digital_color_ids)
@@ -0,0 +1,308 @@
+"""
+Profile-based RGB <-> CMYK conversion through precomputed lookup tables.
+
+A CMYK profile is two tables sampled once from an ICC profile (see build_cmyk_profile): sRGB -> CMYK on a regular
+grid over the RGB cube and CMYK -> sRGB on a regular grid over the four inks. Converting is then an interpolation
+between the grid points around each color, vectorized over whole arrays of colors, instead of a trip through a color
+management engine per color.
+
+Tables are saved as <name>.npz in settings.CMYK_PROFILE_DIR, loaded on first use and kept in memory. The profile used
+by DigitalColor.cmyk, PaletteColor.cmyk and Palette.cmyk is settings.CMYK_PROFILE, or the one chosen with
+`with profiles.use(name):`; None keeps the uncalibrated 1 - max(r, g, b) formula of colors.conversions.
+
+Settings:
+    CMYK_PROFILE_DIR: directory of the saved tables (default BASE_DIR / 'profiles')
+    CMYK_PROFILE: name of the profile used by default (default None, the uncalibrated formula)
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from . import conversions
+
+
+INTERPOLATIONS = ('tetrahedral', 'trilinear')
+INTENTS = {'perceptual': 0, 'relative': 1, 'saturation': 2, 'absolute': 3}
+
+_NAME = re.compile(r'\w[\w.-]*')
+_DEFAULT = object()
+
+_active_profile = ContextVar('active_cmyk_profile', default=_DEFAULT)
+
+
+def interpolate(table, points, method='tetrahedral'):
+    """
+        table: array of shape (g, ..., g, channels) sampled on a regular grid over [0, 1] in each of its d dimensions
+        points: float array of shape (n, d), clipped to [0, 1]
+
+        tetrahedral interpolation reads the d + 1 corners of the simplex around each point, trilinear the 2 ** d
+        corners of its cell
+    """
+
+    dimensions = table.ndim - 1
+    grid = table.shape[0]
+    flat = table.reshape(-1, table.shape[-1])
+    strides = grid ** np.arange(dimensions - 1, -1, -1)
+
+    scaled = np.clip(np.asarray(points, dtype=np.float64).reshape(-1, dimensions), 0, 1) * (grid - 1)
+    base = np.clip(np.floor(scaled).astype(np.int64), 0, grid - 2)
+    offsets = scaled - base
+    index = base @ strides
+
+    if method == 'trilinear':
+        result = np.zeros((len(index), flat.shape[1]))
+        for corner in product((0, 1), repeat=dimensions):
+            corner = np.array(corner)
+            weight = np.where(corner, offsets, 1 - offsets).prod(axis=1)
+            result += weight[:, None] * flat[index + corner @ strides]
+
+        return result
+
+    if method != 'tetrahedral':
+        raise ValueError(f'method must be one of {", ".join(INTERPOLATIONS)}')
+
+    # walk from the low corner along the axes in order of decreasing offset; the weight of each corner on the way is
+    # the drop in offset from one axis to the next
+    order = np.argsort(-offsets, axis=1)
+    sorted_offsets = np.take_along_axis(offsets, order, axis=1)
+    weights = -np.diff(np.column_stack([np.ones(len(index)), sorted_offsets, np.zeros(len(index))]), axis=1)
+
+    result = weights[:, :1] * flat[index]
+    for step in range(dimensions):
+        index = index + strides[order[:, step]]
+        result += weights[:, step + 1:step + 2] * flat[index]
+
+    return result
+
+
+def _grid(size, dimensions):
+    axis = np.linspace(0, 1, size)
+
+    return np.stack(np.meshgrid(*[axis] * dimensions, indexing='ij'), axis=-1).reshape(-1, dimensions)
+
+
+class CmykProfile:
+    """
+        sRGB <-> CMYK lookup tables and the interpolation between their grid points
+    """
+
+    def __init__(self, name, rgb_to_cmyk, cmyk_to_rgb, interpolation='tetrahedral'):
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f'interpolation must be one of {", ".join(INTERPOLATIONS)}')
+
+        self.name = name
+        self.rgb_to_cmyk = np.asarray(rgb_to_cmyk, dtype=np.float32)
+        self.cmyk_to_rgb = np.asarray(cmyk_to_rgb, dtype=np.float32)
+        self.interpolation = interpolation
+
+        if self.rgb_to_cmyk.ndim != 4 or self.rgb_to_cmyk.shape[-1] != 4 or len(set(self.rgb_to_cmyk.shape[:3])) != 1:
+            raise ValueError('rgb_to_cmyk must have shape (g, g, g, 4)')
+        if self.cmyk_to_rgb.ndim != 5 or self.cmyk_to_rgb.shape[-1] != 3 or len(set(self.cmyk_to_rgb.shape[:4])) != 1:
+            raise ValueError('cmyk_to_rgb must have shape (g, g, g, g, 3)')
+
+    def __repr__(self):
+        return f'<CmykProfile {self.name}>'
+
+    def to_cmyk(self, values):
+        """
+            packed RGBA integers -> float array of shape (n, 4): cyan, magenta, yellow, black (all 0..1.0)
+        """
+
+        rgb = conversions.to_channels(values)[:, :3] / 255
+
+        return np.clip(interpolate(self.rgb_to_cmyk, rgb, self.interpolation), 0, 1)
+
+    def from_cmyk(self, cmyk, alpha=1.0):
+        """
+            array of shape (n, 4): cyan, magenta, yellow, black (all 0..1.0) -> packed RGBA integers
+        """
+
+        cmyk = np.asarray(cmyk, dtype=np.float64).reshape(-1, 4)
+        rgb = interpolate(self.cmyk_to_rgb, cmyk, self.interpolation) * 255
+        a = np.broadcast_to(np.asarray(alpha, dtype=np.float64), (len(cmyk),))
+
+        return conversions.from_rgba(np.column_stack([rgb, a]))
+
+    def tables(self):
+        return {'rgb_to_cmyk': self.rgb_to_cmyk, 'cmyk_to_rgb': self.cmyk_to_rgb}
+
+
+def sample(rgb_to_cmyk, cmyk_to_rgb, grid=33, cmyk_grid=17):
+    """
+        tables for CmykProfile from two batch conversions: rgb_to_cmyk maps float arrays of shape (n, 3) to (n, 4) and
+        cmyk_to_rgb maps (n, 4) to (n, 3), all components 0..1.0
+    """
+
+    return {
+        'rgb_to_cmyk': np.asarray(rgb_to_cmyk(_grid(grid, 3)), dtype=np.float32).reshape((grid,) * 3 + (4,)),
+        'cmyk_to_rgb': np.asarray(cmyk_to_rgb(_grid(cmyk_grid, 4)), dtype=np.float32).reshape((cmyk_grid,) * 4 + (3,)),
+    }
+
+
+def uncalibrated(grid=33, cmyk_grid=17):
+    """
+        tables of the 1 - max(r, g, b) formula of colors.conversions, e.g. to compare against or to benchmark with
+    """
+
+    def rgb_to_cmyk(rgb):
+        k = 1 - rgb.max(axis=1)
+        white = np.where(k < 1, 1 - k, 1.0)
+
+        return np.column_stack([np.where((k < 1)[:, None], (1 - rgb - k[:, None]) / white[:, None], 0.0), k])
+
+    return sample(rgb_to_cmyk, lambda cmyk: (1 - cmyk[:, :3]) * (1 - cmyk[:, 3:]), grid=grid, cmyk_grid=cmyk_grid)
+
+
+def sample_icc(path, grid=33, cmyk_grid=17, intent='perceptual'):
+    """
+        tables for CmykProfile sampled from the CMYK ICC profile at path through Pillow's LittleCMS bindings, with
+        sRGB on the other side; Pillow hands LittleCMS 8-bit pixels, so the tables hold 8-bit precision
+    """
+
+    from PIL import Image, ImageCms
+
+    srgb = ImageCms.createProfile('sRGB')
+    cmyk_profile = ImageCms.getOpenProfile(str(path))
+
+    def convert(samples, source, target, source_mode, target_mode):
+        pixels = np.rint(samples * 255).astype(np.uint8)
+        image = Image.frombytes(source_mode, (len(pixels), 1), pixels.tobytes())
+        transform = ImageCms.buildTransform(source, target, source_mode, target_mode, renderingIntent=INTENTS[intent])
+        converted = ImageCms.applyTransform(image, transform)
+
+        return np.frombuffer(converted.tobytes(), dtype=np.uint8).reshape(len(pixels), -1) / 255
+
+    return sample(
+        lambda rgb: convert(rgb, srgb, cmyk_profile, 'RGB', 'CMYK'),
+        lambda cmyk: convert(cmyk, cmyk_profile, srgb, 'CMYK', 'RGB')[:, :3],
+        grid=grid,
+        cmyk_grid=cmyk_grid,
+    )
+
+
+def profile_dir():
+    return Path(getattr(settings, 'CMYK_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def _path(name):
+    if not _NAME.fullmatch(name):
+        raise ValueError(f'invalid CMYK profile name {name!r}')
+
+    return profile_dir() / f'{name}.npz'
+
+
+def save(name, tables):
+    """
+        write tables (as returned by sample or sample_icc) as the profile name, replacing any profile of that name
+    """
+
+    path = _path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    CmykProfile(name, **tables)
+
+    with open(path, 'wb') as file:
+        np.savez_compressed(file, **tables)
+
+    reset_profiles(name)
+
+    return path
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def profile(name, interpolation='tetrahedral'):
+    """
+        the CmykProfile saved as name, loaded on first use
+    """
+
+    with _profiles_lock:
+        loaded = _profiles.get((name, interpolation))
+        if loaded is None:
+            path = _path(name)
+            if not path.exists():
+                raise ValueError(f'no CMYK profile named {name!r} in {path.parent}')
+
+            with np.load(path) as tables:
+                loaded = CmykProfile(name, tables['rgb_to_cmyk'], tables['cmyk_to_rgb'], interpolation)
+            _profiles[(name, interpolation)] = loaded
+
+    return loaded
+
+
+def reset_profiles(name=None):
+    with _profiles_lock:
+        if name is None:
+            _profiles.clear()
+        else:
+            for key in [key for key in _profiles if key[0] == name]:
+                del _profiles[key]
+
+
+def active():
+    """
+        the CmykProfile in use in this context, or None for the uncalibrated formula
+    """
+
+    name = _active_profile.get()
+    if name is _DEFAULT:
+        name = getattr(settings, 'CMYK_PROFILE', None)
+
+    if name is None or isinstance(name, CmykProfile):
+        return name
+
+    return profile(name)
+
+
+@contextmanager
+def use(name):
+    """
+        convert CMYK through the profile name (a CmykProfile, or None for the uncalibrated formula) inside the block
+
+            with profiles.use('coated_fogra39'):
+                color.cmyk
+    """
+
+    token = _active_profile.set(name)
+    try:
+        yield active()
+    finally:
+        _active_profile.reset(token)
+
+
+def to_cmyk(values, profile=_DEFAULT):
+    """
+        packed RGBA integers -> float array of shape (n, 4), through profile (name, CmykProfile or None) or the active
+        one
+    """
+
+    profile = _resolve(profile)
+
+    return conversions.to_cmyk(values) if profile is None else profile.to_cmyk(values)
+
+
+def from_cmyk(cmyk, alpha=1.0, profile=_DEFAULT):
+    profile = _resolve(profile)
+
+    return conversions.from_cmyk(cmyk, alpha) if profile is None else profile.from_cmyk(cmyk, alpha)
+
+
+def cmyk_tuple(value, profile=_DEFAULT):
+    return tuple(f'{int(round(channel * 100))}%' for channel in to_cmyk(value, profile)[0])
+
+
+def _resolve(name):
+    if name is _DEFAULT:
+        return active()
+    if isinstance(name, str):
+        return profile(name)
+
+    return name
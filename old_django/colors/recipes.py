@@ -0,0 +1,139 @@
+import threading
+from collections import defaultdict
+
+from django.db import connections
+
+
+class RecipeCycleError(ValueError):
+    pass
+
+
+_flattened = {}
+_dependents = defaultdict(set)
+_lock = threading.RLock()
+
+
+def load_recipe_edges(color_ids, using='default'):
+    """
+        every AnalogRecipe row reachable from color_ids through ingredients, in one recursive query
+
+        returns {origin_color_id: [(ingredient_id, quantity)]}
+    """
+
+    from .models import AnalogColor, AnalogRecipe
+
+    color_ids = list(color_ids)
+    if not color_ids:
+        return {}
+
+    recipe_table = AnalogRecipe._meta.db_table
+    color_table = AnalogColor._meta.db_table
+    placeholders = ', '.join(['%s'] * len(color_ids))
+
+    # UNION (not UNION ALL) stops revisiting colors, so this terminates on cyclic recipes too
+    sql = f'''
+        WITH RECURSIVE reachable(color_id) AS (
+            SELECT id FROM {color_table} WHERE id IN ({placeholders})
+            UNION
+            SELECT r.ingredient_id FROM {recipe_table} r JOIN reachable ON r.origin_color_id = reachable.color_id
+        )
+        SELECT r.origin_color_id, r.ingredient_id, r.quantity
+        FROM {recipe_table} r JOIN reachable ON r.origin_color_id = reachable.color_id
+        ORDER BY r.origin_color_id, r.ingredient_id
+    '''
+
+    edges = defaultdict(list)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, color_ids)
+        for origin_id, ingredient_id, quantity in cursor.fetchall():
+            edges[origin_id].append((ingredient_id, quantity))
+
+    return edges
+
+
+def _resolve(color_id, edges, resolved, reachable, path):
+    if color_id in resolved:
+        return resolved[color_id]
+
+    if color_id in path:
+        cycle = ' -> '.join(str(step) for step in [*path[path.index(color_id):], color_id])
+        raise RecipeCycleError(f'recipe cycle between AnalogColors {cycle}')
+
+    ingredients = edges.get(color_id)
+    if not ingredients:
+        resolved[color_id] = {color_id: 1.0}
+        reachable[color_id] = {color_id}
+        return resolved[color_id]
+
+    path.append(color_id)
+
+    total = sum(quantity for _, quantity in ingredients)
+    proportions = defaultdict(float)
+    depends_on = {color_id}
+    for ingredient_id, quantity in ingredients:
+        for base_id, proportion in _resolve(ingredient_id, edges, resolved, reachable, path).items():
+            proportions[base_id] += proportion * quantity / total
+        depends_on |= reachable[ingredient_id]
+
+    path.pop()
+
+    resolved[color_id] = dict(proportions)
+    reachable[color_id] = depends_on
+
+    return resolved[color_id]
+
+
+def flatten_many(color_ids, using='default'):
+    """
+        {color_id: {base_color_id: proportion}} for every color in color_ids, expanding mixes of mixes down to the
+        AnalogColors that have no recipe of their own; proportions for each color add up to 1
+
+        results are memoized until an AnalogRecipe row of the color or of anything it is built from changes;
+        raises RecipeCycleError when a recipe (indirectly) contains itself
+    """
+
+    color_ids = list(dict.fromkeys(color_ids))
+
+    with _lock:
+        found = {color_id: _flattened[(using, color_id)] for color_id in color_ids if (using, color_id) in _flattened}
+
+    missing = [color_id for color_id in color_ids if color_id not in found]
+    if missing:
+        edges = load_recipe_edges(missing, using)
+        resolved = {}
+        reachable = {}
+
+        for color_id in missing:
+            _resolve(color_id, edges, resolved, reachable, [])
+
+        with _lock:
+            for color_id, proportions in resolved.items():
+                _flattened[(using, color_id)] = proportions
+                for dependency_id in reachable[color_id]:
+                    _dependents[(using, dependency_id)].add(color_id)
+
+        found.update((color_id, resolved[color_id]) for color_id in missing)
+
+    return {color_id: found[color_id] for color_id in color_ids}
+
+
+def flatten(color_id, using='default'):
+    return flatten_many([color_id], using)[color_id]
+
+
+def invalidate(color_id, using='default'):
+    """
+        forget the memoized expansion of color_id and of every color built from it
+    """
+
+    with _lock:
+        for dependent_id in _dependents.pop((using, color_id), ()):
+            _flattened.pop((using, dependent_id), None)
+
+        _flattened.pop((using, color_id), None)
+
+
+def reset():
+    with _lock:
+        _flattened.clear()
+        _dependents.clear()
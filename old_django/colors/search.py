@@ -0,0 +1,327 @@
+"""
+AnalogColor search by name, brand and series.
+
+search() runs in the database: on PostgreSQL it uses pg_trgm word similarity, which tolerates typos and is served by
+the GIN trigram indexes of migration 0009; elsewhere it falls back to substring matching, with query words that match
+nothing replaced by their closest known word.
+
+autocomplete() answers from PrefixIndex, a sorted in-memory list of every word of every color kept in rank order
+within each word. A query walks the run of its rarest word best first and stops once the results are settled, so a
+single letter costs about as much as a full word. The index is built on first use (or by warm() at startup) and kept
+current by the signal handlers in colors.signals.
+"""
+
+import difflib
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from operator import itemgetter
+
+from django.db import DatabaseError, connections, models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ['name', 'brandname', 'series']
+
+_WORD = re.compile(r'\w+')
+_END = '\U0010ffff'
+# distinct words of a prefix run walked with a merge; more than this and the run is sorted instead, and kept sorted
+# for prefixes up to _SORTED_PREFIX_LENGTH characters
+_MAX_MERGED_WORDS = 256
+_SORTED_PREFIX_LENGTH = 2
+
+
+def words(text):
+    """
+        lowercase words of text with accents removed
+    """
+
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+
+    return _WORD.findall(text.casefold())
+
+
+@models.CharField.register_lookup
+class TrigramWordSimilar(models.Lookup):
+    """
+        field__trigram_word_similar=query: some run of words in field is similar to query (pg_trgm `<%`)
+    """
+
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+
+        return f'{rhs} <%% {lhs}', rhs_params + lhs_params
+
+
+class WordSimilarity(models.Func):
+    function = 'WORD_SIMILARITY'
+    output_field = models.FloatField()
+
+
+class PrefixIndex:
+    """
+        every word of every entry in one sorted list of (word, *rank, key), rank being (length, name) of the entry's
+        name; the entries with a word starting with a prefix are one contiguous run of it, found with two binary
+        searches, and within the run each word's entries are already in rank order. a second sorted list of names
+        counts the entries whose name starts with a phrase, and the ranked runs of short prefixes that span too many
+        words to merge are kept until the next change
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._words = []
+        self._names = []
+        self._entries = {}
+        self._sorted_runs = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, rows):
+        """
+            rows: iterable of (key, name, brandname, series)
+        """
+
+        with self._lock:
+            self._entries = {}
+            for key, *label in rows:
+                self._entries[key] = self._entry(label)
+
+            self._words = sorted(
+                (word, len(name), name, key) for key, (entry_words, _, name) in self._entries.items() for word in entry_words
+            )
+            self._names = sorted((name, key) for key, (_, _, name) in self._entries.items())
+            self._sorted_runs = {}
+
+        return self
+
+    def add(self, key, *label):
+        with self._lock:
+            self.remove(key)
+            self._sorted_runs.clear()
+
+            entry_words, _, name = self._entries[key] = self._entry(label)
+            for word in entry_words:
+                insort(self._words, (word, len(name), name, key))
+            insort(self._names, (name, key))
+
+    def remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+
+            self._sorted_runs.clear()
+            entry_words, _, name = entry
+            for word in entry_words:
+                self._discard(self._words, (word, len(name), name, key))
+            self._discard(self._names, (name, key))
+
+    @staticmethod
+    def _discard(items, item):
+        position = bisect_left(items, item)
+        if position < len(items) and items[position] == item:
+            del items[position]
+
+    def vocabulary(self):
+        with self._lock:
+            return sorted({word for word, *_ in self._words})
+
+    @staticmethod
+    def _entry(label):
+        """
+            (every word, label, the name's words joined) for one entry
+        """
+
+        return (
+            tuple(dict.fromkeys(word for text in label for word in words(text or ''))),
+            tuple(label),
+            ' '.join(words(label[0] or '')),
+        )
+
+    @staticmethod
+    def _range(items, prefix):
+        return bisect_left(items, (prefix,)), bisect_left(items, (prefix + _END,))
+
+    def _ranked(self, prefix):
+        """
+            (length, name, key) of the entries with a word starting with prefix, best rank first; an entry with several
+            such words comes out once
+        """
+
+        start, end = self._range(self._words, prefix)
+
+        rank = itemgetter(1, 2, 3)
+        runs = []
+        position = start
+        while position < end and len(runs) <= _MAX_MERGED_WORDS:
+            # the run of one word ends where the next word begins
+            stop = bisect_left(self._words, (self._words[position][0] + '\0',), position, end)
+            runs.append(map(rank, map(self._words.__getitem__, range(position, stop))))
+            position = stop
+
+        if position == end:
+            ranked = heapq.merge(*runs)
+        elif prefix in self._sorted_runs:
+            ranked = self._sorted_runs[prefix]
+        else:
+            # mostly words of an entry or two (numbers, codes): sorting the run is cheaper than merging it, and for the
+            # prefixes typed first, which have the longest runs, the result is kept
+            ranked = sorted(set(map(rank, self._words[start:end])))
+            if len(prefix) <= _SORTED_PREFIX_LENGTH:
+                self._sorted_runs[prefix] = ranked
+
+        previous = None
+        for length, name, key in ranked:
+            if key != previous:
+                previous = key
+                yield length, name, key
+
+    def search(self, query, limit=10):
+        """
+            [(key, (name, brandname, series))] of entries with a word starting with each word of query, names that
+            start with the query first, then shorter names first
+        """
+
+        query_words = words(query)
+        if not query_words or limit <= 0:
+            return []
+
+        phrase = ' '.join(query_words)
+
+        with self._lock:
+            # walk the run of the rarest word in rank order and check the others against each entry; the entries whose
+            # name starts with the phrase are counted up front, so the walk stops as soon as both groups are settled
+            ranges = sorted(((self._range(self._words, word), word) for word in query_words), key=lambda item: item[0][1] - item[0][0])
+            rarest = ranges[0][1]
+            others = [word for _, word in ranges[1:]]
+
+            first, last = self._range(self._names, phrase)
+            leading = min(last - first, limit)
+
+            starting, rest = [], []
+            for _, name, key in self._ranked(rarest):
+                if len(starting) == leading and len(starting) + len(rest) >= limit:
+                    break
+
+                if name.startswith(phrase):
+                    starting.append(key)
+                elif len(rest) < limit - leading:
+                    entry_words = self._entries[key][0]
+                    if all(any(word.startswith(other) for word in entry_words) for other in others):
+                        rest.append(key)
+
+            return [(key, self._entries[key][1]) for key in (starting + rest)[:limit]]
+
+
+_color_indexes = {}
+_color_indexes_lock = threading.Lock()
+
+
+def color_search_index(using='default'):
+    """
+        PrefixIndex over every AnalogColor in the database, built on first use and kept current by the signal
+        handlers in colors.signals
+    """
+
+    from .models import AnalogColor
+
+    with _color_indexes_lock:
+        index = _color_indexes.get(using)
+        if index is None:
+            index = PrefixIndex().build(AnalogColor.objects.using(using).values_list('id', *SEARCH_FIELDS).iterator())
+            _color_indexes[using] = index
+
+    return index
+
+
+def indexed_colors(using='default'):
+    return _color_indexes.get(using)
+
+
+def reset_color_search_index(using=None):
+    with _color_indexes_lock:
+        if using is None:
+            _color_indexes.clear()
+        else:
+            _color_indexes.pop(using, None)
+
+
+def warm(using='default'):
+    """
+        build the autocomplete index now, so the first keystroke does not pay for it; a database that is not
+        reachable yet leaves it to be built on first use
+    """
+
+    try:
+        color_search_index(using)
+    except DatabaseError:
+        logger.warning('could not build the color search index at startup', exc_info=True)
+
+
+def autocomplete(query, limit=10, using='default'):
+    return color_search_index(using).search(query, limit=limit)
+
+
+def _trigram_search(queryset, query, limit):
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'{field}__trigram_word_similar': query})
+
+    score = Greatest(*(WordSimilarity(Value(query), F(field)) for field in SEARCH_FIELDS))
+
+    return list(queryset.filter(matches).annotate(score=score).order_by('-score', 'name', 'id')[:limit])
+
+
+def _substring_search(queryset, query_words, limit, max_candidates=1000):
+    matches = Q()
+    for word in query_words:
+        word_matches = Q()
+        for field in SEARCH_FIELDS:
+            word_matches |= Q(**{f'{field}__icontains': word})
+        matches &= word_matches
+
+    colors = list(queryset.filter(matches)[:max_candidates])
+    phrase = ' '.join(query_words)
+
+    for color in colors:
+        color.score = max(difflib.SequenceMatcher(None, phrase, ' '.join(words(getattr(color, field)))).ratio() for field in SEARCH_FIELDS)
+
+    return sorted(colors, key=lambda color: (-color.score, color.name, color.id))[:limit]
+
+
+def search(query, limit=20, using='default'):
+    """
+        AnalogColors matching query in name, brandname or series, best first, each with a score attribute
+    """
+
+    from .models import AnalogColor
+
+    queryset = AnalogColor.objects.using(using)
+    query_words = words(query)
+    if not query_words:
+        return []
+
+    if connections[using].vendor == 'postgresql':
+        return _trigram_search(queryset, query, limit)
+
+    found = _substring_search(queryset, query_words, limit)
+    if found:
+        return found
+
+    vocabulary = color_search_index(using).vocabulary()
+    corrected = [next(iter(difflib.get_close_matches(word, vocabulary, n=1, cutoff=0.75)), word) for word in query_words]
+    if corrected == query_words:
+        return []
+
+    return _substring_search(queryset, corrected, limit)
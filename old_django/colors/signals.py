@@ -0,0 +1,90 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import closure, lab_index, predictions, recipes, search
+from .models import AnalogColor, AnalogRecipe, DigitalColor
+
+
+# AnalogColor fields a predicted mix color depends on
+_PREDICTION_FIELDS = {
+    'digital_color',
+    'digital_color_id',
+    'opaqueness',
+    'tinting',
+    *(f'_recipe_{additive}' for additive in AnalogColor.recipe_additives),
+}
+
+# sent by duplicates.merge with keep_id, merged_ids and using before the merged AnalogColors are deleted, for other
+# apps to move what refers to them over to the kept color
+analog_colors_merged = Signal()
+
+# sent by the AnalogColor admin with color_ids and using before it asks to confirm a delete; receivers return
+# descriptions of the objects that keep those colors from being deleted, the ones their pre_delete guards would raise
+# ProtectedError for, so the confirmation page lists them instead of the delete failing
+protected_analog_colors = Signal()
+
+
+@receiver(post_save, sender=DigitalColor)
+def index_digital_color(sender, instance, using, **kwargs):
+    index = lab_index.indexed_digital_colors(using)
+    if index is not None:
+        index.add(instance.pk, instance._integer_value)
+
+
+@receiver(post_delete, sender=DigitalColor)
+def unindex_digital_color(sender, instance, using, **kwargs):
+    index = lab_index.indexed_digital_colors(using)
+    if index is not None:
+        index.remove(instance.pk)
+
+
+@receiver(post_save, sender=DigitalColor)
+def refresh_predictions_of_digital_color(sender, instance, using, created, **kwargs):
+    if not created:
+        predictions.schedule_refresh(digital_color_ids=[instance.pk], using=using)
+
+
+@receiver(pre_delete, sender=DigitalColor)
+def refresh_predictions_of_deleted_digital_color(sender, instance, using, **kwargs):
+    # the AnalogColors are unlinked (SET_NULL) before post_delete, so collect them now
+    color_ids = list(instance.analog_colors.using(using).values_list('id', flat=True))
+    if color_ids:
+        predictions.schedule_refresh(color_ids, using=using)
+
+
+@receiver(post_save, sender=AnalogRecipe)
+@receiver(post_delete, sender=AnalogRecipe)
+def forget_flattened_recipes(sender, instance, using, **kwargs):
+    recipes.invalidate(instance.origin_color_id, using)
+
+
+@receiver(post_save, sender=AnalogRecipe)
+@receiver(post_delete, sender=AnalogRecipe)
+def refresh_recipe_closure(sender, instance, using, **kwargs):
+    closure.schedule_refresh(instance.origin_color_id, using)
+
+
+@receiver(post_save, sender=AnalogRecipe)
+@receiver(post_delete, sender=AnalogRecipe)
+def refresh_recipe_prediction(sender, instance, using, **kwargs):
+    predictions.schedule_refresh([instance.origin_color_id], using=using)
+
+
+@receiver(post_save, sender=AnalogColor)
+def refresh_analog_color_prediction(sender, instance, using, update_fields, **kwargs):
+    if update_fields is None or _PREDICTION_FIELDS.intersection(update_fields):
+        predictions.schedule_refresh([instance.pk], using=using)
+
+
+@receiver(post_save, sender=AnalogColor)
+def index_analog_color(sender, instance, using, **kwargs):
+    index = search.indexed_colors(using)
+    if index is not None:
+        index.add(instance.pk, *(getattr(instance, field) for field in search.SEARCH_FIELDS))
+
+
+@receiver(post_delete, sender=AnalogColor)
+def unindex_analog_color(sender, instance, using, **kwargs):
+    index = search.indexed_colors(using)
+    if index is not None:
+        index.remove(instance.pk)
@@ -0,0 +1,130 @@
+import time
+from collections import namedtuple
+from functools import reduce
+from itertools import combinations
+from math import gcd
+
+import numpy as np
+
+from . import conversions, mixing
+from .models import AnalogColor
+
+
+Solution = namedtuple('Solution', ['recipe', 'delta_e'])
+
+# the transparent additive each medium is thinned with
+THINNERS = {
+    'acrylic': 'medium',
+    'dye': 'water',
+    'gouache': 'water',
+    'oil': 'thinner',
+    'watercolor': 'water',
+}
+
+_CHUNK_SIZE = 256
+
+
+def _compositions(count, max_parts):
+    """
+        every way to split at most max_parts parts between count ingredients, each getting at least one part
+    """
+
+    grids = np.meshgrid(*[np.arange(1, max_parts + 1)] * count, indexing='ij')
+    weights = np.stack([grid.ravel() for grid in grids], axis=1)
+    weights = weights[weights.sum(axis=1) <= max_parts]
+
+    # drop multiples of a smaller ratio, they mix to the same color
+    divisors = np.array([reduce(gcd, row) for row in weights.tolist()])
+
+    return weights[divisors == 1]
+
+
+def _shortlist(target_lab, lab, size):
+    """
+        indexes of the pigments worth mixing: the closest ones to the target plus the lightest and darkest available
+    """
+
+    distances = np.sqrt(((lab - target_lab) ** 2).sum(axis=1))
+    closest = np.argsort(distances, kind='stable')[:max(size - 2, 1)]
+    extremes = [int(np.argmax(lab[:, 0])), int(np.argmin(lab[:, 0]))]
+
+    return np.array(list(dict.fromkeys([*closest.tolist(), *extremes])))
+
+
+def solve_recipe(target, candidates=None, max_colors=3, max_parts=10, additive=None, max_additive=4, shortlist=12, time_limit=0.5):
+    """
+        find the mix of candidates (AnalogColor queryset, defaults to every AnalogColor) closest to target
+        (DigitalColor, packed integer, hex str or rgb(a) tuple) under the Kubelka-Munk mixing model
+
+        only candidates with a digital_color take part; at most max_colors of them are combined in integer parts adding up
+        to at most max_parts, optionally diluted with up to max_additive parts of additive (defaults to the thinner for the
+        candidates' medium when they all share one). The search gives up after time_limit seconds and returns the best mix
+        found so far.
+
+        returns Solution(recipe, delta_e) where recipe can be assigned straight to AnalogColor.recipe, or None when no
+        candidate has a digital_color
+    """
+
+    started = time.monotonic()
+
+    if candidates is None:
+        candidates = AnalogColor.objects.all()
+    # pinned, so the solution's colors are read from the alias (or replica) the candidates came from
+    candidates = candidates.using(candidates.db)
+
+    rows = list(candidates.filter(digital_color__isnull=False).values_list('id', 'digital_color___integer_value', 'medium', 'tinting', 'opaqueness'))
+    if not rows:
+        return None
+
+    ids, values, media, tinting, opaqueness = zip(*rows)
+    ids = np.array(ids)
+
+    if additive is None and len(set(media)) == 1:
+        additive = THINNERS.get(media[0])
+    if additive is None:
+        max_additive = 0
+
+    target_lab = conversions.to_lab(conversions.as_packed(target))[0]
+
+    lab = conversions.to_lab(values)
+    picked = _shortlist(target_lab, lab, shortlist)
+    ks = mixing.absorption(mixing.reflectance(np.array(values)[picked]))
+    strengths = mixing.strength(tinting, opaqueness)[picked]
+    extenders = np.arange(max_additive + 1, dtype=np.float64)
+
+    best = (np.inf, None, None, 0)
+
+    for count in range(1, min(max_colors, len(picked)) + 1):
+        weights = _compositions(count, max_parts)
+        groups = np.array(list(combinations(range(len(picked)), count)))
+
+        for start in range(0, len(groups), _CHUNK_SIZE):
+            group = groups[start:start + _CHUNK_SIZE]
+
+            # (groups, weights, extenders, 3)
+            mixed = mixing.mix_absorption(
+                ks[group][:, None, None], weights[None, :, None], extenders[None, None, :], strengths=strengths[group][:, None, None]
+            )
+            mixed_lab = conversions.linear_to_lab(mixing.reflectance_from_absorption(mixed)).reshape(mixed.shape)
+            errors = np.sqrt(((mixed_lab - target_lab) ** 2).sum(axis=-1))
+
+            g, w, e = np.unravel_index(np.argmin(errors), errors.shape)
+            if errors[g, w, e] < best[0]:
+                best = (float(errors[g, w, e]), group[g], weights[w], int(extenders[e]))
+
+            if time.monotonic() - started > time_limit:
+                break
+        else:
+            continue
+        break
+
+    delta_e, group, weights, extender = best
+    colors = AnalogColor.objects.using(candidates.db).in_bulk(ids[picked[group]].tolist())
+
+    recipe = {
+        'colors': [(colors[color_id], int(quantity)) for color_id, quantity in zip(ids[picked[group]].tolist(), weights)],
+    }
+    if extender:
+        recipe[additive] = extender
+
+    return Solution(recipe, delta_e)
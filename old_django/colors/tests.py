@@ -1,9 +1,32 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import time
+from unittest import mock
 
-from .models import AnalogColor, AnalogRecipe, DigitalColor
+import numpy as np
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from bpaint import metrics
+
+from . import benchmarks, catalog, closure, conversions, duplicates, export, extraction, lab_index, mixing, predictions, profiles, recipes, search, solver
+from .models import AnalogColor, AnalogRecipe, DigitalColor, DuplicateCluster, RecipeClosure
+from .palette import Palette
 
 
 class AnalogColorTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
     def setUp(self):
         AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='oil', name='Test Analog Color 0', series='1')
 
@@ -11,3 +34,993 @@ class AnalogColorTestCase(TestCase):
     def test_recipe_is_auto_created(self):
         ac = AnalogColor.objects.first()
         self.assertEqual(ac.recipe, '')
+
+
+class DigitalColorConversionTestCase(TestCase):
+    def setUp(self):
+        DigitalColor.objects.create(name='Test Digital Color 0', _integer_value=0x336699ff)
+
+    def test_scalar_conversions(self):
+        dc = DigitalColor.objects.first()
+        self.assertEqual(dc.rgba, (0x33, 0x66, 0x99, 1.0))
+        self.assertEqual(dc.hsla, (210, '50%', '40%', 1.0))
+        self.assertEqual(dc.cmyk, ('67%', '33%', '0%', '40%'))
+        self.assertEqual(dc.hex, '0x336699ff')
+
+    def test_setters_round_trip(self):
+        dc = DigitalColor.objects.first()
+
+        dc.hsla = (210, '50%', '40%', 1.0)
+        self.assertEqual(dc.hex, '0x336699ff')
+
+        dc.hex = '#369'
+        self.assertEqual(dc.rgba, (0x33, 0x66, 0x99, 1.0))
+
+        dc.cmyk = ('0%', '0%', '0%', '100%')
+        self.assertEqual(dc.rgb, (0, 0, 0))
+
+        # ints are percent, only floats are fractions
+        dc.cmyk = (1, 0, 0, 0)
+        self.assertEqual(dc.cmyk, ('1%', '0%', '0%', '0%'))
+        self.assertEqual(conversions.fraction(1), 0.01)
+        self.assertEqual(conversions.fraction(0.5), 0.5)
+
+    def test_batch_matches_scalar(self):
+        values = [0x00000000, 0x336699ff, 0xff000080, 0x808080ff, 0xffffffff]
+        hsla = conversions.to_hsla(values)
+        hexes = conversions.to_hex(values)
+
+        for i, value in enumerate(values):
+            dc = DigitalColor(_integer_value=value)
+            self.assertEqual(dc.hex, hexes[i])
+            self.assertEqual(dc.hsla[0], int(round(hsla[i, 0])) % 360)
+
+        self.assertEqual(list(conversions.from_hex(hexes)), values)
+        self.assertEqual(list(conversions.from_hsla(hsla) >> 8), [value >> 8 for value in values])
+
+        with self.assertRaises(TypeError):
+            conversions.from_hex([123])
+
+
+class DigitalColorBulkAssignTestCase(TestCase):
+    def setUp(self):
+        DigitalColor.objects.bulk_create([DigitalColor(name=f'Test Digital Color {i}', _integer_value=i) for i in range(10)])
+
+    def test_setters_are_deferred_and_flushed_together(self):
+        colors = list(DigitalColor.objects.order_by('id'))
+
+        # savepoint, one UPDATE, release
+        with self.assertNumQueries(3):
+            with DigitalColor.objects.bulk_assign(batch_size=100):
+                for i, color in enumerate(colors):
+                    color.hsl = (i * 30, '50%', '50%')
+
+        for color, stored in zip(colors, DigitalColor.objects.order_by('id')):
+            self.assertEqual(stored.hex, color.hex)
+
+    def test_setters_save_outside_bulk_assign(self):
+        color = DigitalColor.objects.first()
+
+        with self.assertNumQueries(1):
+            color.hsl = (0, '100%', '50%')
+
+        self.assertEqual(DigitalColor.objects.get(pk=color.pk).rgb, (255, 0, 0))
+
+
+class DigitalColorNearestTestCase(TestCase):
+    def setUp(self):
+        lab_index.reset_digital_color_index()
+        for name, value in [('red', 0xff0000ff), ('dark red', 0x800000ff), ('blue', 0x0000ffff), ('white', 0xffffffff)]:
+            DigitalColor.objects.create(name=name, _integer_value=value)
+
+    def tearDown(self):
+        lab_index.reset_digital_color_index()
+
+    def test_nearest(self):
+        self.assertEqual([c.name for c in DigitalColor.objects.nearest('#f00', k=2)], ['red', 'dark red'])
+        self.assertEqual([c.name for c in DigitalColor.objects.within((250, 250, 250), 5)], ['white'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(DigitalColor.objects.nearest('#0f0')[0].name, 'white')
+
+        DigitalColor.objects.create(name='green', _integer_value=0x00ff00ff)
+        self.assertEqual(DigitalColor.objects.nearest('#0f0')[0].name, 'green')
+
+        DigitalColor.objects.get(name='green').delete()
+        blue = DigitalColor.objects.get(name='blue')
+        blue.rgb = (0, 250, 0)
+        self.assertEqual(DigitalColor.objects.nearest('#0f0')[0].name, 'blue')
+
+    def test_index_follows_bulk_writes(self):
+        self.assertEqual(DigitalColor.objects.nearest('#0f0')[0].name, 'white')
+
+        DigitalColor.objects.bulk_create([DigitalColor(name='green', _integer_value=0x00ff00ff)])
+        self.assertEqual(DigitalColor.objects.nearest('#0f0')[0].name, 'green')
+
+        DigitalColor.objects.filter(name='white').update(_integer_value=0x00fe00ff)
+        nearest = DigitalColor.objects.nearest('#0f0', k=2)
+        self.assertEqual([color.name for color in nearest], ['green', 'white'])
+        self.assertLess(nearest[1].delta_e, 1)
+
+
+class RecipeSolverTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        for name, value in [('Titanium White', 0xf4f4f0ff), ('Ivory Black', 0x1c1c1cff), ('Cadmium Red', 0xd02020ff), ('Ultramarine', 0x2030a0ff)]:
+            AnalogColor.objects.create(
+                brandname='Golden',
+                image_url='https://picsum.photos/200/300',
+                medium='acrylic',
+                name=name,
+                series='1',
+                digital_color=DigitalColor.objects.create(name=name, _integer_value=value),
+            )
+
+    def test_solution_is_a_recipe(self):
+        solution = solver.solve_recipe('#d02020')
+
+        self.assertLess(solution.delta_e, 1)
+        self.assertEqual([(color.name, quantity) for color, quantity in solution.recipe['colors']], [('Cadmium Red', 1)])
+
+        mix = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Pink', series='1')
+        mix.recipe = solver.solve_recipe('#e89090', AnalogColor.objects.exclude(name='Pink')).recipe
+        self.assertIn('Titanium White', ' '.join(mix.recipe['colors']))
+
+    def test_no_candidates(self):
+        self.assertIsNone(solver.solve_recipe('#fff', AnalogColor.objects.filter(medium='oil')))
+
+    def test_solution_colors_come_from_the_candidates_database(self):
+        candidates = AnalogColor.objects.using('default')
+        with mock.patch.object(AnalogColor.objects, 'using', wraps=AnalogColor.objects.using) as using:
+            solution = solver.solve_recipe('#d02020', candidates)
+
+        self.assertEqual(solution.recipe['colors'][0][0].name, 'Cadmium Red')
+        using.assert_called_with('default')
+
+
+class RecipeFlatteningTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        recipes.reset()
+        self.white, self.red, self.blue, self.pink, self.lilac = [
+            AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series='1')
+            for name in ('White', 'Red', 'Blue', 'Pink', 'Lilac')
+        ]
+        AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.white, quantity=3)
+        AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.red, quantity=1)
+        AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.pink, quantity=1)
+        AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.blue, quantity=1)
+
+    def tearDown(self):
+        recipes.reset()
+
+    def test_mixes_of_mixes_expand_to_base_pigments(self):
+        with self.assertNumQueries(2):
+            pigments = {color.name: proportion for color, proportion in self.lilac.base_pigments}
+
+        self.assertEqual(pigments, {'White': 0.375, 'Red': 0.125, 'Blue': 0.5})
+        self.assertEqual(recipes.flatten(self.white.id), {self.white.id: 1.0})
+
+    def test_changes_to_ingredients_invalidate_memoized_results(self):
+        recipes.flatten(self.lilac.id)
+        with self.assertNumQueries(0):
+            recipes.flatten(self.lilac.id)
+
+        AnalogRecipe.objects.filter(origin_color=self.pink, ingredient=self.white).get().delete()
+        self.assertEqual(recipes.flatten(self.lilac.id), {self.red.id: 0.5, self.blue.id: 0.5})
+
+    def test_cycles_are_reported(self):
+        AnalogRecipe.objects.create(origin_color=self.red, ingredient=self.lilac, quantity=1)
+
+        with self.assertRaises(recipes.RecipeCycleError):
+            recipes.flatten(self.lilac.id)
+
+
+class RecipePrefetchTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        white, red = [
+            AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series='1')
+            for name in ('White', 'Red')
+        ]
+        for i in range(5):
+            mix = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=f'Pink {i}', series='1', _recipe_water=i)
+            AnalogRecipe.objects.create(origin_color=mix, ingredient=red, quantity=1)
+            AnalogRecipe.objects.create(origin_color=mix, ingredient=white, quantity=i + 1)
+
+    def test_with_recipes_reads_every_recipe_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            found = {color.name: color.recipe for color in AnalogColor.objects.with_recipes()}
+
+        self.assertEqual(found['White'], {'colors': ['White (acrylic) x1']})
+        self.assertEqual(found['Pink 2'], {'colors': ['Red (acrylic) x1', 'White (acrylic) x3'], 'water': 2})
+        self.assertEqual(found, {color.name: color.recipe for color in AnalogColor.objects.all()})
+
+
+class RecipeClosureTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.white, self.red, self.blue, self.pink, self.lilac = [
+            AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series='1')
+            for name in ('White', 'Red', 'Blue', 'Pink', 'Lilac')
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.white, quantity=3)
+            AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.red, quantity=1)
+            AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.pink, quantity=2)
+            AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.blue, quantity=1)
+
+    def closure_rows(self):
+        return set(RecipeClosure.objects.values_list('ancestor__name', 'descendant__name', 'depth', 'multiplier'))
+
+    def test_transitive_queries(self):
+        self.assertEqual(set(AnalogColor.objects.mixes_using(self.white).values_list('name', flat=True)), {'Pink', 'Lilac'})
+        self.assertEqual(set(AnalogColor.objects.ingredients_of(self.lilac).values_list('name', flat=True)), {'Pink', 'Blue', 'White', 'Red'})
+        self.assertIn(('Lilac', 'White', 2, 6), self.closure_rows())
+
+    def test_incremental_updates_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AnalogRecipe.objects.filter(origin_color=self.pink, ingredient=self.red).delete()
+            AnalogRecipe.objects.create(origin_color=self.blue, ingredient=self.red, quantity=4)
+
+        incremental = self.closure_rows()
+        closure.rebuild()
+
+        self.assertEqual(incremental, self.closure_rows())
+        self.assertIn(('Lilac', 'Red', 2, 4), incremental)
+        self.assertNotIn(('Pink', 'Red', 1, 1), incremental)
+
+    def test_shared_ingredients_are_visited_once_per_depth(self):
+        # 40 stacked diamonds: 2 ** 40 paths from the top color to the bottom one
+        edges = {}
+        for level in range(40):
+            top = 3 * level
+            edges[top] = [(top + 1, 1), (top + 2, 1)]
+            edges[top + 1] = edges[top + 2] = [(top + 3, 1)]
+
+        self.assertEqual(closure._paths(0, edges)[(120, 80)], 2 ** 40)
+
+    def test_cycles_are_reported(self):
+        # 1 and 2 use each other below the root, and 4 uses itself through the root
+        for edges in ({0: [(1, 1)], 1: [(2, 1000)], 2: [(1, 1000)]}, {3: [(4, 1)], 4: [(3, 1)]}):
+            with self.assertRaises(recipes.RecipeCycleError):
+                closure._paths(min(edges), edges)
+
+        before = self.closure_rows()
+        AnalogRecipe.objects.create(origin_color=self.white, ingredient=self.lilac, quantity=1)
+        with self.assertRaises(recipes.RecipeCycleError):
+            closure.refresh([self.white.id])
+        self.assertEqual(self.closure_rows(), before)
+
+        with self.assertLogs('colors.closure', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            closure.schedule_refresh(self.white.id)
+        self.assertEqual(self.closure_rows(), before)
+
+
+class AnalogRecipeAdminTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.white = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='White', series='1')
+
+    def add_mixes(self, count, start=0):
+        for i in range(start, start + count):
+            mix = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=f'Mix {i}', series='1')
+            AnalogRecipe.objects.create(origin_color=mix, ingredient=self.white, quantity=i + 1)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:colors_analogrecipe_changelist'))
+
+        self.assertEqual(response.status_code, 200)
+
+        return len(queries)
+
+    def test_changelist_query_count_is_constant(self):
+        self.add_mixes(3)
+        few = self.changelist_queries()
+
+        self.add_mixes(30, start=3)
+        self.assertEqual(self.changelist_queries(), few)
+
+
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_requests_are_recorded_per_view_and_database(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.get(reverse('admin:colors_analogcolor_changelist'))
+
+        exposition = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('bpaint_request_duration_seconds_count{view="admin:colors_analogcolor_changelist"} 1', exposition)
+        self.assertIn('bpaint_db_queries_total{view="admin:colors_analogcolor_changelist",database="default"}', exposition)
+
+    async def test_sync_views_under_asgi_record_their_queries(self):
+        await self.async_client.get(reverse('digital_color_list'))
+
+        self.assertIn('bpaint_db_queries_total{view="digital_color_list",database="default"} 1', metrics.registry.render())
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+
+class SyntheticCatalogTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def test_generate_builds_the_requested_catalog(self):
+        benchmarks.generate(analog_colors=40, recipe_depth=3, digital_colors=50, inventory_rows=20, seed=7)
+
+        self.assertEqual(AnalogColor.objects.count(), 40)
+        self.assertEqual(DigitalColor.objects.count(), 50)
+        self.assertEqual(apps.get_model('inventory', 'Inventory').objects.count(), 20)
+        self.assertEqual(RecipeClosure.objects.order_by('-depth').values_list('depth', flat=True).first(), 3)
+
+    def test_generate_without_digital_colors(self):
+        benchmarks.generate(analog_colors=40, recipe_depth=3, digital_colors=0, inventory_rows=5, seed=7)
+
+        self.assertEqual(AnalogColor.objects.count(), 40)
+        self.assertFalse(AnalogColor.objects.filter(digital_color__isnull=False).exists())
+
+    def test_generate_rejects_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            benchmarks.generate(analog_colors=-1)
+        with self.assertRaises(ValueError):
+            benchmarks.generate(recipe_depth=0)
+
+
+class CatalogImportTestCase(TestCase):
+    databases = {'default', 'inventory'}
+    csv_catalog = (
+        'name,brandname,medium,series,image_url,opaqueness\n'
+        'Titanium White,Golden,acrylic,1,https://example.com/white.png,100\n'
+        'Mars Black,Golden,acrylic,1,https://example.com/black.png,\n'
+        'Bad Medium,Golden,tempera,1,https://example.com/bad.png,100\n'
+        'Titanium White,Golden,acrylic,1,https://example.com/white-2.png,100\n'
+    )
+
+    def test_csv_import_validates_and_skips_conflicts(self):
+        report = catalog.import_catalog(io.StringIO(self.csv_catalog), chunk_size=2)
+
+        self.assertEqual((report.created, report.updated, report.skipped, report.failed), (2, 0, 1, 1))
+        self.assertEqual(report.errors[0][0], 4)
+        self.assertIn('medium', report.errors[0][1])
+        self.assertEqual(AnalogColor.objects.get(name='Titanium White').image_url, 'https://example.com/white.png')
+
+    def test_ragged_csv_rows_are_reported(self):
+        ragged = self.csv_catalog + 'Extra Cells,Golden,acrylic,1,https://example.com/extra.png,100,gloss,matte\n'
+        report = catalog.import_catalog(io.StringIO(ragged))
+
+        self.assertEqual((report.created, report.failed), (2, 2))
+        self.assertEqual(report.errors[1], (6, 'row has 2 extra cells'))
+        self.assertFalse(AnalogColor.objects.filter(name='Extra Cells').exists())
+
+    def test_ndjson_upsert_updates_existing_colors(self):
+        catalog.import_catalog(io.StringIO(self.csv_catalog))
+
+        ndjson = '\n'.join([
+            json.dumps({'name': 'Titanium White', 'brandname': 'Golden', 'medium': 'acrylic', 'series': '1', 'image_url': 'https://example.com/new.png', '_recipe_water': 2}),
+            json.dumps({'name': 'Cadmium Red', 'brandname': 'Golden', 'medium': 'acrylic', 'series': '2', 'image_url': 'https://example.com/red.png'}),
+            'not json',
+        ])
+        report = catalog.import_catalog(io.StringIO(ndjson), format='ndjson', on_conflict='update')
+
+        self.assertEqual((report.created, report.updated, report.failed), (1, 1, 1))
+        white = AnalogColor.objects.get(name='Titanium White')
+        self.assertEqual((white.image_url, white._recipe_water), ('https://example.com/new.png', 2))
+
+    def test_upsert_keeps_predictions_current(self):
+        catalog.import_catalog(io.StringIO(self.csv_catalog))
+        white, black = AnalogColor.objects.get(name='Titanium White'), AnalogColor.objects.get(name='Mars Black')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for color, value in [(white, 0xf4f4f0ff), (black, 0x1c1c1cff)]:
+                color.digital_color = DigitalColor.objects.create(name=color.name, _integer_value=value)
+                color.save()
+            grey = AnalogColor.objects.create(brandname='Golden', image_url='https://example.com/grey.png', medium='acrylic', name='Grey', series='1')
+            grey.recipe = {'colors': [(white, 1), (black, 1)]}
+        before = AnalogColor.objects.get(name='Grey').predicted_value
+
+        ndjson = '\n'.join(
+            json.dumps({'name': name, 'brandname': 'Golden', 'medium': 'acrylic', 'series': '1', 'image_url': 'https://example.com/new.png', '_recipe_water': 2})
+            for name in ('Titanium White', 'Grey')
+        )
+        catalog.import_catalog(io.StringIO(ndjson), format='ndjson', on_conflict='update')
+
+        self.assertEqual(AnalogColor.objects.get(name='Titanium White').predicted_value, 0xf4f4f0ff)
+        grey = AnalogColor.objects.get(name='Grey')
+        self.assertNotEqual(grey.predicted_value, before)
+        self.assertEqual(grey.predicted_value, predictions.predict([grey.id])[grey.id])
+
+        report = catalog.import_catalog(io.StringIO(json.dumps({'name': 'Grey', 'predicted_value': 0}) + '\n'), format='ndjson')
+        self.assertIn('predicted_value', report.errors[0][1])
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        for i in range(5):
+            DigitalColor.objects.create(name=f'Color, {i}', _integer_value=i)
+
+    def test_ndjson_and_csv(self):
+        lines = b''.join(export.stream('digital_colors')).decode().splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], [f'Color, {i}' for i in range(5)])
+
+        rows = list(csv.reader(io.StringIO(b''.join(export.stream('digital_colors', format='csv')).decode())))
+        self.assertEqual(rows[0], ['id', 'name', '_integer_value'])
+        self.assertEqual(rows[5][1:], ['Color, 4', '4'])
+
+    def test_gzip_endpoint(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('export', args=['digital_colors']), {'format': 'csv', 'gzip': '1'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()), 6)
+        self.assertEqual(self.client.get(reverse('export', args=['palettes'])).status_code, 404)
+
+
+class ReadApiTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        for i in range(5):
+            DigitalColor.objects.create(name=f'Color {i}', _integer_value=0x000000ff + (i << 8))
+
+    def test_keyset_pages_cover_every_row(self):
+        names = []
+        url = reverse('digital_color_list') + '?limit=2'
+        while url:
+            page = self.client.get(url).json()
+            names += [color['name'] for color in page['results']]
+            url = page['next']
+
+        self.assertEqual(names, [f'Color {i}' for i in range(5)])
+
+    def test_conditional_get(self):
+        url = reverse('digital_color_list') + '?limit=3'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        color = DigitalColor.objects.get(name='Color 1')
+        color.hex = '#123456'
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][1]['hex'], '0x123456ff')
+
+    def test_detail(self):
+        color = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='oil', name='Test', series='1')
+        response = self.client.get(reverse('analog_color_detail', args=[color.pk]))
+
+        self.assertEqual(response.json()['recipe'], {'colors': ['Test (oil) x1']})
+        self.assertEqual(self.client.get(reverse('analog_color_detail', args=[color.pk + 1])).status_code, 404)
+
+    def test_detail_etag_follows_the_recipe(self):
+        color, white = [
+            AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='oil', name=name, series='1')
+            for name in ('Test', 'White')
+        ]
+        url = reverse('analog_color_detail', args=[color.pk])
+
+        etag = self.client.get(url)['ETag']
+        AnalogRecipe.objects.create(origin_color=color, ingredient=white, quantity=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['recipe'], {'colors': ['White (oil) x2']})
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        white.name = 'Titanium White'
+        white.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class DigitalColorDerivedFieldsTestCase(TestCase):
+    def setUp(self):
+        DigitalColor.objects.create(name='sky', _integer_value=0x87ceebff)
+        DigitalColor.objects.bulk_create([
+            DigitalColor(name='navy', _integer_value=0x000080ff),
+            DigitalColor(name='red', _integer_value=0xff0000ff),
+            DigitalColor(name='rose', _integer_value=0xff007fff),
+        ])
+
+    def names(self, queryset):
+        return set(queryset.values_list('name', flat=True))
+
+    def test_range_filters(self):
+        blues = DigitalColor.objects.hue_between(180, 250)
+        self.assertEqual(self.names(blues), {'sky', 'navy'})
+        self.assertEqual(self.names(blues.lightness_between('60%', '100%')), {'sky'})
+        self.assertEqual(self.names(blues.lightness_between(1, 60)), {'navy'})
+        self.assertEqual(self.names(DigitalColor.objects.hue_between(320, 10)), {'red', 'rose'})
+        self.assertEqual(self.names(DigitalColor.objects.hue_between(-40, 10)), {'red', 'rose'})
+        self.assertEqual(self.names(DigitalColor.objects.hue_between(0, 360)), {'sky', 'navy', 'red', 'rose'})
+        self.assertEqual(self.names(DigitalColor.objects.lab_within('#fe0000', 5)), {'red'})
+
+    def test_derived_fields_follow_setters_and_bulk_assign(self):
+        red = DigitalColor.objects.get(name='red')
+        red.hsl = (120, '100%', '25%')
+        self.assertEqual(self.names(DigitalColor.objects.hue_between(110, 130)), {'red'})
+
+        with DigitalColor.objects.bulk_assign():
+            for color in DigitalColor.objects.all():
+                color.rgb = (255, 255, 0)
+                break
+
+        self.assertEqual(DigitalColor.objects.hue_between(59, 61).count(), 1)
+
+
+class PaletteExtractionTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        lab_index.reset_digital_color_index()
+        self.red = DigitalColor.objects.create(name='red', _integer_value=0xff0000ff)
+        self.blue = DigitalColor.objects.create(name='blue', _integer_value=0x0000ffff)
+        self.cadmium = AnalogColor.objects.create(
+            brandname='Golden', image_url='https://example.com/c.png', medium='acrylic', name='Cadmium Red', series='7', digital_color=self.red,
+        )
+
+        # three quarters red, one quarter blue, with a little noise
+        pixels = np.zeros((400, 400, 3), dtype=np.uint8)
+        pixels[:, :300] = (250, 5, 5)
+        pixels[:, 300:] = (5, 5, 250)
+        pixels = np.clip(pixels + np.random.default_rng(0).integers(-4, 5, pixels.shape), 0, 255).astype(np.uint8)
+
+        self.image = io.BytesIO()
+        Image.fromarray(pixels).save(self.image, format='JPEG', quality=95)
+
+    def tearDown(self):
+        lab_index.reset_digital_color_index()
+
+    def test_dominant_colors_are_matched(self):
+        self.image.seek(0)
+        found = extraction.dominant_colors(self.image, k=2, max_side=64)
+
+        self.assertEqual(len(found), 2)
+        self.assertAlmostEqual(found[0].share, 0.75, delta=0.05)
+        self.assertEqual([color.digital_color for color in found], [self.red, self.blue])
+        self.assertEqual(found[0].analog_color, self.cadmium)
+        self.assertLess(found[0].digital_delta_e, 5)
+
+    def test_upload(self):
+        self.image.seek(0)
+        response = self.client.post(
+            reverse('extract_palette') + '?colors=2',
+            {'image': SimpleUploadedFile('swatch.jpg', self.image.read(), content_type='image/jpeg')},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([color['digital_color_id'] for color in response.json()['colors']], [self.red.id, self.blue.id])
+
+        response = self.client.post(reverse('extract_palette'), {'image': SimpleUploadedFile('swatch.jpg', b'not an image')})
+        self.assertEqual(response.status_code, 400)
+
+        self.image.seek(0)
+        truncated = self.image.read()[:2000]
+        response = self.client.post(reverse('extract_palette'), {'image': SimpleUploadedFile('swatch.jpg', truncated, content_type='image/jpeg')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_large_images_are_refused_before_decoding(self):
+        image = io.BytesIO()
+        Image.new('RGB', (400, 300)).save(image, format='PNG')
+        image.seek(0)
+
+        with self.assertRaises(ValueError):
+            extraction.dominant_colors(image, max_pixels=100000)
+
+    def test_large_png_is_reduced_rather_than_refused(self):
+        pixels = np.zeros((3000, 4000, 3), dtype=np.uint8)
+        pixels[:, :3000] = (250, 5, 5)
+        pixels[:, 3000:] = (5, 5, 250)
+        image = io.BytesIO()
+        Image.fromarray(pixels).save(image, format='PNG')
+        image.seek(0)
+
+        found = extraction.dominant_colors(image, k=2)
+
+        self.assertEqual([color.digital_color for color in found], [self.red, self.blue])
+        self.assertAlmostEqual(found[0].share, 0.75, delta=0.01)
+
+
+class AnalogColorSearchTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        search.reset_color_search_index()
+        for name, brandname, series in [
+            ('Cadmium Red Medium', 'Golden', '7'),
+            ('Cadmium Red Light', 'Liquitex', '6'),
+            ('Cadmium Yellow', 'Golden', '7'),
+            ('Alizarin Crimson Hue', 'Winsor & Newton', 'Winton'),
+        ]:
+            AnalogColor.objects.create(brandname=brandname, image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series=series)
+
+    def tearDown(self):
+        search.reset_color_search_index()
+
+    def names(self, found):
+        return [label[0] for _, label in found]
+
+    def test_autocomplete(self):
+        self.assertEqual(self.names(search.autocomplete('cad r')), ['Cadmium Red Light', 'Cadmium Red Medium'])
+        self.assertEqual(self.names(search.autocomplete('golden cad')), ['Cadmium Yellow', 'Cadmium Red Medium'])
+        self.assertEqual(self.names(search.autocomplete('winton')), ['Alizarin Crimson Hue'])
+
+        AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Crimson', series='5')
+        AnalogColor.objects.get(name='Alizarin Crimson Hue').delete()
+        self.assertEqual(self.names(search.autocomplete('crim')), ['Crimson'])
+
+        response = self.client.get(reverse('analog_color_autocomplete'), {'q': 'cadmium y'})
+        self.assertEqual([color['name'] for color in response.json()['results']], ['Cadmium Yellow'])
+
+    def test_prefix_index_ranks_the_whole_run(self):
+        rows = [(i, f'Aa {i:05}', 'Golden', '1') for i in range(6000)] + [(10000 + i, f'Zz {i:05}', 'Winsor', '1') for i in range(6000)]
+        index = search.PrefixIndex().build(rows + [(20000, 'Ab', 'Golden', '1'), (20001, 'Az', 'Winsor', '1')])
+
+        self.assertEqual(self.names(index.search('a', limit=1)), ['Ab'])
+        self.assertEqual(self.names(index.search('a winsor')), ['Az'])
+
+    def test_prefix_index_answers_short_queries_quickly(self):
+        rng = np.random.default_rng(0)
+        pigments = ['Cadmium', 'Cobalt', 'Burnt', 'Sienna', 'Umber', 'Titanium', 'White', 'Black', 'Green', 'Blue', 'Crimson', 'Hue', 'Light', 'Deep']
+        brands = ['Golden', 'Liquitex', 'Winsor & Newton', 'Schmincke', 'Gamblin', 'Blick']
+        index = search.PrefixIndex().build(
+            (i, f'{" ".join(rng.choice(pigments, 3))} {i}', brands[i % len(brands)], str(i % 9 + 1)) for i in range(100000)
+        )
+
+        for query in ['c', 'b', 'g', 's', 'w', 'golden', 'golden cad', '1']:
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                found = index.search(query)
+                timings.append(time.perf_counter() - started)
+
+            self.assertEqual(len(found), 10)
+            self.assertLess(min(timings), 0.01, query)
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual([color.name for color in search.search('red cadmium light')], ['Cadmium Red Light'])
+        self.assertEqual([color.name for color in search.search('cadmim yelow')], ['Cadmium Yellow'])
+        self.assertEqual(search.search('ultramarine'), [])
+
+        response = self.client.get(reverse('analog_color_search'), {'q': 'alizarin'})
+        self.assertEqual([color['name'] for color in response.json()['results']], ['Alizarin Crimson Hue'])
+
+
+class ColorConversionEndpointTestCase(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    async def test_convert(self):
+        response = await self.async_client.post(
+            reverse('convert_colors'),
+            {'from': 'hex', 'to': ['rgba', 'hsla', 'value'], 'colors': ['#ff0000', '0x00ff0080']},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'rgba': [[255, 0, 0, 1.0], [0, 255, 0, 0.5]],
+            'hsla': [[0, 1, 0.5, 1.0], [120, 1, 0.5, 0.5]],
+            'value': [0xff0000ff, 0x00ff0080],
+        })
+        self.assertIn('bpaint_request_duration_seconds_count{view="convert_colors"} 1', metrics.registry.render())
+
+    async def test_large_batches_round_trip(self):
+        values = np.random.default_rng(0).integers(0, 2 ** 32, 5000).tolist()
+        response = await self.async_client.post(
+            reverse('convert_colors'), {'from': 'value', 'to': 'hex', 'colors': values}, content_type='application/json',
+        )
+
+        response = await self.async_client.post(
+            reverse('convert_colors'), {'from': 'hex', 'to': 'value', 'colors': response.json()['hex']}, content_type='application/json',
+        )
+        self.assertEqual(response.json()['value'], values)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    async def test_bad_requests(self):
+        for body in [
+            {'from': 'hex', 'to': 'rgba', 'colors': ['#ggg']},
+            {'from': 'pantone', 'to': 'rgba', 'colors': []},
+            {'colors': []},
+            {'from': ['hex'], 'to': 'rgba', 'colors': []},
+            {'from': 'hex', 'to': [{}], 'colors': []},
+            {'from': 'value', 'to': 'hex', 'colors': [2 ** 70]},
+            {'from': 'hex', 'to': 'value', 'colors': [123]},
+        ]:
+            response = await self.async_client.post(reverse('convert_colors'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual((await self.async_client.get(reverse('convert_colors'))).status_code, 405)
+
+
+class PaletteTestCase(TestCase):
+    def setUp(self):
+        lab_index.reset_digital_color_index()
+        DigitalColor.objects.bulk_create([
+            DigitalColor(name='red', _integer_value=0xff0000ff),
+            DigitalColor(name='grün', _integer_value=0x00ff0080),
+            DigitalColor(name='', _integer_value=0x0000ffff),
+        ])
+
+    def tearDown(self):
+        lab_index.reset_digital_color_index()
+
+    def test_palette_matches_digital_colors(self):
+        colors = list(DigitalColor.objects.order_by('id'))
+        with self.assertNumQueries(1):
+            palette = DigitalColor.objects.order_by('id').palette()
+
+        self.assertEqual(len(palette), 3)
+        self.assertEqual(palette.names(), ['red', 'grün', ''])
+        for color, entry in zip(colors, palette):
+            self.assertEqual(entry.id, color.id)
+            self.assertEqual((entry.rgba, entry.rgb, entry.hsla, entry.hsl, entry.cmyk, entry.hex), (color.rgba, color.rgb, color.hsla, color.hsl, color.cmyk, color.hex))
+
+        self.assertEqual(palette.hex.tolist(), [color.hex for color in colors])
+        self.assertEqual(palette[-1].value, 0x0000ffff)
+        self.assertEqual(palette[1:].names(), ['grün', ''])
+        self.assertEqual(DigitalColor.objects.nearest(palette[0])[0], colors[0])
+
+    def test_buffers_are_shared(self):
+        palette = Palette([0xff0000ff, 0x00ff00ff], ['red', 'green'])
+
+        self.assertTrue(np.shares_memory(palette.values, np.frombuffer(palette.buffer(), dtype=np.uint32)))
+        self.assertEqual(np.frombuffer(bytes(palette), dtype=np.uint32).tolist(), [0xff0000ff, 0x00ff00ff])
+        self.assertTrue(palette.buffer().readonly)
+        self.assertEqual(len(Palette()), 0)
+        self.assertEqual(Palette().values.tolist(), [])
+
+        with self.assertRaises(ValueError):
+            Palette([1, 2], ['one'])
+
+
+class CmykProfileTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        settings_override = override_settings(CMYK_PROFILE_DIR=directory.name, CMYK_PROFILE=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(profiles.reset_profiles)
+
+        # ink-limited stand-in for a real press profile: the uncalibrated formula with cyan held to 80%
+        def rgb_to_cmyk(rgb):
+            cmyk = conversions.to_cmyk(conversions.from_rgba(np.column_stack([rgb * 255, np.ones(len(rgb))])))
+            cmyk[:, 0] *= 0.8
+            return cmyk
+
+        profiles.save('press', profiles.sample(rgb_to_cmyk, lambda cmyk: (1 - cmyk[:, :3]) * (1 - cmyk[:, 3:]), grid=17, cmyk_grid=9))
+
+    def test_interpolation_reproduces_linear_tables(self):
+        rng = np.random.default_rng(0)
+        weights = rng.random((4, 3))
+        points = rng.random((500, 4))
+
+        table = profiles.sample(lambda rgb: rgb @ weights.T, lambda cmyk: cmyk @ weights, grid=5, cmyk_grid=5)['cmyk_to_rgb']
+
+        for method in profiles.INTERPOLATIONS:
+            np.testing.assert_allclose(profiles.interpolate(table, points, method), points @ weights, atol=1e-5)
+
+        with self.assertRaises(ValueError):
+            profiles.interpolate(table, points, 'cubic')
+
+    def test_uncalibrated_tables_match_the_formula(self):
+        values = np.random.default_rng(1).integers(0, 2 ** 32, 2000)
+        uncalibrated = profiles.CmykProfile('uncalibrated', **profiles.uncalibrated())
+
+        np.testing.assert_allclose(uncalibrated.to_cmyk(values), conversions.to_cmyk(values), atol=0.05)
+        self.assertEqual(uncalibrated.from_cmyk([[0, 0, 0, 0], [0, 0, 0, 1]]).tolist(), [0xffffffff, 0x000000ff])
+
+    def test_digital_color_opts_into_a_profile(self):
+        color = DigitalColor(name='cyan', _integer_value=0x00ffffff)
+
+        self.assertEqual(color.cmyk, ('100%', '0%', '0%', '0%'))
+        with profiles.use('press') as press:
+            self.assertEqual(press.name, 'press')
+            self.assertEqual(color.cmyk, ('80%', '0%', '0%', '0%'))
+
+            color.cmyk = (0, 0, 0, '50%')
+            self.assertEqual(color.rgb, (128, 128, 128))
+        self.assertEqual(color.cmyk, ('0%', '0%', '0%', '50%'))
+
+        with override_settings(CMYK_PROFILE='press'):
+            self.assertEqual(DigitalColor(_integer_value=0x00ffffff).cmyk, ('80%', '0%', '0%', '0%'))
+
+            with profiles.use(None):
+                self.assertEqual(DigitalColor(_integer_value=0x00ffffff).cmyk, ('100%', '0%', '0%', '0%'))
+
+    def test_palette_batch_conversion(self):
+        palette = Palette([0x00ffffff, 0xff0000ff, 0x808080ff])
+
+        with profiles.use('press'):
+            batch = palette.cmyk
+            self.assertEqual([color.cmyk for color in palette], [tuple(f'{int(round(channel * 100))}%' for channel in row) for row in batch])
+
+        np.testing.assert_allclose(batch[0], [0.8, 0, 0, 0], atol=1e-6)
+        np.testing.assert_allclose(palette.to_cmyk(None), conversions.to_cmyk(palette.values))
+        np.testing.assert_allclose(palette.to_cmyk('press'), batch)
+
+    def test_profile_names(self):
+        self.assertIs(profiles.profile('press'), profiles.profile('press'))
+
+        for name in ('missing', '../press', ''):
+            with self.assertRaises(ValueError):
+                profiles.profile(name)
+
+
+class DuplicateDetectionTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def test_ciede2000_reference_pairs(self):
+        # from Sharma, Wu and Dalal's CIEDE2000 test data
+        first = [[50, 2.6772, -79.7751], [50, 0, 0], [50, 2.5, 0], [60.2574, -34.0099, 36.2677], [22.7233, 20.0904, -46.6940]]
+        second = [[50, 0, -82.7485], [50, -1, 2], [73, 25, -18], [60.4626, -34.1751, 39.4387], [23.0331, 14.9730, -42.5619]]
+
+        np.testing.assert_allclose(duplicates.ciede2000(first, second), [2.0425, 2.3669, 27.1492, 1.2644, 2.0373], atol=5e-5)
+
+    def test_near_pairs_match_every_pair_compared(self):
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 2 ** 32, 1500)
+        lab = np.vstack([conversions.to_lab(values), conversions.to_lab(values[:300]) + rng.normal(0, 1, (300, 3))])
+        groups = rng.integers(0, 3, len(lab))
+        first, second = np.triu_indices(len(lab), 1)
+        delta_e = duplicates.ciede2000(lab[first], lab[second])
+
+        for threshold in (1.0, 3.0):
+            i, j, found_delta_e = duplicates.near_pairs(lab, threshold)
+            expected = delta_e <= threshold
+            self.assertEqual(sorted(zip(i.tolist(), j.tolist())), list(zip(first[expected].tolist(), second[expected].tolist())))
+            np.testing.assert_allclose(found_delta_e, duplicates.ciede2000(lab[i], lab[j]))
+
+            i, j, _ = duplicates.near_pairs(lab, threshold, groups)
+            expected &= groups[first] == groups[second]
+            self.assertEqual(len(i), expected.sum())
+
+    def test_clusters_link_chains(self):
+        lab = [[50, 0, 0], [50.6, 0, 0], [51.2, 0, 0], [80, 0, 0], [20, 40, 40], [20, 40, 40.5]]
+        clusters = duplicates.cluster([16, 15, 14, 13, 12, 11], lab, 1.0)
+
+        self.assertEqual([cluster.ids for cluster in clusters], [[14, 15, 16], [11, 12]])
+        self.assertEqual(clusters[0].delta_e[0], 0.0)
+        self.assertGreater(clusters[0].delta_e[2], 1.0)
+
+    def test_record_and_merge_digital_colors(self):
+        red = DigitalColor.objects.create(name='red', _integer_value=0xff0000ff)
+        near_red = DigitalColor.objects.create(name='nearly red', _integer_value=0xfe0000ff)
+        DigitalColor.objects.create(name='blue', _integer_value=0x0000ffff)
+        paint = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Red', series='1', digital_color=near_red)
+
+        call_command('find_duplicate_colors', kind=['digital'], stdout=io.StringIO())
+        cluster = DuplicateCluster.objects.get()
+        self.assertEqual((cluster.kind, cluster.size, cluster.status), ('digital', 2, 'open'))
+        self.assertEqual(list(cluster.members.order_by('digital_color_id').values_list('digital_color_id', flat=True)), [red.id, near_red.id])
+
+        self.assertEqual(duplicates.merge(cluster), red.id)
+        paint.refresh_from_db()
+        cluster.refresh_from_db()
+        self.assertEqual(paint.digital_color_id, red.id)
+        self.assertFalse(DigitalColor.objects.filter(id=near_red.id).exists())
+        self.assertEqual(cluster.status, 'merged')
+        self.assertEqual(DigitalColor.objects.nearest(0xfe0000ff)[0], red)
+
+        self.assertEqual(duplicates.record('digital'), 0)
+
+    def test_dismissed_clusters_stay_dismissed(self):
+        DigitalColor.objects.create(name='red', _integer_value=0xff0000ff)
+        DigitalColor.objects.create(name='nearly red', _integer_value=0xfe0000ff)
+
+        self.assertEqual(duplicates.record('digital'), 1)
+        DuplicateCluster.objects.update(status='dismissed')
+        self.assertEqual(duplicates.record('digital'), 0)
+
+        DigitalColor.objects.create(name='also red', _integer_value=0xfd0000ff)
+        self.assertEqual(duplicates.record('digital'), 1)
+        self.assertEqual(DuplicateCluster.objects.get(status='open').size, 3)
+
+    def test_admin_merge_action(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        red = DigitalColor.objects.create(name='red', _integer_value=0xff0000ff)
+        DigitalColor.objects.create(name='nearly red', _integer_value=0xfe0000ff)
+        duplicates.record('digital')
+        cluster = DuplicateCluster.objects.get()
+
+        self.assertEqual(self.client.get(reverse('admin:colors_duplicatecluster_change', args=[cluster.id])).status_code, 200)
+        response = self.client.post(reverse('admin:colors_duplicatecluster_changelist'), {'action': 'merge_clusters', '_selected_action': [cluster.id]})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(DigitalColor.objects.values_list('id', flat=True)), [red.id])
+
+
+class ColorPredictionTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.white, self.red, self.blue = [
+                AnalogColor.objects.create(
+                    brandname='Golden',
+                    image_url='https://picsum.photos/200/300',
+                    medium='acrylic',
+                    name=name,
+                    series='1',
+                    digital_color=DigitalColor.objects.create(name=name, _integer_value=value),
+                )
+                for name, value in [('White', 0xf4f4f0ff), ('Red', 0xd02020ff), ('Blue', 0x2030a0ff)]
+            ]
+            self.pink, self.lilac = [
+                AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series='1')
+                for name in ('Pink', 'Lilac')
+            ]
+            AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.white, quantity=3)
+            AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.red, quantity=1)
+            AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.pink, quantity=2)
+            AnalogRecipe.objects.create(origin_color=self.lilac, ingredient=self.blue, quantity=1)
+
+    def stored(self):
+        return dict(AnalogColor.objects.values_list('name', 'predicted_value'))
+
+    def mixed(self, values, weights, extender=0.0):
+        ks = mixing.absorption(mixing.reflectance(values))
+
+        return int(mixing.to_values(mixing.reflectance_from_absorption(mixing.mix_absorption(ks, weights, extender)))[0])
+
+    def test_predictions_follow_the_mixing_model(self):
+        stored = self.stored()
+
+        self.assertEqual(stored['White'], 0xf4f4f0ff)
+        self.assertEqual(stored['Pink'], self.mixed([0xf4f4f0ff, 0xd02020ff], [3, 1]))
+        self.assertEqual(AnalogColor.objects.get(name='Pink').predicted_color.hex, conversions.hex_string(stored['Pink']))
+        self.assertEqual(predictions.predict([self.pink.id, self.lilac.id]), {self.pink.id: stored['Pink'], self.lilac.id: stored['Lilac']})
+
+    def test_changes_propagate_to_mixes_using_a_color(self):
+        before = self.stored()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnalogRecipe.objects.filter(origin_color=self.pink, ingredient=self.red).update(quantity=3)
+            AnalogRecipe.objects.get(origin_color=self.pink, ingredient=self.white).save()
+        after = self.stored()
+        self.assertEqual(after['Pink'], self.mixed([0xf4f4f0ff, 0xd02020ff], [3, 3]))
+        self.assertNotEqual(after['Lilac'], before['Lilac'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.white.digital_color.hex = '#808080'
+        self.assertNotEqual(self.stored()['Lilac'], after['Lilac'])
+
+        self.assertEqual(predictions.rebuild(), 0)
+
+    def test_additives_tinting_and_missing_colors(self):
+        pink = self.stored()['Pink']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pink._recipe_medium = 4
+            self.pink.save()
+        self.assertGreater(conversions.to_lab(self.stored()['Pink'])[0, 0], conversions.to_lab(pink)[0, 0])
+
+        pink = self.stored()['Pink']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.red.tinting = 20
+            self.red.save(update_fields=['tinting'])
+        stored = self.stored()
+        self.assertNotEqual(stored['Pink'], pink)
+        self.assertEqual(stored['Pink'], predictions.predict([self.pink.id])[self.pink.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blue.digital_color = None
+            self.blue.save()
+        stored = self.stored()
+        self.assertIsNone(stored['Blue'])
+        self.assertIsNone(stored['Lilac'])
+        self.assertIsNotNone(stored['Pink'])
@@ -5,4 +5,13 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('analog/', views.analog_color_list, name='analog_color_list'),
+    path('analog/search/', views.analog_color_search, name='analog_color_search'),
+    path('analog/autocomplete/', views.analog_color_autocomplete, name='analog_color_autocomplete'),
+    path('analog/<int:pk>/', views.analog_color_detail, name='analog_color_detail'),
+    path('digital/', views.digital_color_list, name='digital_color_list'),
+    path('digital/<int:pk>/', views.digital_color_detail, name='digital_color_detail'),
+    path('convert/', views.convert_colors, name='convert_colors'),
+    path('palette/', views.extract_palette, name='extract_palette'),
+    path('export/<slug:dataset>/', views.export_dataset, name='export'),
 ]
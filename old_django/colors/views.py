@@ -1,6 +1,260 @@
-from django.http import HttpResponse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_POST, require_safe
+from PIL import Image
+
+from bpaint import api
+
+from . import conversions, export, extraction, search
+from .models import AnalogColor, AnalogRecipe, DigitalColor
+
+
+# colors per conversion request, and the sizes above which a batch is converted and a body is parsed on a worker
+# thread rather than on the event loop
+MAX_CONVERSION_VALUES = 100000
+INLINE_CONVERSION_VALUES = 2000
+INLINE_CONVERSION_BYTES = 64 * 1024
+
+_conversion_workers = None
+
+
+def conversion_workers():
+    global _conversion_workers
+
+    if _conversion_workers is None:
+        _conversion_workers = ThreadPoolExecutor(thread_name_prefix='color-conversion')
+
+    return _conversion_workers
+
+
+def _convert_to_json(colors, source, targets):
+    return json.dumps(conversions.convert(colors, source, targets)).encode()
+
+
+ANALOG_COLOR_FIELDS = [
+    'id',
+    'name',
+    'brandname',
+    'series',
+    'medium',
+    'body',
+    'glossiness',
+    'lightfastness',
+    'opaqueness',
+    'thickness',
+    'tinting',
+    'image_url',
+    'digital_color_id',
+]
 
 
 def index(request):
     return HttpResponse('Colors index')
+
+
+def serialize_analog_color(color):
+    data = {field: getattr(color, field) for field in ANALOG_COLOR_FIELDS}
+    data['updated_at'] = color.updated_at.isoformat()
+
+    return data
+
+
+def serialize_digital_colors(colors):
+    values = [color._integer_value for color in colors]
+    if not values:
+        return []
+
+    rgba = conversions.to_rgba(values)
+    hsla = conversions.to_hsla(values)
+    hexes = conversions.to_hex(values)
+
+    return [
+        {
+            'id': color.id,
+            'name': color.name,
+            'value': color._integer_value,
+            'hex': str(hexes[i]),
+            'rgba': [int(channel) for channel in rgba[i, :3]] + [float(rgba[i, 3])],
+            'hsla': [round(float(channel), 4) for channel in hsla[i]],
+            'updated_at': color.updated_at.isoformat(),
+        }
+        for i, color in enumerate(colors)
+    ]
+
+
+@require_safe
+def analog_color_list(request):
+    return api.keyset_list(request, AnalogColor.objects.all(), lambda colors: [serialize_analog_color(color) for color in colors])
+
+
+@require_safe
+def analog_color_detail(request, pk):
+    def serialize(color):
+        data = serialize_analog_color(color)
+        data['recipe'] = color.recipe
+
+        return data
+
+    def recipe_versions(pk):
+        # recipe rows carry no updated_at of their own, so their contents go into the salt; the ingredients' names do
+        # through the ingredients' updated_at
+        rows = list(
+            AnalogRecipe.objects.filter(origin_color_id=pk).order_by('id').values_list('id', 'ingredient_id', 'quantity', 'ingredient__updated_at')
+        )
+        versions = [(f'ingredient-{ingredient_id}', updated_at) for _, ingredient_id, _, updated_at in rows]
+
+        return versions, ';'.join(f'{row_id}:{ingredient_id}:{quantity}' for row_id, ingredient_id, quantity, _ in rows)
+
+    return api.keyset_detail(request, AnalogColor.objects.all(), pk, serialize, dependencies=recipe_versions)
+
+
+@require_safe
+def analog_color_search(request):
+    """
+        ?q=<words>&limit=<n>: typo-tolerant search over name, brandname and series
+    """
+
+    limit = api.integer_parameter(request, 'limit', 20, minimum=1, maximum=100)
+    colors = search.search(request.GET.get('q', ''), limit=limit)
+
+    return JsonResponse({'results': [dict(serialize_analog_color(color), score=round(color.score, 4)) for color in colors]})
+
+
+@require_safe
+def analog_color_autocomplete(request):
+    """
+        ?q=<prefix>&limit=<n>: colors with a word starting with each word of q, from memory
+    """
+
+    limit = api.integer_parameter(request, 'limit', 10, minimum=1, maximum=50)
+    found = search.autocomplete(request.GET.get('q', ''), limit=limit)
+
+    return JsonResponse({
+        'results': [dict(id=key, **dict(zip(search.SEARCH_FIELDS, label))) for key, label in found],
+    })
+
+
+@require_safe
+def digital_color_list(request):
+    return api.keyset_list(request, DigitalColor.objects.all(), serialize_digital_colors)
+
+
+@require_safe
+def digital_color_detail(request, pk):
+    return api.keyset_detail(request, DigitalColor.objects.all(), pk, lambda color: serialize_digital_colors([color])[0])
+
+
+@staff_member_required
+def export_dataset(request, dataset):
+    """
+        ?format=ndjson|csv&gzip=1
+    """
+
+    format = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    if dataset not in export.DATASETS or format not in export.FORMATS:
+        raise Http404
+
+    response = StreamingHttpResponse(
+        export.stream(dataset, format=format, compress=compress),
+        content_type='application/gzip' if compress else export.CONTENT_TYPES[format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(dataset, format, compress)}"'
+
+    return response
+
+
+@require_POST
+def extract_palette(request):
+    """
+        multipart POST with an `image` file; ?colors=<k> (1..16, default 6)
+    """
+
+    if 'image' not in request.FILES:
+        raise BadRequest('image is required')
+
+    k = api.integer_parameter(request, 'colors', 6, minimum=1, maximum=16)
+
+    try:
+        found = extraction.dominant_colors(request.FILES['image'], k=k)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    except (OSError, Image.DecompressionBombError):
+        # unidentified and truncated images both end up here
+        raise BadRequest('image could not be read')
+
+    hexes = conversions.to_hex([color.value for color in found]) if found else []
+
+    return JsonResponse({
+        'colors': [
+            {
+                'value': color.value,
+                'hex': str(hexes[i]),
+                'share': round(color.share, 4),
+                'digital_color_id': color.digital_color.id if color.digital_color is not None else None,
+                'digital_delta_e': color.digital_delta_e,
+                'analog_color_id': color.analog_color.id if color.analog_color is not None else None,
+                'analog_delta_e': color.analog_delta_e,
+            }
+            for i, color in enumerate(found)
+        ],
+    })
+
+
+async def convert_colors(request):
+    """
+        POST {"from": <encoding>, "to": [<encoding>, ...], "colors": [...]} -> {<encoding>: [...], ...}
+        encodings are those of conversions.ENCODINGS
+
+        runs on the event loop under ASGI without touching the database; large bodies are parsed and large batches
+        converted and serialized on a worker thread, where NumPy releases the GIL for the heavy lifting
+    """
+
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    loop = asyncio.get_running_loop()
+
+    try:
+        if len(request.body) > INLINE_CONVERSION_BYTES:
+            payload = await loop.run_in_executor(conversion_workers(), json.loads, request.body)
+        else:
+            payload = json.loads(request.body)
+        source = payload['from']
+        targets = payload['to']
+        colors = payload['colors']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'body must be a JSON object with from, to and colors'}, status=400)
+
+    if isinstance(targets, str):
+        targets = [targets]
+    if not isinstance(colors, list) or not isinstance(targets, list):
+        return JsonResponse({'error': 'colors and to must be lists'}, status=400)
+    if not all(isinstance(encoding, str) for encoding in (source, *targets)) or {source, *targets} - set(conversions.ENCODINGS):
+        return JsonResponse({'error': f'encodings must be among {", ".join(conversions.ENCODINGS)}'}, status=400)
+    if len(colors) > MAX_CONVERSION_VALUES:
+        return JsonResponse({'error': f'at most {MAX_CONVERSION_VALUES} colors per request'}, status=400)
+
+    convert = partial(_convert_to_json, colors, source, targets)
+
+    try:
+        if len(colors) > INLINE_CONVERSION_VALUES:
+            body = await loop.run_in_executor(conversion_workers(), convert)
+        else:
+            body = convert()
+    except (OverflowError, TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return HttpResponse(body, content_type='application/json')
+
+
+# machine clients post here without a CSRF token; csrf_exempt() itself would wrap the coroutine in a sync function
+convert_colors.csrf_exempt = True
@@ -1,6 +1,29 @@
 from django.contrib import admin
 
-from .models import Inventory
+from .models import Inventory, InventoryRollup
 
 
-admin.site.register(Inventory)
+class InventoryAdmin(admin.ModelAdmin):
+    # colors are on another database; everything the changelist shows, filters and searches by comes from their
+    # copies on this one
+    list_display = ['color_reference', 'size', 'total']
+    list_filter = ['color_reference__medium', 'size']
+    list_select_related = ['color_reference']
+    raw_id_fields = ['color']
+    search_fields = ['color_reference__name', 'color_reference__brandname']
+
+
+class InventoryRollupAdmin(admin.ModelAdmin):
+    list_display = ['color_id', 'brandname', 'medium', 'total', 'volume']
+    list_filter = ['medium']
+    search_fields = ['brandname']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(Inventory, InventoryAdmin)
+admin.site.register(InventoryRollup, InventoryRollupAdmin)
@@ -0,0 +1,10 @@
+from colors import export
+
+from .models import Inventory
+
+
+export.register(
+    'inventory',
+    lambda using: Inventory.objects.using(using).order_by('pk'),
+    ['id', *(field.attname for field in Inventory._meta.concrete_fields if not field.primary_key)],
+)
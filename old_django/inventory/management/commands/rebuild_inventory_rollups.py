@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-color inventory rollup table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Database to rebuild. Defaults to the database the router writes inventory to.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(using=options['database'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} inventory rollup rows'))
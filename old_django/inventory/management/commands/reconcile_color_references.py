@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory import references
+
+
+class Command(BaseCommand):
+    help = 'Bring the inventory database\'s copy of AnalogColor (ColorReference) up to date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Database holding the copies. Defaults to the database the router writes inventory to.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = references.reconcile(using=options['database'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'{counts["created"]} created, {counts["updated"]} updated, {counts["deleted"]} deleted'))
@@ -14,15 +14,35 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.CreateModel(
-            name='Inventory',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('quantity_full', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
-                ('quantity_three_fourths', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
-                ('quantity_half', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
-                ('quantity_one_fourth', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
-                ('color', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='colors.analogcolor')),
+        # colors.AnalogColor lives on another database, so the table is created without the foreign key constraint
+        # that the recorded state still declares until 0004; databases migrated before this split already have it,
+        # and 0004 drops it there
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Inventory',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('quantity_full', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_three_fourths', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_half', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_one_fourth', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('color', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='colors.analogcolor')),
+                    ],
+                ),
+            ],
+            database_operations=[
+                migrations.CreateModel(
+                    name='Inventory',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('quantity_full', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_three_fourths', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_half', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('quantity_one_fourth', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                        ('color', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='colors.analogcolor')),
+                    ],
+                ),
             ],
         ),
     ]
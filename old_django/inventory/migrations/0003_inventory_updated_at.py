@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_auto_20210921_2244'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
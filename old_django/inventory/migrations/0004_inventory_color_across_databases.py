@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_inventory_updated_at'),
+    ]
+
+    operations = [
+        # colors.AnalogColor is not on the inventory database; altering db_constraint drops the foreign key constraint
+        # that 0001 created before it left the constraint out (nothing to drop on databases created since)
+        migrations.AlterField(
+            model_name='inventory',
+            name='color',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='colors.analogcolor'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colors', '0008_digitalcolor_derived_fields'),
+        ('inventory', '0004_inventory_color_across_databases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('medium', models.CharField(choices=[('acrylic', 'ACRYLIC'), ('oil', 'OIL'), ('watercolor', 'WATERCOLOR'), ('gouache', 'GOUACHE'), ('mixed', 'MIXED'), ('dye', 'DYE'), ('pastel', 'PASTEL'), ('colored_pencil', 'COLORED PENCIL'), ('graphite', 'GRAPHITE'), ('charcoal', 'CHARCOAL'), ('liquid_graphite', 'LIQUID GRAPHITE')], max_length=50)),
+                ('brandname', models.CharField(max_length=200)),
+                ('total', models.IntegerField(default=0)),
+                ('volume', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('color', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='inventory_rollup', to='colors.analogcolor')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventoryrollup',
+            index=models.Index(fields=['medium', 'brandname'], name='inventory_rollup_medium'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryrollup',
+            index=models.Index(fields=['brandname', 'medium'], name='inventory_rollup_brandname'),
+        ),
+    ]
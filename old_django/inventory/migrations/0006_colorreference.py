@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_inventoryrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColorReference',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('brandname', models.CharField(max_length=200)),
+                ('medium', models.CharField(choices=[('acrylic', 'ACRYLIC'), ('oil', 'OIL'), ('watercolor', 'WATERCOLOR'), ('gouache', 'GOUACHE'), ('mixed', 'MIXED'), ('dye', 'DYE'), ('pastel', 'PASTEL'), ('colored_pencil', 'COLORED PENCIL'), ('graphite', 'GRAPHITE'), ('charcoal', 'CHARCOAL'), ('liquid_graphite', 'LIQUID GRAPHITE')], max_length=50)),
+                ('series', models.CharField(max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='colorreference',
+            index=models.Index(fields=['medium', 'brandname'], name='color_reference_medium'),
+        ),
+        migrations.AddIndex(
+            model_name='colorreference',
+            index=models.Index(fields=['brandname', 'name'], name='color_reference_brandname'),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='color_reference',
+            field=models.ForeignObject(from_fields=('color',), null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='inventory', to='inventory.colorreference', to_fields=('id',)),
+        ),
+    ]
@@ -1,9 +1,71 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Cast
 
 from colors.models import AnalogColor
 
 
+# containers by how full they are: (field, fill)
+FILL_LEVELS = [
+    ('quantity_full', 1.0),
+    ('quantity_three_fourths', 0.75),
+    ('quantity_half', 0.5),
+    ('quantity_one_fourth', 0.25),
+]
+
+STOCK_TOTAL = sum((models.F(field) for field, _ in FILL_LEVELS), models.Value(0))
+# cast, or PostgreSQL answers integer * 0.75 with numeric
+STOCK_VOLUME = Cast(
+    sum((models.F(field) * models.Value(fill) for field, fill in FILL_LEVELS), models.Value(0.0)),
+    output_field=models.FloatField(),
+)
+
+
+class InventoryQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+            annotate stock_total (containers) and stock_volume (containers weighted by how full they are)
+        """
+
+        return self.annotate(stock_total=STOCK_TOTAL, stock_volume=STOCK_VOLUME)
+
+    def stock_by(self, *fields):
+        """
+            [{*fields, total, volume}] summed in the database, e.g. stock_by('size')
+        """
+
+        return self.values(*fields).annotate(
+            total=models.Sum(STOCK_TOTAL),
+            volume=models.Sum(STOCK_VOLUME),
+        ).order_by(*fields)
+
+
+class ColorReference(models.Model):
+    """
+        read-only copy of the AnalogColor fields inventory lists and filters by, stored on the inventory database so
+        Inventory can be joined to it. the primary key is the AnalogColor id. maintained by inventory.references
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medium', 'brandname'], name='color_reference_medium'),
+            models.Index(fields=['brandname', 'name'], name='color_reference_brandname'),
+        ]
+
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=200)
+    brandname = models.CharField(max_length=200)
+    medium = models.CharField(max_length=50, choices=AnalogColor.medium_choices)
+    series = models.CharField(max_length=200)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __repr__(self):
+        return f'<ColorReference {self.id} {self.name} ({self.medium})>'
+
+    def __str__(self):
+        return f'{self.name} ({self.medium})'
+
+
 class Inventory(models.Model):
     size_choices = [
         ('small_bottle', 'SMALL BOTTLE'),
@@ -35,19 +97,85 @@ class Inventory(models.Model):
             )
         ]
 
-    color = models.ForeignKey(AnalogColor, on_delete=models.PROTECT)
+    # colors live on another database: no constraint, and deletes are guarded by inventory.signals instead of PROTECT
+    color = models.ForeignKey(AnalogColor, on_delete=models.DO_NOTHING, db_constraint=False)
+    # the same color_id column, joined to the copy on this database: filter(color_reference__medium='oil'). null
+    # because a copy can be missing until the next reconcile, which keeps select_related a LEFT OUTER JOIN
+    color_reference = models.ForeignObject(
+        ColorReference, from_fields=['color'], to_fields=['id'], on_delete=models.DO_NOTHING, null=True, related_name='inventory',
+    )
     size = models.CharField(max_length=50, choices=size_choices)
     quantity_full = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     quantity_three_fourths = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     quantity_half = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     quantity_one_fourth = models.IntegerField(validators=[MinValueValidator(0)], default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = InventoryQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the color as stored, so moving a row to another color refreshes the rollup it leaves as well
+        instance._stored_color_id = instance.__dict__.get('color_id')
+
+        return instance
 
     @property
     def total(self):
         return sum([self.quantity_full, self.quantity_three_fourths, self.quantity_half, self.quantity_one_fourth])
 
+    def _color_label(self):
+        # from the copy on this database, never the colors one; the bare id until the next reconcile makes a copy
+        try:
+            reference = self.color_reference
+        except ColorReference.DoesNotExist:
+            reference = None
+
+        if reference is None:
+            return f'color {self.color_id}'
+
+        return f'{reference.name}({reference.medium})'
+
+    def __repr__(self):
+        return f'<Inventory {self._color_label()} ({self.total} {self.size})>'
+
+    def __str__(self):
+        return f'{self._color_label()} ({self.size}): {self.total}'
+
+
+class InventoryRollupQuerySet(models.QuerySet):
+    def summary(self, *fields):
+        """
+            [{*fields, total, volume}] over the rollups, e.g. summary('medium') or summary('brandname', 'medium')
+        """
+
+        return self.values(*fields).annotate(total=models.Sum('total'), volume=models.Sum('volume')).order_by(*fields)
+
+
+class InventoryRollup(models.Model):
+    """
+        stock of one color summed over every size, with the color's medium and brandname copied in so that reports
+        by medium or brand never have to reach the colors database. maintained by inventory.rollups
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medium', 'brandname'], name='inventory_rollup_medium'),
+            models.Index(fields=['brandname', 'medium'], name='inventory_rollup_brandname'),
+        ]
+
+    color = models.OneToOneField(AnalogColor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='inventory_rollup')
+    medium = models.CharField(max_length=50, choices=AnalogColor.medium_choices)
+    brandname = models.CharField(max_length=200)
+    total = models.IntegerField(default=0)
+    volume = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryRollupQuerySet.as_manager()
+
     def __repr__(self):
-        return f'<Inventory {self.color.name}-{self.color.medium} ({self.total} {self.size})>'
+        return f'<InventoryRollup {self.color_id} ({self.total}, {self.volume:g} full)>'
 
     def __str__(self):
-        return f'{self.color.name}({self.color.medium}) ({self.size}): {self.total}'
+        return f'{self.brandname} {self.medium} {self.color_id}: {self.total} ({self.volume:g} full)'
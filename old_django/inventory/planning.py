@@ -0,0 +1,113 @@
+"""
+Mix-feasibility planning against the shelf.
+
+Every planned mix is expanded to base pigments with colors.recipes.flatten_many (one recursive query at most, memoized
+after that) and the stock of all those pigments is read in one more query, so planning 200 mixes costs two queries.
+
+Amounts are in full containers unless volumes gives a volume per full container of each size. Mixes are planned in
+the order given; a mix that cannot be made leaves the stock untouched for the ones after it. Within a pigment the
+emptiest containers are used up first, then the smallest.
+"""
+
+from collections import defaultdict, namedtuple
+
+from colors import recipes
+
+from .models import FILL_LEVELS, Inventory
+
+
+Use = namedtuple('Use', ['target_id', 'inventory_id', 'color_id', 'fill', 'amount'])
+Plan = namedtuple('Plan', ['feasible', 'missing', 'shortages', 'consumption', 'exhausted'])
+
+_TOLERANCE = 1e-9
+
+
+def _containers(items, volumes):
+    """
+        {color_id: [[inventory_id, fill field, remaining]]} for every container on the shelf, in the order they get
+        used
+    """
+
+    containers = defaultdict(list)
+    for item in items:
+        volume = volumes.get(item.size, 1.0) if volumes else 1.0
+        for field, fill in FILL_LEVELS:
+            for _ in range(getattr(item, field)):
+                containers[item.color_id].append([item.id, field, fill * volume])
+
+    for color_containers in containers.values():
+        color_containers.sort(key=lambda container: container[2])
+
+    return containers
+
+
+def plan(targets, volumes=None, using=None):
+    """
+        targets: [(AnalogColor or id, amount)]
+        volumes: {size: volume of a full container}, to plan in volume rather than container counts
+
+        returns a Plan:
+            feasible: target ids that can be made, in order
+            missing: {target id: {base color id: amount short}} for the rest
+            shortages: {base color id: amount short} if every target were to be made
+            consumption: [Use] in the order the containers get used
+            exhausted: ids of the Inventory rows that end up empty
+    """
+
+    targets = [(getattr(color, 'pk', color), amount) for color, amount in targets]
+
+    expanded = recipes.flatten_many([color_id for color_id, _ in targets])
+    bases = {base_id for proportions in expanded.values() for base_id in proportions}
+
+    items = list(Inventory.objects.using(using).filter(color_id__in=bases).order_by('id')) if bases else []
+    containers = _containers(items, volumes)
+
+    available = {color_id: sum(container[2] for container in color_containers) for color_id, color_containers in containers.items()}
+    required = defaultdict(float)
+
+    feasible = []
+    missing = {}
+    consumption = []
+
+    for target_id, amount in targets:
+        needs = {base_id: amount * proportion for base_id, proportion in expanded[target_id].items()}
+        for base_id, need in needs.items():
+            required[base_id] += need
+
+        short = {}
+        for base_id, need in needs.items():
+            left = sum(container[2] for container in containers.get(base_id, ()))
+            if need - left > _TOLERANCE:
+                short[base_id] = need - left
+        if short:
+            missing[target_id] = short
+            continue
+
+        feasible.append(target_id)
+        for base_id, need in needs.items():
+            for container in containers[base_id]:
+                if need <= _TOLERANCE:
+                    break
+                if container[2] <= _TOLERANCE:
+                    continue
+
+                used = min(need, container[2])
+                container[2] -= used
+                need -= used
+                consumption.append(Use(target_id, container[0], base_id, container[1], used))
+
+    shortages = {
+        base_id: need - available.get(base_id, 0.0)
+        for base_id, need in required.items()
+        if need - available.get(base_id, 0.0) > _TOLERANCE
+    }
+
+    remaining = defaultdict(float)
+    for color_containers in containers.values():
+        for inventory_id, _, left in color_containers:
+            remaining[inventory_id] += left
+
+    used = {use.inventory_id for use in consumption}
+    exhausted = [item.id for item in items if item.id in used and remaining[item.id] <= _TOLERANCE]
+
+    return Plan(feasible, missing, shortages, consumption, exhausted)
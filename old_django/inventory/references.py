@@ -0,0 +1,65 @@
+"""
+Maintenance of ColorReference, the inventory database's copy of AnalogColor.
+
+AnalogColor saves and deletes are copied over by inventory.signals; bulk writes, which send no signals, and anything
+else that can drift are caught up by reconcile().
+"""
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from colors.models import AnalogColor
+
+from .models import ColorReference
+
+
+REFERENCE_FIELDS = ['name', 'brandname', 'medium', 'series']
+
+
+def _alias(using):
+    return using or router.db_for_write(ColorReference)
+
+
+def sync(color, using=None):
+    using = _alias(using)
+    values = {field: getattr(color, field) for field in REFERENCE_FIELDS}
+
+    if not ColorReference.objects.using(using).filter(id=color.pk).update(**values):
+        ColorReference.objects.using(using).create(id=color.pk, **values)
+
+
+def forget(color_id, using=None):
+    ColorReference.objects.using(_alias(using)).filter(id=color_id).delete()
+
+
+def reconcile(using=None, batch_size=1000):
+    """
+        make ColorReference match AnalogColor: copy missing colors, update changed ones, delete orphans
+
+        returns {'created': n, 'updated': n, 'deleted': n}
+    """
+
+    using = _alias(using)
+    references = ColorReference.objects.using(using)
+
+    copies = {row[0]: row[1:] for row in references.values_list('id', *REFERENCE_FIELDS).iterator(chunk_size=batch_size)}
+    created = []
+    updated = []
+    now = timezone.now()
+
+    for row in AnalogColor.objects.values_list('id', *REFERENCE_FIELDS).order_by('id').iterator(chunk_size=batch_size):
+        copy = copies.pop(row[0], None)
+        if copy == row[1:]:
+            continue
+
+        reference = ColorReference(id=row[0], updated_at=now, **dict(zip(REFERENCE_FIELDS, row[1:])))
+        (created if copy is None else updated).append(reference)
+
+    with transaction.atomic(using=using):
+        references.bulk_create(created, batch_size=batch_size)
+        references.bulk_update(updated, [*REFERENCE_FIELDS, 'updated_at'], batch_size=batch_size)
+        deleted = list(copies)
+        for start in range(0, len(deleted), batch_size):
+            references.filter(id__in=deleted[start:start + batch_size]).delete()
+
+    return {'created': len(created), 'updated': len(updated), 'deleted': len(deleted)}
@@ -0,0 +1,86 @@
+"""
+Maintenance of InventoryRollup, one row of summed stock per color.
+
+Inventory saves and deletes refresh the rollup of their color (inventory.signals); bulk writes, which send no
+signals, are followed by rebuild().
+"""
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from colors.models import AnalogColor
+
+from .models import Inventory, InventoryRollup
+
+
+def _stock(queryset):
+    return {row['color_id']: (row['total'], row['volume']) for row in queryset.stock_by('color_id').iterator()}
+
+
+def _colors(color_ids):
+    return {
+        row[0]: row[1:]
+        for row in AnalogColor.objects.filter(id__in=color_ids).values_list('id', 'medium', 'brandname').iterator()
+    }
+
+
+def refresh(color_ids, using=None):
+    """
+        recompute the rollups of color_ids from their Inventory rows; colors without stock lose their rollup
+    """
+
+    using = using or router.db_for_write(InventoryRollup)
+    color_ids = set(color_ids)
+
+    stock = _stock(Inventory.objects.using(using).filter(color_id__in=color_ids))
+
+    with transaction.atomic(using=using):
+        InventoryRollup.objects.using(using).filter(color_id__in=color_ids - set(stock)).delete()
+
+        now = timezone.now()
+        missing = [
+            color_id for color_id, (total, volume) in stock.items()
+            if not InventoryRollup.objects.using(using).filter(color_id=color_id).update(total=total, volume=volume, updated_at=now)
+        ]
+        if missing:
+            colors = _colors(missing)
+            InventoryRollup.objects.using(using).bulk_create([
+                InventoryRollup(color_id=color_id, medium=colors[color_id][0], brandname=colors[color_id][1], total=stock[color_id][0], volume=stock[color_id][1])
+                for color_id in missing
+                if color_id in colors
+            ])
+
+
+def rebuild(using=None, batch_size=1000):
+    """
+        recompute every rollup from Inventory
+
+        returns the number of rollup rows written
+    """
+
+    using = using or router.db_for_write(InventoryRollup)
+
+    stock = _stock(Inventory.objects.using(using))
+    colors = _colors(list(stock))
+
+    rows = [
+        InventoryRollup(color_id=color_id, medium=colors[color_id][0], brandname=colors[color_id][1], total=total, volume=volume)
+        for color_id, (total, volume) in stock.items()
+        if color_id in colors
+    ]
+
+    with transaction.atomic(using=using):
+        InventoryRollup.objects.using(using).all().delete()
+        InventoryRollup.objects.using(using).bulk_create(rows, batch_size=batch_size)
+
+    return len(rows)
+
+
+def describe_color(color):
+    """
+        copy a changed medium or brandname of color into its rollup
+    """
+
+    InventoryRollup.objects.filter(color_id=color.pk).exclude(medium=color.medium, brandname=color.brandname).update(
+        medium=color.medium, brandname=color.brandname,
+    )
@@ -0,0 +1,88 @@
+from django.db import router, transaction
+from django.db.models import ProtectedError
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.text import capfirst
+
+from colors.models import AnalogColor
+from colors.signals import analog_colors_merged, protected_analog_colors
+
+from . import references, rollups
+from .models import FILL_LEVELS, Inventory
+
+
+@receiver(pre_delete, sender=AnalogColor)
+def protect_stocked_color(sender, instance, **kwargs):
+    """
+        Inventory.color cannot PROTECT across databases, so refuse here instead. Unlike PROTECT this raises inside the
+        delete's transaction, so callers that want to carry on after it need their own atomic block
+    """
+
+    stocked = list(Inventory.objects.filter(color_id=instance.pk)[:10])
+    if stocked:
+        raise ProtectedError(
+            f"Cannot delete AnalogColor '{instance}' because it is referenced through the protected foreign key 'Inventory.color'",
+            set(stocked),
+        )
+
+
+@receiver(protected_analog_colors, sender=AnalogColor)
+def list_stocked_colors(sender, color_ids, **kwargs):
+    stocked = Inventory.objects.filter(color_id__in=color_ids).select_related('color_reference').order_by('id')
+
+    return [f'{capfirst(Inventory._meta.verbose_name)}: {item}' for item in stocked]
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def refresh_rollup(sender, instance, using, **kwargs):
+    rollups.refresh({instance.color_id, getattr(instance, '_stored_color_id', None)} - {None}, using)
+    instance._stored_color_id = instance.color_id
+
+
+@receiver(post_save, sender=AnalogColor)
+def describe_rollup(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None and not {'medium', 'brandname'} & set(update_fields)):
+        return
+
+    rollups.describe_color(instance)
+
+
+@receiver(post_save, sender=AnalogColor)
+def sync_color_reference(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and not set(references.REFERENCE_FIELDS) & set(update_fields):
+        return
+
+    references.sync(instance)
+
+
+@receiver(post_delete, sender=AnalogColor)
+def forget_color_reference(sender, instance, **kwargs):
+    references.forget(instance.pk)
+
+
+@receiver(analog_colors_merged, sender=AnalogColor)
+def move_merged_stock(sender, keep_id, merged_ids, **kwargs):
+    """
+        the stock of merged colors becomes stock of the kept color, adding up rows of the same size
+
+        the move is atomic on the inventory database, which the merge's transaction does not cover: should the merge
+        roll back afterwards, the stock stays with the kept color and running the merge again moves nothing twice
+    """
+
+    with transaction.atomic(using=router.db_for_write(Inventory)):
+        kept = {item.size: item for item in Inventory.objects.select_for_update().filter(color_id=keep_id)}
+
+        for item in Inventory.objects.select_for_update().filter(color_id__in=merged_ids).order_by('id'):
+            target = kept.get(item.size)
+            if target is None:
+                item.color_id = keep_id
+                item.save(update_fields=['color', 'updated_at'])
+                kept[item.size] = item
+            else:
+                for field, _ in FILL_LEVELS:
+                    setattr(target, field, getattr(target, field) + getattr(item, field))
+                target.save()
+                item.delete()
+
+        rollups.refresh(merged_ids)
@@ -1,3 +1,317 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import ProtectedError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bpaint import db
+from colors import duplicates, recipes
+from colors.models import AnalogColor, AnalogRecipe, DigitalColor, DuplicateCluster
+from . import planning, references, rollups
+from .models import ColorReference, Inventory, InventoryRollup
+
+
+class InventoryAdminTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def add_inventory(self, count, start=0):
+        for i in range(start, start + count):
+            color = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=f'Color {i}', series='1')
+            Inventory.objects.create(color=color, size='small_tube', quantity_full=i)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connections['default']) as colors, CaptureQueriesContext(connections['inventory']) as inventory:
+            response = self.client.get(reverse('admin:inventory_inventory_changelist'))
+
+        self.assertEqual(response.status_code, 200)
+
+        return len(colors), len(inventory)
+
+    def test_changelist_query_count_is_constant(self):
+        self.add_inventory(3)
+        few = self.changelist_queries()
+
+        self.add_inventory(30, start=3)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_str_reads_the_color_reference(self):
+        self.add_inventory(1)
+        stock = Inventory.objects.select_related('color_reference').get()
+
+        with self.assertNumQueries(0, using='default'), self.assertNumQueries(0, using='inventory'):
+            self.assertEqual(str(stock), 'Color 0(acrylic) (small_tube): 0')
+
+        ColorReference.objects.all().delete()
+        self.assertEqual(str(Inventory.objects.get()), f'color {stock.color_id} (small_tube): 0')
+
+
+class DatabaseRoutingTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.color = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Color', series='1')
+
+    def test_inventory_lives_on_its_own_database(self):
+        with CaptureQueriesContext(connections['inventory']) as queries:
+            stock = Inventory.objects.create(color=self.color, size='small_tube', quantity_full=2)
+
+        self.assertEqual(stock._state.db, 'inventory')
+        self.assertTrue(any('INSERT' in query['sql'] for query in queries))
+        self.assertEqual(Inventory.objects.get().color, self.color)
+
+        self.assertTrue(router.allow_migrate('inventory', 'inventory'))
+        self.assertFalse(router.allow_migrate('default', 'inventory'))
+        self.assertFalse(router.allow_migrate('inventory', 'colors'))
+
+    def test_stocked_colors_are_protected(self):
+        Inventory.objects.create(color=self.color, size='small_tube')
+
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            self.color.delete()
+
+        Inventory.objects.all().delete()
+        self.color.delete()
+
+    def test_admin_lists_stock_instead_of_deleting(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        Inventory.objects.create(color=self.color, size='small_tube', quantity_full=2)
+        url = reverse('admin:colors_analogcolor_delete', args=[self.color.pk])
+
+        for response in (self.client.get(url), self.client.post(url, {'post': 'yes'})):
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Inventory: ')
+
+        response = self.client.post(
+            reverse('admin:colors_analogcolor_changelist'), {'action': 'delete_selected', '_selected_action': [self.color.pk], 'post': 'yes'},
+        )
+        self.assertContains(response, 'Inventory: ')
+        self.assertTrue(AnalogColor.objects.filter(pk=self.color.pk).exists())
+
+    @override_settings(DATABASE_REPLICAS={'default': ['default_replica']})
+    def test_reads_go_to_replicas(self):
+        self.assertEqual(router.db_for_read(AnalogColor), 'default_replica')
+        self.assertEqual(router.db_for_write(AnalogColor), 'default')
+        self.assertEqual(router.db_for_read(Inventory), 'inventory')
+        self.assertFalse(router.allow_migrate('default_replica', 'colors'))
+
+
+class ConnectionHealthCheckTestCase(TestCase):
+    def test_idle_unusable_connections_are_closed(self):
+        connection = connections['default']
+        connection.ensure_connection()
+
+        with mock.patch.object(connection, 'in_atomic_block', False), mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close, mock.patch.object(connection, 'last_used_at', 0):
+            db.close_unusable_connections()
+
+        close.assert_called_once_with()
+
+    def test_connections_in_use_are_not_pinged(self):
+        connection = connections['default']
+        DigitalColor.objects.count()
+
+        with mock.patch.object(connection, 'in_atomic_block', False), mock.patch.object(connection, 'is_usable') as is_usable:
+            db.close_unusable_connections()
+
+        is_usable.assert_not_called()
+
+
+class InventoryRollupTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.ochre = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Ochre', series='1')
+        self.umber = AnalogColor.objects.create(brandname='Winsor', image_url='https://picsum.photos/200/300', medium='oil', name='Umber', series='1')
+
+        Inventory.objects.create(color=self.ochre, size='small_tube', quantity_full=2, quantity_half=1)
+        Inventory.objects.create(color=self.ochre, size='large_jar', quantity_three_fourths=1, quantity_one_fourth=2)
+        self.umber_tube = Inventory.objects.create(color=self.umber, size='small_tube', quantity_full=1)
+
+    def test_annotations_match_the_property(self):
+        for item in Inventory.objects.with_stock():
+            self.assertEqual(item.stock_total, item.total)
+
+        by_size = {row['size']: (row['total'], row['volume']) for row in Inventory.objects.stock_by('size')}
+        self.assertEqual(by_size, {'small_tube': (4, 3.5), 'large_jar': (3, 1.25)})
+
+    def test_rollups_follow_saves_and_deletes(self):
+        self.assertEqual(list(InventoryRollup.objects.summary('medium')), [
+            {'medium': 'acrylic', 'total': 6, 'volume': 3.75},
+            {'medium': 'oil', 'total': 1, 'volume': 1.0},
+        ])
+
+        self.umber_tube.quantity_half = 2
+        self.umber_tube.save()
+        self.assertEqual(InventoryRollup.objects.get(color_id=self.umber.pk).volume, 2.0)
+
+        self.umber.brandname = 'Gamblin'
+        self.umber.save()
+        self.assertEqual(InventoryRollup.objects.get(color_id=self.umber.pk).brandname, 'Gamblin')
+
+        jar = Inventory.objects.get(color=self.ochre, size='large_jar')
+        jar.color = self.umber
+        jar.save()
+        self.assertEqual(dict(InventoryRollup.objects.values_list('color_id', 'total')), {self.ochre.pk: 3, self.umber.pk: 6})
+        jar.color = self.ochre
+        jar.save()
+
+        self.umber_tube.delete()
+        self.assertFalse(InventoryRollup.objects.filter(color_id=self.umber.pk).exists())
+
+        before = list(InventoryRollup.objects.values_list('color_id', 'medium', 'brandname', 'total', 'volume'))
+        self.assertEqual(rollups.rebuild(), 1)
+        self.assertEqual(list(InventoryRollup.objects.values_list('color_id', 'medium', 'brandname', 'total', 'volume')), before)
+
+    def test_summary_endpoint(self):
+        response = self.client.get(reverse('stock_summary'), {'by': ['brandname', 'medium']})
+
+        self.assertEqual(response.json()['results'][0], {'brandname': 'Golden', 'medium': 'acrylic', 'total': 6, 'volume': 3.75})
+        self.assertEqual(self.client.get(reverse('stock_summary'), {'by': 'name'}).status_code, 400)
+
+
+class MixPlanningTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def color(self, name):
+        return AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name=name, series='1')
+
+    def setUp(self):
+        self.white = self.color('White')
+        self.red = self.color('Red')
+        self.blue = self.color('Blue')
+
+        recipes.reset()
+        self.pink = self.color('Pink')
+        AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.white, quantity=3)
+        AnalogRecipe.objects.create(origin_color=self.pink, ingredient=self.red, quantity=1)
+        self.violet = self.color('Violet')
+        AnalogRecipe.objects.create(origin_color=self.violet, ingredient=self.red, quantity=1)
+        AnalogRecipe.objects.create(origin_color=self.violet, ingredient=self.blue, quantity=1)
+
+        self.white_jar = Inventory.objects.create(color=self.white, size='large_jar', quantity_full=1, quantity_half=1)
+        self.red_tube = Inventory.objects.create(color=self.red, size='small_tube', quantity_one_fourth=1, quantity_full=1)
+        self.blue_tube = Inventory.objects.create(color=self.blue, size='small_tube', quantity_half=1)
+
+    def tearDown(self):
+        recipes.reset()
+
+    def test_plan(self):
+        with self.assertNumQueries(1, using='default'), self.assertNumQueries(1, using='inventory'):
+            result = planning.plan([(self.pink, 2), (self.violet, 2), (self.violet.pk, 1)])
+
+        # two violet would take more red and blue than is left after the pink; one still fits
+        self.assertEqual(result.feasible, [self.pink.pk, self.violet.pk])
+        self.assertEqual(result.missing, {self.violet.pk: {self.red.pk: 0.25, self.blue.pk: 0.5}})
+        self.assertEqual(result.shortages, {self.red.pk: 0.75, self.blue.pk: 1.0})
+        self.assertEqual(result.exhausted, [self.white_jar.pk, self.blue_tube.pk])
+
+        # the quarter-full red tube is used up before the full one is opened
+        red_uses = [(use.target_id, use.fill, use.amount) for use in result.consumption if use.color_id == self.red.pk]
+        self.assertEqual(red_uses, [(self.pink.pk, 'quantity_one_fourth', 0.25), (self.pink.pk, 'quantity_full', 0.25), (self.violet.pk, 'quantity_full', 0.5)])
+
+
+class ColorReferenceTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        self.ochre = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Ochre', series='1')
+        self.umber = AnalogColor.objects.create(brandname='Winsor', image_url='https://picsum.photos/200/300', medium='oil', name='Umber', series='2')
+        Inventory.objects.create(color=self.ochre, size='small_tube', quantity_full=1)
+        Inventory.objects.create(color=self.umber, size='small_tube', quantity_full=1)
+
+    def test_copies_follow_saves_and_deletes(self):
+        self.assertEqual(ColorReference.objects.get(id=self.umber.pk).name, 'Umber')
+
+        self.umber.name = 'Burnt Umber'
+        self.umber.save()
+        self.assertEqual(ColorReference.objects.get(id=self.umber.pk).name, 'Burnt Umber')
+
+        Inventory.objects.filter(color=self.umber).delete()
+        self.umber.delete()
+        self.assertFalse(ColorReference.objects.filter(id=self.umber.pk).exists())
+
+    def test_inventory_joins_on_its_own_database(self):
+        with self.assertNumQueries(0, using='default'), self.assertNumQueries(1, using='inventory'):
+            oils = [(item.color_id, item.color_reference.name) for item in Inventory.objects.filter(color_reference__medium='oil').select_related('color_reference')]
+
+        self.assertEqual(oils, [(self.umber.pk, 'Umber')])
+
+        response = self.client.get(reverse('inventory_list'), {'medium': 'acrylic'})
+        self.assertEqual([item['color_id'] for item in response.json()['results']], [self.ochre.pk])
+
+    def test_reconcile(self):
+        AnalogColor.objects.filter(pk=self.ochre.pk).update(name='Yellow Ochre')
+        AnalogColor.objects.bulk_create([AnalogColor(brandname='Golden', image_url='https://picsum.photos/200/300', medium='oil', name='Sienna', series='1')])
+        ColorReference.objects.create(id=self.umber.pk + 100, name='Gone', brandname='Golden', medium='oil', series='1')
+
+        self.assertEqual(references.reconcile(), {'created': 1, 'updated': 1, 'deleted': 1})
+        self.assertEqual(references.reconcile(), {'created': 0, 'updated': 0, 'deleted': 0})
+        self.assertEqual(
+            set(ColorReference.objects.values_list('id', 'name')),
+            set(AnalogColor.objects.values_list('id', 'name')),
+        )
+
+
+class MergeDuplicateColorsTestCase(TestCase):
+    databases = {'default', 'inventory'}
+
+    def setUp(self):
+        red = DigitalColor.objects.create(name='red', _integer_value=0xcc2020ff)
+        near_red = DigitalColor.objects.create(name='nearly red', _integer_value=0xcc2021ff)
+
+        self.red = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Red', series='1', digital_color=red)
+        self.red_hue = AnalogColor.objects.create(brandname='Liquitex', image_url='https://picsum.photos/200/300', medium='acrylic', name='Red Hue', series='1', digital_color=near_red)
+        self.red_oil = AnalogColor.objects.create(brandname='Winsor', image_url='https://picsum.photos/200/300', medium='oil', name='Red', series='1', digital_color=near_red)
+        self.yellow = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Yellow', series='1')
+        self.orange = AnalogColor.objects.create(brandname='Golden', image_url='https://picsum.photos/200/300', medium='acrylic', name='Orange', series='1')
+
+        AnalogRecipe.objects.create(origin_color=self.orange, ingredient=self.red, quantity=1)
+        AnalogRecipe.objects.create(origin_color=self.orange, ingredient=self.red_hue, quantity=2)
+        AnalogRecipe.objects.create(origin_color=self.orange, ingredient=self.yellow, quantity=3)
+
+        Inventory.objects.create(color=self.red, size='small_tube', quantity_full=1)
+        Inventory.objects.create(color=self.red_hue, size='small_tube', quantity_full=2)
+        Inventory.objects.create(color=self.red_hue, size='large_tube', quantity_half=1)
+
+    def test_analog_clusters_stay_within_a_medium(self):
+        self.assertEqual(duplicates.record('analog'), 1)
+
+        cluster = DuplicateCluster.objects.get()
+        self.assertEqual(sorted(cluster.members.values_list('analog_color_id', flat=True)), [self.red.pk, self.red_hue.pk])
+
+    def test_merge_moves_recipes_and_stock(self):
+        duplicates.record('analog')
+        duplicates.merge(DuplicateCluster.objects.get())
+
+        self.assertFalse(AnalogColor.objects.filter(pk=self.red_hue.pk).exists())
+        self.assertEqual(
+            sorted(AnalogRecipe.objects.filter(origin_color=self.orange).values_list('ingredient_id', 'quantity')),
+            sorted([(self.red.pk, 3), (self.yellow.pk, 3)]),
+        )
+        self.assertEqual(recipes.flatten(self.orange.pk), {self.red.pk: 0.5, self.yellow.pk: 0.5})
+
+        self.assertEqual(
+            sorted(Inventory.objects.filter(color_id=self.red.pk).values_list('size', 'quantity_full', 'quantity_half')),
+            [('large_tube', 0, 1), ('small_tube', 3, 0)],
+        )
+        self.assertFalse(Inventory.objects.filter(color_id=self.red_hue.pk).exists())
+        self.assertEqual(InventoryRollup.objects.get(color_id=self.red.pk).total, 4)
+        self.assertFalse(InventoryRollup.objects.filter(color_id=self.red_hue.pk).exists())
+        self.assertFalse(ColorReference.objects.filter(pk=self.red_hue.pk).exists())
+
+    def test_stock_moves_all_or_nothing(self):
+        duplicates.record('analog')
+        stock = sorted(Inventory.objects.values_list('color_id', 'size', 'quantity_full', 'quantity_half'))
+
+        with mock.patch.object(Inventory, 'delete', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            duplicates.merge(DuplicateCluster.objects.get())
+
+        self.assertEqual(sorted(Inventory.objects.values_list('color_id', 'size', 'quantity_full', 'quantity_half')), stock)
+        self.assertTrue(AnalogColor.objects.filter(pk=self.red_hue.pk).exists())
 
-# Create your tests here.
@@ -5,4 +5,7 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('items/', views.inventory_list, name='inventory_list'),
+    path('items/<int:pk>/', views.inventory_detail, name='inventory_detail'),
+    path('summary/', views.stock_summary, name='stock_summary'),
 ]
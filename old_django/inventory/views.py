@@ -1,6 +1,65 @@
-from django.http import HttpResponse
+from django.core.exceptions import BadRequest
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from bpaint import api
+
+from .models import Inventory, InventoryRollup
+
+
+INVENTORY_FIELDS = [
+    'id',
+    'color_id',
+    'size',
+    'quantity_full',
+    'quantity_three_fourths',
+    'quantity_half',
+    'quantity_one_fourth',
+    'total',
+]
+
+SUMMARY_FIELDS = ['brandname', 'medium']
+REFERENCE_FILTERS = ['medium', 'brandname', 'series']
 
 
 def index(request):
     return HttpResponse('Inventory index')
+
+
+def serialize_inventory(item):
+    data = {field: getattr(item, field) for field in INVENTORY_FIELDS}
+    data['updated_at'] = item.updated_at.isoformat()
+
+    return data
+
+
+@require_safe
+def inventory_list(request):
+    """
+        ?medium=, ?brandname= and ?series= filter by the color, joined on this database
+    """
+
+    items = Inventory.objects.filter(**{
+        f'color_reference__{field}': request.GET[field] for field in REFERENCE_FILTERS if field in request.GET
+    })
+
+    return api.keyset_list(request, items, lambda items: [serialize_inventory(item) for item in items])
+
+
+@require_safe
+def inventory_detail(request, pk):
+    return api.keyset_detail(request, Inventory.objects.all(), pk, serialize_inventory)
+
+
+@require_safe
+def stock_summary(request):
+    """
+        ?by=medium, ?by=brandname or ?by=brandname&by=medium
+    """
+
+    fields = request.GET.getlist('by') or ['medium']
+    if not set(fields) <= set(SUMMARY_FIELDS):
+        raise BadRequest(f'by must be among {", ".join(SUMMARY_FIELDS)}')
+
+    return JsonResponse({'results': list(InventoryRollup.objects.summary(*fields))})